@@ -1,17 +1,28 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, current_app, request
+from flask import Blueprint, render_template, redirect, url_for, flash, current_app, request, jsonify, abort
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, validators, SubmitField
 from datetime import datetime
-from app.utils import trans_function as trans, requires_role
+from utils import trans_function as trans, requires_role
 from bson import ObjectId
 from app import limiter
+from storage import release_files
+import monitoring
+from slowlog import ranked_shapes
+from profiling import issue_token, list_profiles, PROFILE_BUCKET
+from storage import file_response
+from queries import bounded_count, bounded_find, partial_results_notice
+from bson.errors import InvalidId
+from dataversion import bump
 import logging
 
 logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin', __name__, template_folder='templates/admin')
 
+# Receipt references read in one reply when deleting a user (16MB fits far more)
+RELEASE_BATCH_SIZE = 100000
+
 class CreditForm(FlaskForm):
     username = StringField(trans('username', default='Username'), [
         validators.DataRequired(),
@@ -44,25 +55,27 @@ def dashboard():
     """Admin dashboard with system stats."""
     try:
         mongo = current_app.extensions['pymongo']
-        user_count = mongo.db.users.count_documents({'role': {'$ne': 'admin'}})
-        invoice_count = mongo.db.invoices.count_documents({})
-        transaction_count = mongo.db.transactions.count_documents({})
-        inventory_count = mongo.db.inventory.count_documents({})
-        coin_tx_count = mongo.db.coin_transactions.count_documents({})
-        audit_log_count = mongo.db.audit_logs.count_documents({})
-        recent_users = list(mongo.db.users.find({'role': {'$ne': 'admin'}}).sort('created_at', -1).limit(10))
+        stats = {}
+        complete = True
+        for name, collection, query in (
+            ('users', 'users', {'role': {'$ne': 'admin'}}),
+            ('invoices', 'invoices', {}),
+            ('transactions', 'transactions', {}),
+            ('inventory', 'inventory', {}),
+            ('coin_transactions', 'coin_transactions', {}),
+            ('audit_logs', 'audit_logs', {})
+        ):
+            count, counted = bounded_count(mongo.db[collection], query)
+            stats[name] = count if count is not None else '—'
+            complete = complete and counted
+        recent_users, listed = bounded_find(mongo.db.users, {'role': {'$ne': 'admin'}}, sort=[('created_at', -1)], limit=10)
+        if not (complete and listed):
+            partial_results_notice()
         for user in recent_users:
             user['_id'] = str(user['_id'])
         return render_template(
             'admin/dashboard.html',
-            stats={
-                'users': user_count,
-                'invoices': invoice_count,
-                'transactions': transaction_count,
-                'inventory': inventory_count,
-                'coin_transactions': coin_tx_count,
-                'audit_logs': audit_log_count
-            },
+            stats=stats,
             recent_users=recent_users
         )
     except Exception as e:
@@ -78,7 +91,9 @@ def manage_users():
     """View and manage users."""
     try:
         mongo = current_app.extensions['pymongo']
-        users = list(mongo.db.users.find({'role': {'$ne': 'admin'}}).sort('created_at', -1))
+        users, complete = bounded_find(mongo.db.users, {'role': {'$ne': 'admin'}}, sort=[('created_at', -1)])
+        if not complete:
+            partial_results_notice()
         for user in users:
             user['_id'] = str(user['_id'])
         return render_template('admin/users.html', users=users)
@@ -123,6 +138,10 @@ def delete_user(user_id):
         mongo.db.transactions.delete_many({'user_id': user_id})
         mongo.db.inventory.delete_many({'user_id': user_id})
         mongo.db.coin_transactions.delete_many({'user_id': user_id})
+        # One reply and one batched release however many receipts there are
+        receipts = mongo.db.receipts.find({'user_id': user_id}, {'file_id': 1, '_id': 0}, batch_size=RELEASE_BATCH_SIZE)
+        release_files(mongo.db, [receipt['file_id'] for receipt in receipts if receipt.get('file_id')])
+        mongo.db.receipts.delete_many({'user_id': user_id})
         mongo.db.audit_logs.delete_many({'details.user_id': user_id})
         result = mongo.db.users.delete_one({'_id': ObjectId(user_id), 'role': {'$ne': 'admin'}})
         if result.deleted_count == 0:
@@ -149,10 +168,13 @@ def delete_item(collection, item_id):
         return redirect(url_for('admin.dashboard'))
     try:
         mongo = current_app.extensions['pymongo']
-        result = mongo.db[collection].delete_one({'_id': ObjectId(item_id)})
-        if result.deleted_count == 0:
+        # The owner's data version has to move with the deletion
+        deleted = mongo.db[collection].find_one_and_delete({'_id': ObjectId(item_id)}, projection={'user_id': 1})
+        if deleted is None:
             flash(trans('item_not_found', default='Item not found'), 'danger')
         else:
+            if deleted.get('user_id'):
+                bump(mongo.db, deleted['user_id'])
             flash(trans('item_deleted', default='Item deleted successfully'), 'success')
             logger.info(f"Admin {current_user.id} deleted {collection} item {item_id}")
             log_audit_action(f'delete_{collection}_item', {'item_id': item_id, 'collection': collection})
@@ -190,6 +212,7 @@ def credit_coins():
                 'ref': ref,
                 'date': datetime.utcnow()
             })
+            bump(mongo.db, user['_id'])
             flash(trans('credit_success', default='Coins credited successfully'), 'success')
             logger.info(f"Admin {current_user.id} credited {amount} coins to user {username}")
             log_audit_action('credit_coins', {'user_id': str(user['_id']), 'amount': amount, 'ref': ref})
@@ -208,11 +231,66 @@ def audit():
     """View audit logs of admin actions."""
     try:
         mongo = current_app.extensions['pymongo']
-        logs = list(mongo.db.audit_logs.find().sort('timestamp', -1).limit(100))
+        logs, complete = bounded_find(mongo.db.audit_logs, {}, sort=[('timestamp', -1)], limit=100)
+        if not complete:
+            partial_results_notice()
         for log in logs:
             log['_id'] = str(log['_id'])
         return render_template('admin/audit.html', logs=logs)
     except Exception as e:
         logger.error(f"Error fetching audit logs for admin {current_user.id}: {str(e)}")
         flash(trans('core_something_went_wrong', default='An error occurred'), 'danger')
-        return render_template('admin/audit.html', logs=[]), 500
\ No newline at end of file
+        return render_template('admin/audit.html', logs=[]), 500
+
+@admin_bp.route('/mongo_stats', methods=['GET'])
+@login_required
+@requires_role('admin')
+def mongo_stats():
+    """Per-endpoint Mongo command histograms for this worker process."""
+    return jsonify(monitoring.snapshot())
+
+@admin_bp.route('/slow_queries', methods=['GET'])
+@login_required
+@requires_role('admin')
+def slow_queries():
+    """Slow query shapes ranked by total time, with their explain plans."""
+    try:
+        mongo = current_app.extensions['pymongo']
+        # Not a number: the default; kept between 1 and 500
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        shapes = ranked_shapes(mongo.db, limit=limit)
+        return render_template('admin/slow_queries.html', shapes=shapes, threshold_ms=current_app.config['SLOW_QUERY_MS'])
+    except Exception as e:
+        logger.error(f"Error loading slow queries for admin {current_user.id}: {str(e)}")
+        flash(trans('core_something_went_wrong', default='An error occurred'), 'danger')
+        return render_template('admin/slow_queries.html', shapes=[], threshold_ms=current_app.config['SLOW_QUERY_MS']), 500
+
+@admin_bp.route('/profiles', methods=['GET', 'POST'])
+@login_required
+@requires_role('admin')
+def profiles():
+    """List stored request profiles; POST issues a new profiling token."""
+    token = None
+    if request.method == 'POST':
+        token = issue_token(current_app.config['SECRET_KEY'], str(current_user.id))
+        log_audit_action('issue_profile_token', {'max_age': current_app.config['PROFILE_TOKEN_MAX_AGE']})
+    try:
+        mongo = current_app.extensions['pymongo']
+        stored = list_profiles(mongo.db)
+    except Exception as e:
+        logger.error(f"Error listing request profiles for admin {current_user.id}: {str(e)}")
+        flash(trans('core_something_went_wrong', default='An error occurred'), 'danger')
+        stored = []
+    return render_template('admin/profiles.html', profiles=stored, token=token, max_age=current_app.config['PROFILE_TOKEN_MAX_AGE'])
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@login_required
+@requires_role('admin')
+def download_profile(profile_id):
+    """Download a profile as a .prof file (open with snakeviz or pstats)."""
+    from gridfs.errors import NoFile
+    try:
+        mongo = current_app.extensions['pymongo']
+        return file_response(mongo.db, ObjectId(profile_id), as_attachment=True, bucket_name=PROFILE_BUCKET)
+    except (InvalidId, NoFile):
+        abort(404)
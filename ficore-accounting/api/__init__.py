@@ -0,0 +1,14 @@
+"""Async JSON API for the React frontend and mobile clients.
+
+Served by asgi.py next to the Flask app. Handlers run on the event loop
+and talk to Mongo through Motor, so an idle or slow client costs a
+coroutine, not a worker thread. Requests are authenticated with the same
+session cookie as the Flask pages; writes also need the X-CSRFToken header
+(from GET /api/csrf-token) and cost coins exactly as the forms do.
+POST /api/batch combines several reads into one round trip. Reads can be
+asked for as compact JSON or MessagePack (api/encoding.py), and responses
+are compressed as the Flask pages are.
+"""
+from api import batch, coins, encoding, inventory, invoices, totals, transactions
+
+routes = invoices.routes + transactions.routes + inventory.routes + coins.routes + totals.routes + batch.routes + encoding.routes
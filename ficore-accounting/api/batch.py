@@ -0,0 +1,90 @@
+from starlette.responses import Response
+from starlette.routing import Route
+from pymongo.errors import PyMongoError
+from api.common import APIError, endpoint, read_json, translate, cache_headers
+from api.encoding import JSON, encode, media_type, response_format
+from api import coins, inventory, invoices, totals, transactions
+import asyncio
+import msgspec
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERIES = 10
+# Resource name -> (loader(caller, params), max-age of its result), the
+# same loaders and cache lifetimes as the single-resource endpoints
+RESOURCES = {
+    'coins.balance': (coins.get_balance, coins.BALANCE_MAX_AGE),
+    'coins.history': (coins.find_history, coins.HISTORY_MAX_AGE),
+    'invoices.list': (invoices.find_invoices, invoices.MAX_AGE),
+    'transactions.list': (transactions.find_transactions, transactions.MAX_AGE),
+    'inventory.list': (inventory.find_items, inventory.MAX_AGE),
+    'totals': (totals.get_totals, totals.MAX_AGE)
+}
+INVALID = ('core_invalid_request', 'Invalid request. Please try again.')
+
+def parse_queries(data):
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not 1 <= len(queries) <= MAX_QUERIES:
+        raise APIError(400, *INVALID)
+    names = set()
+    for query in queries:
+        if not isinstance(query, dict) or not isinstance(query.get('name'), str) or query['name'] in names:
+            raise APIError(400, *INVALID)
+        names.add(query['name'])
+    return queries
+
+def error_result(caller, error):
+    return {'status': error.status, 'error': error.error, 'message': translate(caller.lang, error.error, error.default)}, None
+
+async def run_query(caller, query, fmt=JSON):
+    """(result without its data, data rendered in fmt or None) for one sub-query."""
+    resource = RESOURCES.get(query.get('resource'))
+    params = query.get('params') or {}
+    if resource is None or not isinstance(params, dict):
+        return error_result(caller, APIError(400, *INVALID))
+    loader, max_age = resource
+    try:
+        data = await loader(caller, params)
+    except APIError as e:
+        return error_result(caller, e)
+    except PyMongoError as e:
+        logger.error(f"MongoDB error in batch query {query.get('resource')}: {str(e)}")
+        return error_result(caller, APIError(503, 'core_something_went_wrong', 'An error occurred'))
+    body = encode(data, fmt)
+    headers = cache_headers(body, max_age)
+    if query.get('etag') == headers['ETag']:
+        return {'status': 304, 'headers': headers}, None
+    return {'status': 200, 'headers': headers}, body
+
+def render_results(queries, results, fmt=JSON):
+    # Each result's data is already rendered (for its ETag): splice it in
+    # rather than encoding it a second time. The envelope keeps its long
+    # keys in compact mode; only the data is compacted.
+    entries = {}
+    for query, (result, body) in zip(queries, results):
+        entries[query['name']] = dict(result, data=msgspec.Raw(body)) if body is not None else result
+    return encode({'results': entries}, fmt._replace(compact=False))
+
+@endpoint('batch', read_only=True)
+async def batch(request, caller):
+    """Several reads in one round trip, for high-latency (mobile) clients.
+
+    Body: {"queries": [{"name": "balance", "resource": "coins.balance"},
+                       {"name": "recent", "resource": "invoices.list",
+                        "params": {"limit": 5}, "etag": "W/\\"...\\""}]}
+
+    The user is looked up once and the sub-queries run concurrently. Each
+    result has its own status, Cache-Control and ETag; sending a result's
+    ETag back gets a 304 for that entry instead of its data. One failing
+    sub-query does not fail the others. Compact and MessagePack responses
+    (api/encoding.py) work as for the single-resource endpoints.
+    """
+    fmt = response_format(request)
+    queries = parse_queries(await read_json(request))
+    results = await asyncio.gather(*(run_query(caller, query, fmt) for query in queries))
+    return Response(render_results(queries, results, fmt), media_type=media_type(fmt), headers={'Cache-Control': 'no-store', 'Vary': 'Accept'})
+
+routes = [
+    Route('/api/batch', batch, methods=['POST'])
+]
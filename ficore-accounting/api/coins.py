@@ -0,0 +1,69 @@
+from starlette.routing import Route
+from pymongo import ReturnDocument
+from datetime import datetime
+from dataversion import BUMP
+from api.common import APIResponse, cached_response, endpoint, read_json, find_page, choice, raise_for
+import logging
+
+logger = logging.getLogger(__name__)
+
+PURCHASE_AMOUNTS = ('10', '50', '100')
+PAYMENT_METHODS = ('card', 'bank')
+# The balance changes with every paid write: always revalidate it
+BALANCE_MAX_AGE = 0
+HISTORY_MAX_AGE = 30
+
+async def get_balance(caller, params):
+    # Already loaded with the user, no extra round trip
+    return {'coin_balance': caller.user.get('coin_balance', 0)}
+
+async def find_history(caller, params):
+    """Newest coin transactions first; params: limit, before."""
+    return await find_page(caller, caller.db.coin_transactions, caller.scope(), params, sort_field='date')
+
+@endpoint('coins.balance')
+async def balance(request, caller):
+    return cached_response(request, await get_balance(caller, request.query_params), BALANCE_MAX_AGE)
+
+@endpoint('coins.history')
+async def history(request, caller):
+    return cached_response(request, await find_history(caller, request.query_params), HISTORY_MAX_AGE)
+
+@endpoint('coins.purchase', roles=['trader', 'personal'])
+async def purchase(request, caller):
+    data = await read_json(request)
+    errors = {}
+    amount = choice(dict(data, amount=str(data.get('amount'))), 'amount', errors, PURCHASE_AMOUNTS)
+    payment_method = choice(data, 'payment_method', errors, PAYMENT_METHODS)
+    raise_for(errors)
+    amount = int(amount)
+    now = datetime.utcnow()
+    payment_ref = f"PAY_{now.isoformat()}"
+    await caller.db.coin_transactions.insert_one({
+        'user_id': str(caller.id),
+        'amount': amount,
+        'type': 'purchase',
+        'ref': payment_ref,
+        'date': now
+    })
+    # Last: the data version also covers the log entry (dataversion.py)
+    user = await caller.db.users.find_one_and_update(
+        {'_id': caller.id},
+        {'$inc': {'coin_balance': amount, **BUMP}},
+        projection={'coin_balance': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    await caller.db.audit_logs.insert_one({
+        'admin_id': 'system',
+        'action': 'credit_coins_purchase',
+        'details': {'user_id': str(caller.id), 'amount': amount, 'ref': payment_ref},
+        'timestamp': now
+    })
+    logger.info(f"User {caller.id} purchased {amount} coins via {payment_method} (API)")
+    return APIResponse({'coin_balance': user.get('coin_balance', 0), 'ref': payment_ref})
+
+routes = [
+    Route('/api/coins/balance', balance, methods=['GET']),
+    Route('/api/coins/history', history, methods=['GET']),
+    Route('/api/coins/purchase', purchase, methods=['POST'])
+]
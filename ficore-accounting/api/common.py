@@ -0,0 +1,387 @@
+from starlette.responses import JSONResponse, Response
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import BadData, URLSafeTimedSerializer, want_bytes
+from pymongo.errors import ExecutionTimeout, PyMongoError
+from bson import ObjectId
+from bson.errors import InvalidId
+from limits import parse
+from anyio import to_thread
+from datetime import datetime
+from functools import wraps
+from api.encoding import encode, media_type, response_format
+from compression import compress, compressible, negotiate
+from database import get_async_client, get_async_db
+from dataversion import bump_async
+from metrics import IN_FLIGHT, record_request, record_query_timeout, record_session_op
+from translations import TRANSLATIONS
+import hashlib
+import hmac
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+# Per user, per endpoint; writes match the Flask forms' 50 per hour
+WRITE_LIMIT = '50 per hour'
+READ_LIMIT = '300 per minute'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+USER_FIELDS = {'email': 1, 'display_name': 1, 'role': 1, 'coin_balance': 1}
+
+class APIError(Exception):
+    """An error response: status code, error code (also the translation key) and default message."""
+
+    def __init__(self, status, error, default, details=None):
+        super().__init__(default)
+        self.status = status
+        self.error = error
+        self.default = default
+        self.details = details
+
+def translate(lang, key, default):
+    return TRANSLATIONS.get(lang, TRANSLATIONS['en']).get(key, default)
+
+class APIResponse(JSONResponse):
+    """JSONResponse that also encodes ObjectIds and dates."""
+
+    def render(self, content):
+        return encode(content)
+
+def cache_headers(body, max_age):
+    """Cache-Control and a weak ETag for a rendered body.
+
+    Private (per-user data); max_age=0 makes clients revalidate every time,
+    which costs a 304 rather than the body when nothing changed.
+    """
+    return {
+        'Cache-Control': f'private, max-age={max_age}' if max_age else 'private, no-cache',
+        'ETag': f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    }
+
+def cached_response(request, content, max_age):
+    """content in the requested format (api/encoding.py) with cache headers,
+    or a bodiless 304 if If-None-Match matches."""
+    fmt = response_format(request)
+    body = encode(content, fmt)
+    headers = dict(cache_headers(body, max_age), Vary='Accept')
+    if request.headers.get('If-None-Match') == headers['ETag']:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type(fmt), headers=headers)
+
+def compress_response(request, response):
+    """Compress a response body as compression.py does for the Flask pages."""
+    config = request.app.state.flask_app.config
+    if (response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or not compressible(response.headers.get('Content-Type'))):
+        return response
+    response.headers.add_vary_header('Accept-Encoding')
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None or len(response.body) < config['COMPRESS_MIN_SIZE']:
+        return response
+    response.body = compress(response.body, encoding, config)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(response.body))
+    return response
+
+def error_response(error, lang='en'):
+    body = {'error': error.error, 'message': translate(lang, error.error, error.default)}
+    if error.details:
+        body['errors'] = error.details
+    return APIResponse(body, status_code=error.status)
+
+class Caller:
+    """The signed-in user behind an API request."""
+
+    def __init__(self, user, lang, db, endpoint, max_time_ms):
+        self.id = user['_id']
+        self.role = user.get('role', 'personal')
+        self.user = user
+        self.lang = lang
+        self.db = db
+        # For metrics and query budgets
+        self.endpoint = endpoint
+        self.max_time_ms = max_time_ms
+
+    def require_role(self, roles):
+        if roles and self.role not in roles:
+            raise APIError(403, 'forbidden_access', 'Access denied')
+
+    def scope(self):
+        """Filter for the records this user may list; admins see everyone's, as in the Flask views."""
+        return {} if self.role == 'admin' else {'user_id': str(self.id)}
+
+async def load_session(request):
+    """The Flask session behind this request's cookie, read without going through Flask.
+
+    Works with both SESSION_BACKEND values. A Mongo-backed session this
+    process has cached (session_store.py) is not read again; a logged-in
+    one is still checked to exist, so a logout or revocation applies here too.
+    """
+    flask_app = request.app.state.flask_app
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    interface = flask_app.session_interface
+    if isinstance(interface, SecureCookieSessionInterface):
+        try:
+            return interface.get_signing_serializer(flask_app).loads(
+                cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds())
+            )
+        except BadData:
+            return {}
+    store_id = interface.store_id_for(flask_app, cookie)
+    if store_id is None:
+        return {}
+    client = get_async_client(flask_app.config['MONGO_URI'])
+    sessions = client[flask_app.config['SESSION_MONGODB_DB']][flask_app.config['SESSION_MONGODB_COLLECTION']]
+    cached = interface.cached_session(store_id, request.cookies.get(interface.version_cookie_name(flask_app)))
+    if cached is not None:
+        data, _, _, check = cached
+        if check is None:
+            record_session_op('cache_hit')
+            return data
+        record_session_op('verify')
+        if await sessions.find_one(check, {'_id': 1}):
+            record_session_op('cache_hit')
+            return data
+        interface.forget(store_id)
+        return {}
+    record_session_op('read')
+    document = await sessions.find_one({'id': store_id})
+    if not document:
+        return {}
+    expiration = document.get('expiration')
+    if expiration is not None and expiration <= datetime.utcnow():
+        return {}
+    return interface.serializer.decode(want_bytes(document['val']))
+
+def check_csrf(request, session):
+    """Validate the X-CSRFToken header against the session, as Flask-WTF does for forms.
+
+    The page (or GET /api/csrf-token) hands out the token; the session's raw
+    token never leaves the server.
+    """
+    flask_app = request.app.state.flask_app
+    if not flask_app.config.get('WTF_CSRF_ENABLED', True):
+        return
+    raw = session.get(flask_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'))
+    token = request.headers.get('X-CSRFToken') or request.headers.get('X-CSRF-Token')
+    if raw and token:
+        serializer = URLSafeTimedSerializer(
+            flask_app.config.get('WTF_CSRF_SECRET_KEY') or flask_app.secret_key, salt='wtf-csrf-token'
+        )
+        try:
+            if hmac.compare_digest(raw, serializer.loads(token, max_age=flask_app.config.get('WTF_CSRF_TIME_LIMIT', 3600))):
+                return
+        except BadData:
+            pass
+    raise APIError(403, 'csrf_invalid', 'The form expired. Reload the page and try again.')
+
+async def check_limit(request, caller, endpoint_name, write):
+    """Per-user rate limit, counted in the same storage as Flask-Limiter's."""
+    flask_app = request.app.state.flask_app
+    limiters = flask_app.extensions.get('limiter')
+    if not flask_app.config.get('RATELIMIT_ENABLED', True) or not limiters:
+        return
+    limit = parse(WRITE_LIMIT if write else READ_LIMIT)
+    strategy = next(iter(limiters)).limiter
+    try:
+        # The SQLite storage may wait on a lock; keep that off the event loop
+        allowed = await to_thread.run_sync(strategy.hit, limit, 'api', endpoint_name, str(caller.id))
+    except Exception as e:
+        logger.warning(f"Rate limit storage error, allowing API request: {str(e)}")
+        return
+    if not allowed:
+        raise APIError(429, 'too_many_requests', 'Too many requests. Please wait and try again.')
+
+async def authenticate(request, session, endpoint_name, roles=None, write=False):
+    flask_app = request.app.state.flask_app
+    lang = session.get('lang', 'en')
+    user_id = session.get('_user_id')
+    if not user_id:
+        raise APIError(401, 'login_required', 'Please log in')
+    if write:
+        check_csrf(request, session)
+    db = get_async_db(flask_app.config['MONGO_URI'])
+    user = await db.users.find_one({'_id': user_id}, USER_FIELDS)
+    if not user:
+        raise APIError(401, 'login_required', 'Please log in')
+    caller = Caller(user, lang, db, f'api.{endpoint_name}', flask_app.config['QUERY_MAX_TIME_MS'])
+    caller.require_role(roles)
+    await check_limit(request, caller, endpoint_name, write)
+    return caller
+
+def endpoint(name, roles=None, read_only=False):
+    """Turn `async def handler(request, caller)` into a Starlette endpoint.
+
+    Authenticates from the Flask session, checks CSRF on writes and the
+    per-user limit, maps APIError and Mongo errors to JSON error responses,
+    compresses the response and records the request under `api.<name>` in
+    the request metrics. read_only marks a POST that changes nothing (no
+    CSRF, read limit).
+    """
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapped(request):
+            started = time.perf_counter()
+            IN_FLIGHT.inc()
+            lang = 'en'
+            try:
+                session = await load_session(request)
+                lang = session.get('lang', 'en')
+                write = request.method in UNSAFE_METHODS and not read_only
+                caller = await authenticate(request, session, name, roles, write)
+                response = await handler(request, caller)
+            except APIError as e:
+                response = error_response(e, lang)
+            except PyMongoError as e:
+                logger.error(f"MongoDB error in API endpoint {name}: {str(e)}")
+                response = error_response(APIError(503, 'core_something_went_wrong', 'An error occurred'), lang)
+            finally:
+                IN_FLIGHT.dec()
+            response = compress_response(request, response)
+            record_request(f'api.{name}', request.method, response.status_code, time.perf_counter() - started)
+            return response
+        return wrapped
+    return decorator
+
+async def read_json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        raise APIError(400, 'core_invalid_request', 'Invalid request. Please try again.')
+    return data
+
+def object_id(value, not_found_key, not_found_default):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise APIError(404, not_found_key, not_found_default)
+
+async def find_page(caller, collection, query, params, sort_field='created_at', projection=None):
+    """One page of a list, newest first. params (query string or batch
+    params): limit=<n>, before=<sort value of the last item seen>.
+
+    Bounded by QUERY_MAX_TIME_MS like the Flask lists. Returns
+    {'items': [...], 'next': <before value for the next page, or None>}.
+    """
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        raise APIError(400, 'core_invalid_request', 'Invalid request. Please try again.')
+    before = params.get('before')
+    if before:
+        try:
+            query = dict(query, **{sort_field: {'$lt': datetime.fromisoformat(str(before))}})
+        except ValueError:
+            raise APIError(400, 'invalid_date_format', 'Invalid date format')
+    cursor = collection.find(query, projection).sort(sort_field, -1).limit(limit)
+    try:
+        items = await cursor.max_time_ms(caller.max_time_ms).to_list(length=limit)
+    except ExecutionTimeout:
+        record_query_timeout(caller.endpoint, collection.name)
+        raise APIError(503, 'query_timeout', 'This search took too long. Narrow the filters and try again.')
+    return {'items': items, 'next': items[-1].get(sort_field) if len(items) == limit else None}
+
+async def aggregate(caller, collection, pipeline):
+    """Run a pipeline under the same QUERY_MAX_TIME_MS budget as find_page."""
+    try:
+        return await collection.aggregate(pipeline, maxTimeMS=caller.max_time_ms).to_list(length=None)
+    except ExecutionTimeout:
+        record_query_timeout(caller.endpoint, collection.name)
+        raise APIError(503, 'query_timeout', 'This search took too long. Narrow the filters and try again.')
+
+# Request body checks: each adds a message to `errors` and returns the clean value
+
+def text(data, key, errors, max_length, min_length=1, required=True, default=None):
+    value = data.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            errors[key] = 'This field is required'
+        return default
+    if not isinstance(value, str) or not min_length <= len(value.strip()) <= max_length:
+        errors[key] = f'Must be between {min_length} and {max_length} characters'
+        return default
+    return value.strip()
+
+def number(data, key, errors, minimum=0, required=True, default=None):
+    value = data.get(key)
+    if value is None or value == '':
+        if required:
+            errors[key] = 'This field is required'
+        return default
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        errors[key] = 'Must be a number'
+        return default
+    if value < minimum:
+        errors[key] = f'Must be at least {minimum}'
+        return default
+    return value
+
+def day(data, key, errors):
+    """Optional YYYY-MM-DD date (an ISO datetime is cut to its date), stored as midnight UTC."""
+    value = data.get(key)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d')
+    except ValueError:
+        errors[key] = 'Invalid date format'
+        return None
+
+def choice(data, key, errors, choices, default=None):
+    value = data.get(key, default)
+    if value not in choices:
+        errors[key] = f"Must be one of: {', '.join(choices)}"
+        return default
+    return value
+
+def raise_for(errors):
+    if errors:
+        raise APIError(400, 'invalid_input', 'Please correct the highlighted fields.', errors)
+
+# Coins
+
+async def spend_coins(caller, action, coins=1):
+    """Take coins only if the balance covers them: one conditional update, so
+    two concurrent requests can never spend the same coin."""
+    result = await caller.db.users.update_one(
+        {'_id': caller.id, 'coin_balance': {'$gte': coins}},
+        {'$inc': {'coin_balance': -coins}}
+    )
+    if result.modified_count == 0:
+        raise APIError(402, 'insufficient_coins', 'Insufficient coins. Please purchase more.')
+
+async def log_spend(caller, action, coins=1):
+    now = datetime.utcnow()
+    await caller.db.coin_transactions.insert_one({
+        'user_id': str(caller.id),
+        'amount': -coins,
+        'type': 'spend',
+        'ref': f"{action}_{now.isoformat()}",
+        'date': now
+    })
+
+async def refund_coins(caller, action, coins=1):
+    """Give back coins taken by spend_coins when the write they paid for failed."""
+    try:
+        await caller.db.users.update_one({'_id': caller.id}, {'$inc': {'coin_balance': coins}})
+    except PyMongoError as e:
+        logger.error(f"Could not refund {coins} coins to user {caller.id} for {action}: {str(e)}")
+
+async def paid_write(caller, action, write, coins=1):
+    """Run `write()` (a coroutine function) once its coins are taken; refund if it fails."""
+    await spend_coins(caller, action, coins)
+    try:
+        result = await write()
+    except Exception:
+        await refund_coins(caller, action, coins)
+        raise
+    await log_spend(caller, action, coins)
+    await bump_async(caller.db, caller.id)
+    return result
@@ -0,0 +1,97 @@
+"""Response bodies for the API: plain JSON, compact JSON or MessagePack.
+
+Many clients are on metered 2G/3G connections. ?compact=1 (or
+`Prefer: compact`) renames the common fields to the short names in
+SHORT_KEYS and drops null fields; `Accept: application/msgpack` (or
+?format=msgpack) gets MessagePack instead of JSON. The two combine.
+GET /api/keys lists the short names so clients can map them back.
+"""
+from collections import namedtuple
+from starlette.routing import Route
+from starlette.responses import Response
+from bson import ObjectId
+import msgspec
+
+# Stored field name -> name in compact responses. Short names are unique
+# so a compact body maps back without knowing which resource it came from.
+SHORT_KEYS = {
+    '_id': 'id',
+    'user_id': 'u',
+    'type': 't',
+    'status': 's',
+    'created_at': 'c',
+    'updated_at': 'm',
+    'party_name': 'p',
+    'phone': 'ph',
+    'amount': 'a',
+    'description': 'd',
+    'category': 'g',
+    'is_recurring': 'r',
+    'recurring_period': 'rp',
+    'next_due': 'nd',
+    'invoice_number': 'n',
+    'items': 'i',
+    'desc': 'de',
+    'qty': 'q',
+    'price': 'pr',
+    'total': 'to',
+    'paid_amount': 'pa',
+    'payments': 'py',
+    'due_date': 'dd',
+    'item_name': 'in',
+    'unit': 'un',
+    'buying_price': 'bp',
+    'selling_price': 'sp',
+    'threshold': 'th',
+    'photo_url': 'pu',
+    'ref': 'rf',
+    'date': 'dt',
+    'next': 'nx',
+    'coin_balance': 'cb'
+}
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+Format = namedtuple('Format', ['compact', 'msgpack'])
+JSON = Format(compact=False, msgpack=False)
+
+def _enc_hook(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise NotImplementedError(f"{type(value).__name__} is not serializable")
+
+# Naive datetimes (as stored) come out as ISO strings without an offset in both
+_json = msgspec.json.Encoder(enc_hook=_enc_hook)
+_msgpack = msgspec.msgpack.Encoder(enc_hook=_enc_hook)
+
+def response_format(request):
+    """The Format a request asks for, from its query string and headers."""
+    params = request.query_params
+    accept = request.headers.get('Accept', '')
+    compact = params.get('compact') in ('1', 'true') or 'compact' in request.headers.get('Prefer', '')
+    msgpack = params.get('format') == 'msgpack' or any(media_type in accept for media_type in MSGPACK_TYPES)
+    return Format(compact=compact, msgpack=msgpack)
+
+def compact(value):
+    """value with short keys and without null fields, at every level."""
+    if isinstance(value, dict):
+        return {SHORT_KEYS.get(key, key): compact(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [compact(item) for item in value]
+    return value
+
+def encode(content, fmt=JSON):
+    """Bytes of content in the given Format. msgspec.Raw values are spliced in as is."""
+    if fmt.compact:
+        content = compact(content)
+    return _msgpack.encode(content) if fmt.msgpack else _json.encode(content)
+
+def media_type(fmt):
+    return 'application/msgpack' if fmt.msgpack else 'application/json'
+
+async def short_keys(request):
+    # The same for everyone and rarely changed
+    return Response(encode(SHORT_KEYS), media_type='application/json', headers={'Cache-Control': 'public, max-age=86400'})
+
+routes = [
+    Route('/api/keys', short_keys, methods=['GET'])
+]
@@ -0,0 +1,93 @@
+from starlette.responses import Response
+from starlette.routing import Route
+from pymongo import ReturnDocument
+from datetime import datetime
+from api.common import APIError, APIResponse, cached_response, endpoint, read_json, object_id, find_page, text, number, raise_for, paid_write
+from dataversion import bump_async
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Inventory is a trader feature, as in the Flask views
+ROLES = ['trader']
+NOT_FOUND = ('item_not_found', 'Item not found')
+# Stock moves slowly; a minute of reuse is fine
+MAX_AGE = 60
+
+def item_fields(data):
+    """Validated inventory item fields from a request body."""
+    errors = {}
+    fields = {
+        'item_name': text(data, 'item_name', errors, max_length=100),
+        'qty': number(data, 'qty', errors),
+        'unit': text(data, 'unit', errors, max_length=20, required=False, default='unit'),
+        'buying_price': number(data, 'buying_price', errors),
+        'selling_price': number(data, 'selling_price', errors),
+        'threshold': number(data, 'threshold', errors, required=False, default=5)
+    }
+    raise_for(errors)
+    return fields
+
+async def find_items(caller, params):
+    """Newest items first; params: low_stock (only items at or below their threshold), limit, before."""
+    caller.require_role(ROLES)
+    query = {'user_id': str(caller.id)}
+    if params.get('low_stock'):
+        query['$expr'] = {'$lte': ['$qty', '$threshold']}
+    return await find_page(caller, caller.db.inventory, query, params)
+
+@endpoint('inventory.list', roles=ROLES)
+async def list_items(request, caller):
+    return cached_response(request, await find_items(caller, request.query_params), MAX_AGE)
+
+@endpoint('inventory.get', roles=ROLES)
+async def get_item(request, caller):
+    item_id = object_id(request.path_params['item_id'], *NOT_FOUND)
+    item = await caller.db.inventory.find_one({'_id': item_id, 'user_id': str(caller.id)})
+    if not item:
+        raise APIError(404, *NOT_FOUND)
+    return cached_response(request, item, MAX_AGE)
+
+@endpoint('inventory.create', roles=ROLES)
+async def create_item(request, caller):
+    item = item_fields(await read_json(request))
+    item.update({'user_id': str(caller.id), 'created_at': datetime.utcnow()})
+
+    async def write():
+        await caller.db.inventory.insert_one(item)
+        return item
+
+    item = await paid_write(caller, 'add_inventory_item', write)
+    return APIResponse(item, status_code=201)
+
+@endpoint('inventory.update', roles=ROLES)
+async def update_item(request, caller):
+    item_id = object_id(request.path_params['item_id'], *NOT_FOUND)
+    fields = item_fields(await read_json(request))
+    fields['updated_at'] = datetime.utcnow()
+    item = await caller.db.inventory.find_one_and_update(
+        {'_id': item_id, 'user_id': str(caller.id)},
+        {'$set': fields},
+        return_document=ReturnDocument.AFTER
+    )
+    if item is None:
+        raise APIError(404, *NOT_FOUND)
+    await bump_async(caller.db, caller.id)
+    return APIResponse(item)
+
+@endpoint('inventory.delete', roles=ROLES)
+async def delete_item(request, caller):
+    item_id = object_id(request.path_params['item_id'], *NOT_FOUND)
+    result = await caller.db.inventory.delete_one({'_id': item_id, 'user_id': str(caller.id)})
+    if result.deleted_count == 0:
+        raise APIError(404, *NOT_FOUND)
+    await bump_async(caller.db, caller.id)
+    return Response(status_code=204)
+
+routes = [
+    Route('/api/inventory', list_items, methods=['GET']),
+    Route('/api/inventory', create_item, methods=['POST']),
+    Route('/api/inventory/{item_id}', get_item, methods=['GET']),
+    Route('/api/inventory/{item_id}', update_item, methods=['PUT']),
+    Route('/api/inventory/{item_id}', delete_item, methods=['DELETE'])
+]
@@ -0,0 +1,142 @@
+from starlette.responses import Response
+from starlette.routing import Route
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime
+from api.common import APIError, APIResponse, cached_response, endpoint, read_json, object_id, find_page, text, number, day, choice, raise_for, paid_write
+from dataversion import bump_async
+import logging
+
+logger = logging.getLogger(__name__)
+
+INVOICE_TYPES = ('debtor', 'creditor')
+NOT_FOUND = ('invoice_not_found', 'Invoice not found')
+# Seconds a client may reuse a list or invoice before revalidating
+MAX_AGE = 10
+
+def invoice_fields(data, creating=False):
+    """Validated invoice fields from a request body.
+
+    Accepts the stored names (party_name, items of desc/qty/price) and the
+    React form's (customer_name, one amount with a description).
+    """
+    errors = {}
+    if 'party_name' not in data and 'customer_name' in data:
+        data = dict(data, party_name=data['customer_name'])
+    fields = {
+        'party_name': text(data, 'party_name', errors, max_length=100, min_length=2),
+        'phone': text(data, 'phone', errors, max_length=20, required=False)
+    }
+    if creating:
+        fields['type'] = choice(data, 'type', errors, INVOICE_TYPES, default='debtor')
+    raw_items = data.get('items')
+    if raw_items is None and 'amount' in data:
+        raw_items = [{'desc': data.get('description') or fields['party_name'], 'qty': 1, 'price': data['amount']}]
+    items = []
+    if not isinstance(raw_items, list) or not 1 <= len(raw_items) <= 50:
+        errors['items'] = 'Between 1 and 50 items are required'
+    else:
+        for index, raw in enumerate(raw_items):
+            raw = raw if isinstance(raw, dict) else {}
+            raw = {'desc': raw.get('desc', raw.get('description')), 'qty': raw.get('qty', raw.get('quantity')), 'price': raw.get('price')}
+            item_errors = {}
+            items.append({
+                'desc': text(raw, 'desc', item_errors, max_length=200),
+                'qty': number(raw, 'qty', item_errors, minimum=0.01),
+                'price': number(raw, 'price', item_errors)
+            })
+            if item_errors:
+                errors[f'items.{index}'] = item_errors
+    fields['due_date'] = day(data, 'due_date', errors)
+    raise_for(errors)
+    fields['items'] = items
+    fields['total'] = sum(item['qty'] * item['price'] for item in items)
+    return fields
+
+async def insert_invoice(db, invoice, attempts=5):
+    # Same numbering as the Flask form; the unique index catches two
+    # requests taking the same number, and the loser takes the next one
+    for _ in range(attempts):
+        last = await db.invoices.find_one({}, {'invoice_number': 1}, sort=[('invoice_number', -1)])
+        invoice['invoice_number'] = str(int(last['invoice_number']) + 1).zfill(6) if last else '000001'
+        try:
+            await db.invoices.insert_one(invoice)
+            return invoice
+        except DuplicateKeyError:
+            logger.info(f"Invoice number {invoice['invoice_number']} taken, retrying")
+    raise APIError(503, 'core_something_went_wrong', 'An error occurred')
+
+async def find_invoices(caller, params):
+    """Newest invoices first; params: type, status, limit, before."""
+    query = caller.scope()
+    invoice_type = params.get('type')
+    if invoice_type:
+        if invoice_type not in INVOICE_TYPES:
+            raise APIError(400, 'invalid_invoice_type', 'Invalid invoice type')
+        query['type'] = invoice_type
+    if params.get('status'):
+        query['status'] = str(params['status'])
+    return await find_page(caller, caller.db.invoices, query, params)
+
+@endpoint('invoices.list')
+async def list_invoices(request, caller):
+    return cached_response(request, await find_invoices(caller, request.query_params), MAX_AGE)
+
+@endpoint('invoices.get')
+async def get_invoice(request, caller):
+    invoice_id = object_id(request.path_params['invoice_id'], *NOT_FOUND)
+    invoice = await caller.db.invoices.find_one(dict(caller.scope(), _id=invoice_id))
+    if not invoice:
+        raise APIError(404, *NOT_FOUND)
+    return cached_response(request, invoice, MAX_AGE)
+
+@endpoint('invoices.create')
+async def create_invoice(request, caller):
+    invoice = invoice_fields(await read_json(request), creating=True)
+    invoice.update({
+        'user_id': str(caller.id),
+        'paid_amount': 0,
+        'status': 'unpaid',
+        'payments': [],
+        'created_at': datetime.utcnow()
+    })
+    invoice = await paid_write(caller, f"create_{invoice['type']}_invoice", lambda: insert_invoice(caller.db, invoice))
+    logger.info(f"{invoice['type'].capitalize()} invoice {invoice['invoice_number']} created by user {caller.id} via API")
+    return APIResponse(invoice, status_code=201)
+
+@endpoint('invoices.update')
+async def update_invoice(request, caller):
+    invoice_id = object_id(request.path_params['invoice_id'], *NOT_FOUND)
+    fields = invoice_fields(await read_json(request))
+    fields['updated_at'] = datetime.utcnow()
+
+    async def write():
+        invoice = await caller.db.invoices.find_one_and_update(
+            {'_id': invoice_id, 'user_id': str(caller.id)},
+            {'$set': fields},
+            return_document=ReturnDocument.AFTER
+        )
+        if invoice is None:
+            raise APIError(404, *NOT_FOUND)
+        return invoice
+
+    invoice = await paid_write(caller, 'update_invoice', write)
+    return APIResponse(invoice)
+
+@endpoint('invoices.delete')
+async def delete_invoice(request, caller):
+    invoice_id = object_id(request.path_params['invoice_id'], *NOT_FOUND)
+    result = await caller.db.invoices.delete_one({'_id': invoice_id, 'user_id': str(caller.id)})
+    if result.deleted_count == 0:
+        raise APIError(404, *NOT_FOUND)
+    await bump_async(caller.db, caller.id)
+    logger.info(f"Invoice {invoice_id} deleted by user {caller.id} via API")
+    return Response(status_code=204)
+
+routes = [
+    Route('/api/invoices', list_invoices, methods=['GET']),
+    Route('/api/invoices', create_invoice, methods=['POST']),
+    Route('/api/invoices/{invoice_id}', get_invoice, methods=['GET']),
+    Route('/api/invoices/{invoice_id}', update_invoice, methods=['PUT']),
+    Route('/api/invoices/{invoice_id}', delete_invoice, methods=['DELETE'])
+]
@@ -0,0 +1,44 @@
+from starlette.routing import Route
+from datetime import datetime
+from api.common import aggregate, cached_response, endpoint
+import asyncio
+
+# Sums over many documents; a minute of reuse spares the aggregation
+MAX_AGE = 60
+
+async def get_totals(caller, params):
+    """Outstanding invoice balances, and receipts and payments since the start of the month."""
+    month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    invoices, transactions = await asyncio.gather(
+        aggregate(caller, caller.db.invoices, [
+            {'$match': dict(caller.scope(), status={'$ne': 'paid'})},
+            {'$group': {
+                '_id': '$type',
+                'outstanding': {'$sum': {'$subtract': [{'$ifNull': ['$total', 0]}, {'$ifNull': ['$paid_amount', 0]}]}},
+                'count': {'$sum': 1}
+            }}
+        ]),
+        aggregate(caller, caller.db.transactions, [
+            {'$match': dict(caller.scope(), created_at={'$gte': month_start})},
+            {'$group': {'_id': '$type', 'amount': {'$sum': '$amount'}}}
+        ])
+    )
+    outstanding = {group['_id']: group for group in invoices}
+    month = {group['_id']: group['amount'] for group in transactions}
+    return {
+        'receivable': outstanding.get('debtor', {}).get('outstanding', 0),
+        'payable': outstanding.get('creditor', {}).get('outstanding', 0),
+        'unpaid_invoices': sum(group['count'] for group in invoices),
+        'month_start': month_start,
+        'month_receipts': month.get('receipt', 0),
+        'month_payments': month.get('payment', 0),
+        'month_net': month.get('receipt', 0) - month.get('payment', 0)
+    }
+
+@endpoint('totals')
+async def totals(request, caller):
+    return cached_response(request, await get_totals(caller, request.query_params), MAX_AGE)
+
+routes = [
+    Route('/api/totals', totals, methods=['GET'])
+]
@@ -0,0 +1,130 @@
+from starlette.responses import Response
+from starlette.routing import Route
+from pymongo import ReturnDocument
+from datetime import datetime
+from api.common import APIError, APIResponse, cached_response, endpoint, read_json, object_id, find_page, text, number, choice, raise_for, paid_write
+from dataversion import bump_async
+from recurring import schedule_fields
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_TYPES = ('receipt', 'payment')
+CATEGORIES = ('sales', 'utilities', 'transport', 'other')
+RECURRING_PERIODS = ('none', 'weekly', 'monthly', 'yearly')
+# The React form says income/expense for receipt/payment
+TYPE_ALIASES = {'income': 'receipt', 'expense': 'payment'}
+NOT_FOUND = ('transaction_not_found', 'Transaction not found')
+# Seconds a client may reuse a list or transaction before revalidating
+MAX_AGE = 10
+
+def transaction_fields(data, creating=False):
+    """Validated transaction fields from a request body (stored or React form names)."""
+    errors = {}
+    data = dict(data)
+    if isinstance(data.get('category'), str):
+        data['category'] = data['category'].lower()
+    data.setdefault('is_recurring', data.get('isRecurring', False))
+    data.setdefault('recurring_period', data.get('recurringPeriod', 'none'))
+    fields = {
+        'party_name': text(data, 'party_name', errors, max_length=100, required=False, default=''),
+        'amount': number(data, 'amount', errors, minimum=0.01),
+        'description': text(data, 'description', errors, max_length=500),
+        'category': choice(data, 'category', errors, CATEGORIES),
+        'is_recurring': bool(data['is_recurring'])
+    }
+    fields['recurring_period'] = choice(data, 'recurring_period', errors, RECURRING_PERIODS) if fields['is_recurring'] else 'none'
+    if creating:
+        data['type'] = TYPE_ALIASES.get(data.get('type'), data.get('type'))
+        fields['type'] = choice(data, 'type', errors, TRANSACTION_TYPES)
+    raise_for(errors)
+    return fields
+
+async def find_transactions(caller, params):
+    """Newest transactions first; params: type, category, limit, before."""
+    query = caller.scope()
+    transaction_type = TYPE_ALIASES.get(params.get('type'), params.get('type'))
+    if transaction_type:
+        if transaction_type not in TRANSACTION_TYPES:
+            raise APIError(400, 'invalid_transaction_type', 'Invalid transaction type')
+        query['type'] = transaction_type
+    if params.get('category'):
+        query['category'] = str(params['category']).lower()
+    return await find_page(caller, caller.db.transactions, query, params)
+
+@endpoint('transactions.list')
+async def list_transactions(request, caller):
+    return cached_response(request, await find_transactions(caller, request.query_params), MAX_AGE)
+
+@endpoint('transactions.get')
+async def get_transaction(request, caller):
+    transaction_id = object_id(request.path_params['transaction_id'], *NOT_FOUND)
+    transaction = await caller.db.transactions.find_one(dict(caller.scope(), _id=transaction_id))
+    if not transaction:
+        raise APIError(404, *NOT_FOUND)
+    return cached_response(request, transaction, MAX_AGE)
+
+@endpoint('transactions.create')
+async def create_transaction(request, caller):
+    transaction = transaction_fields(await read_json(request), creating=True)
+    now = datetime.utcnow()
+    transaction.update({
+        'user_id': str(caller.id),
+        'photo_url': None,
+        'created_at': now,
+        'updated_at': now
+    })
+    transaction.update(schedule_fields(transaction['is_recurring'], transaction['recurring_period'], now)[0])
+
+    async def write():
+        await caller.db.transactions.insert_one(transaction)
+        return transaction
+
+    transaction = await paid_write(caller, f"add_{transaction['type']}", write)
+    logger.info(f"{transaction['type'].capitalize()} added by user {caller.id} via API: {transaction['_id']}")
+    return APIResponse(transaction, status_code=201)
+
+@endpoint('transactions.update')
+async def update_transaction(request, caller):
+    transaction_id = object_id(request.path_params['transaction_id'], *NOT_FOUND)
+    fields = transaction_fields(await read_json(request))
+    now = datetime.utcnow()
+    fields['updated_at'] = now
+
+    async def write():
+        query = {'_id': transaction_id, 'user_id': str(caller.id)}
+        current = await caller.db.transactions.find_one(query, {'is_recurring': 1, 'recurring_period': 1})
+        if not current:
+            raise APIError(404, *NOT_FOUND)
+        update = {'$set': fields}
+        if (fields['is_recurring'] != current.get('is_recurring', False) or
+                fields['recurring_period'] != current.get('recurring_period', 'none')):
+            schedule_set, schedule_unset = schedule_fields(fields['is_recurring'], fields['recurring_period'], now)
+            fields.update(schedule_set)
+            if schedule_unset:
+                update['$unset'] = schedule_unset
+        transaction = await caller.db.transactions.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+        if transaction is None:
+            raise APIError(404, *NOT_FOUND)
+        return transaction
+
+    transaction = await paid_write(caller, 'update_transaction', write)
+    return APIResponse(transaction)
+
+@endpoint('transactions.delete')
+async def delete_transaction(request, caller):
+    transaction_id = object_id(request.path_params['transaction_id'], *NOT_FOUND)
+    result = await caller.db.transactions.delete_one({'_id': transaction_id, 'user_id': str(caller.id)})
+    if result.deleted_count == 0:
+        raise APIError(404, *NOT_FOUND)
+    await bump_async(caller.db, caller.id)
+    logger.info(f"Transaction {transaction_id} deleted by user {caller.id} via API")
+    return Response(status_code=204)
+
+routes = [
+    Route('/api/transactions', list_transactions, methods=['GET']),
+    Route('/api/transactions', create_transaction, methods=['POST']),
+    Route('/api/transactions/{transaction_id}', get_transaction, methods=['GET']),
+    Route('/api/transactions/{transaction_id}', update_transaction, methods=['PUT']),
+    Route('/api/transactions/{transaction_id}', delete_transaction, methods=['DELETE'])
+]
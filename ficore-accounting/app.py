@@ -1,88 +1,59 @@
-from flask import Flask, session, redirect, url_for, flash, render_template, request, Response, jsonify
-from flask_pymongo import PyMongo
+from flask import Flask, session, redirect, url_for, flash, render_template, request, Response, jsonify, current_app
+from flask.globals import request_ctx
 from flask_cors import CORS
 from flask_login import LoginManager, UserMixin, login_user, current_user, login_required
-from flask_mail import Mail, Message
 from werkzeug.security import generate_password_hash
 from datetime import datetime, date, timedelta
 import os
 import jinja2
 from flask_wtf import CSRFProtect
+from flask_wtf.csrf import generate_csrf
 import logging
 from bson import ObjectId
-from app.utils import trans_function as trans, is_valid_email
-from flask_session import Session
+from utils import trans_function as trans, is_valid_email
 from pymongo import ASCENDING, DESCENDING, errors
 from pymongo.operations import UpdateOne
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from itsdangerous import URLSafeTimedSerializer
 from flask_babel import Babel
 from functools import wraps
-from gridfs import GridFS
+from importlib import import_module
+from database import Mongo, register_listeners, after_fork
+from recurring import ensure_indexes as ensure_recurring_indexes
+from storage import ensure_indexes as ensure_storage_indexes
+from outbox import mail_settings_from_env, ensure_indexes as ensure_outbox_indexes
+from monitoring import command_listener, init_app as init_monitoring
+from metrics import pool_listener, metrics_view, init_app as init_metrics
+from profiling import init_app as init_profiling
+from slowlog import slow_query_listener, ensure_collections as ensure_slowlog_collections, init_app as init_slowlog
+from readrouting import write_time_listener, init_app as init_readrouting
+from queries import bounded_find, partial_results_notice, init_app as init_queries
+from cache import SnapshotCache, stale_data_notice
+from session_store import init_app as init_session_store
+from compression import init_app as init_compression
+from lite import init_app as init_lite
+from assets import service_worker_script, init_app as init_assets
+from dataversion import BUMP, init_app as init_dataversion
+import ratelimit_storage  # registers the sqlite:// rate limit storage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, template_folder='templates', static_folder='static')
-CORS(app)
-CSRFProtect(app)
-
-# Environment configuration
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-if not app.config['SECRET_KEY']:
-    raise ValueError("SECRET_KEY must be set in environment variables")
-app.config['MONGO_URI'] = os.getenv('MONGO_URI', 'mongodb://localhost:27017/ficore')
-app.config['SESSION_TYPE'] = 'mongodb'
-app.config['SESSION_MONGODB_DB'] = 'ficore'
-app.config['SESSION_MONGODB_COLLECTION'] = 'sessions'
-app.config['SESSION_PERMANENT'] = False
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
-app.config['SESSION_COOKIE_SECURE'] = os.getenv('FLASK_ENV', 'development') == 'production'
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SAMESITE'] = 'Strict'
-app.config['SESSION_COOKIE_NAME'] = 'ficore_session'
-app.jinja_env.undefined = jinja2.Undefined
-
-# Social links
-app.config['FACEBOOK_URL'] = os.getenv('FACEBOOK_URL', 'https://www.facebook.com')
-app.config['TWITTER_URL'] = os.getenv('TWITTER_URL', 'https://www.twitter.com')
-app.config['LINKEDIN_URL'] = os.getenv('LINKEDIN_URL', 'https://www.linkedin.com')
-
-# Email configuration
-app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
-app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
-app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
-app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'support@ficoreapp.com')
-
-# Initialize extensions
-mongo = PyMongo(app)
-app.extensions['pymongo'] = mongo.db
-app.extensions['gridfs'] = GridFS(mongo.db)
-app.config['SESSION_MONGODB'] = mongo.cx
-mail = Mail(app)
-sess = Session(app)
-limiter = Limiter(get_remote_address, app=app, default_limits=["1000 per day", "100 per hour"])
-serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'])
-babel = Babel(app)
-
-# PWA configuration
-app.config['PWA_NAME'] = 'Ficore'
-app.config['PWA_SHORT_NAME'] = 'Ficore'
-app.config['PWA_DESCRIPTION'] = 'Manage your finances with ease'
-app.config['PWA_THEME_COLOR'] = '#007bff'
-app.config['PWA_BACKGROUND_COLOR'] = '#ffffff'
-app.config['PWA_DISPLAY'] = 'standalone'
-app.config['PWA_SCOPE'] = '/'
-app.config['PWA_START_URL'] = '/'
+# Extensions are created unbound and attached to the app in create_app()
+mongo = Mongo()
+csrf = CSRFProtect()
+limiter = Limiter(get_remote_address, default_limits=["1000 per day", "100 per hour"])
+babel = Babel()
 
 # Login manager
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'users.login'
 
+# Blueprints every page depends on (navigation, auth, receipts)
+CORE_BLUEPRINTS = ('invoices', 'transactions', 'users', 'coins', 'admin', 'receipts')
+# Blueprints that can be left out with ENABLED_BLUEPRINTS, e.g. for workers or tests
+OPTIONAL_BLUEPRINTS = ('settings', 'inventory', 'reports', 'debtors', 'creditors', 'payments')
+
 # Role-based access control decorator
 def requires_role(roles):
     if not isinstance(roles, list):
@@ -109,11 +80,13 @@ def check_coin_balance(required_coins):
     return user.get('coin_balance', 0) >= required_coins
 
 class User(UserMixin):
-    def __init__(self, id, email, display_name=None, role='personal'):
+    def __init__(self, id, email, display_name=None, role='personal', data_version=0):
         self.id = id
         self.email = email
         self.display_name = display_name or id
         self.role = role
+        # Bumped by every write to the user's records, see dataversion.py
+        self.data_version = data_version
 
     def get(self, key, default=None):
         user = mongo.db.users.find_one({'_id': self.id})
@@ -124,122 +97,82 @@ def load_user(user_id):
     try:
         user_data = mongo.db.users.find_one({'_id': user_id})
         if user_data:
-            return User(user_data['_id'], user_data['email'], user_data.get('display_name'), user_data.get('role', 'personal'))
+            return User(
+                user_data['_id'], user_data['email'], user_data.get('display_name'), user_data.get('role', 'personal'),
+                user_data.get('data_version', 0)
+            )
         return None
     except Exception as e:
         logger.error(f"Error loading user {user_id}: {str(e)}")
         return None
 
-# Register blueprints
-from invoices.routes import invoices_bp
-from transactions.routes import transactions_bp
-from users.routes import users_bp
-from coins.routes import coins_bp
-from admin.routes import admin_bp
-from settings.routes import settings_bp
-from inventory.routes import inventory_bp
-from reports.routes import reports_bp
-from debtors.routes import debtors_bp
-from creditors.routes import creditors_bp
-from receipts.routes import receipts_bp
-from payments.routes import payments_bp
-
-app.register_blueprint(invoices_bp, url_prefix='/invoices')
-app.register_blueprint(transactions_bp, url_prefix='/transactions')
-app.register_blueprint(users_bp, url_prefix='/users')
-app.register_blueprint(coins_bp, url_prefix='/coins')
-app.register_blueprint(admin_bp, url_prefix='/admin')
-app.register_blueprint(settings_bp, url_prefix='/settings')
-app.register_blueprint(inventory_bp, url_prefix='/inventory')
-app.register_blueprint(reports_bp, url_prefix='/reports')
-app.register_blueprint(debtors_bp, url_prefix='/debtors')
-app.register_blueprint(creditors_bp, url_prefix='/creditors')
-app.register_blueprint(receipts_bp, url_prefix='/receipts')
-app.register_blueprint(payments_bp, url_prefix='/payments')
-
-# Jinja2 globals and filters
-with app.app_context():
-    app.jinja_env.globals.update(
-        FACEBOOK_URL=app.config['FACEBOOK_URL'],
-        TWITTER_URL=app.config['TWITTER_URL'],
-        LINKEDIN_URL=app.config['LINKEDIN_URL'],
-        trans=trans
-    )
-
-    @app.template_filter('trans')
-    def trans_filter(key):
-        return trans(key)
+# Jinja2 filters
+def trans_filter(key):
+    return trans(key)
 
-    @app.template_filter('format_number')
-    def format_number(value):
-        try:
-            if isinstance(value, (int, float)):
-                return f"{float(value):,.2f}"
-            return str(value)
-        except (ValueError, TypeError) as e:
-            logger.warning(f"Error formatting number {value}: {str(e)}")
-            return str(value)
-
-    @app.template_filter('format_currency')
-    def format_currency(value):
-        try:
-            value = float(value)
-            locale = session.get('lang', 'en')
-            symbol = '₦'
-            if value.is_integer():
-                return f"{symbol}{int(value):,}"
-            return f"{symbol}{value:,.2f}"
-        except (TypeError, ValueError) as e:
-            logger.warning(f"Error formatting currency {value}: {str(e)}")
-            return str(value)
-
-    @app.template_filter('format_datetime')
-    def format_datetime(value):
-        try:
-            locale = session.get('lang', 'en')
-            format_str = '%B %d, %Y, %I:%M %p' if locale == 'en' else '%d %B %Y, %I:%M %p'
-            if isinstance(value, datetime):
-                return value.strftime(format_str)
-            elif isinstance(value, date):
-                return value.strftime('%B %d, %Y' if locale == 'en' else '%d %B %Y')
-            elif isinstance(value, str):
-                parsed = datetime.strptime(value, '%Y-%m-%d')
-                return parsed.strftime(format_str)
-            return str(value)
-        except Exception as e:
-            logger.warning(f"Error formatting datetime {value}: {str(e)}")
-            return str(value)
+def format_number(value):
+    try:
+        if isinstance(value, (int, float)):
+            return f"{float(value):,.2f}"
+        return str(value)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Error formatting number {value}: {str(e)}")
+        return str(value)
+
+def format_currency(value):
+    try:
+        value = float(value)
+        locale = session.get('lang', 'en')
+        symbol = '₦'
+        if value.is_integer():
+            return f"{symbol}{int(value):,}"
+        return f"{symbol}{value:,.2f}"
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Error formatting currency {value}: {str(e)}")
+        return str(value)
+
+def format_datetime(value):
+    try:
+        locale = session.get('lang', 'en')
+        format_str = '%B %d, %Y, %I:%M %p' if locale == 'en' else '%d %B %Y, %I:%M %p'
+        if isinstance(value, datetime):
+            return value.strftime(format_str)
+        elif isinstance(value, date):
+            return value.strftime('%B %d, %Y' if locale == 'en' else '%d %B %Y')
+        elif isinstance(value, str):
+            parsed = datetime.strptime(value, '%Y-%m-%d')
+            return parsed.strftime(format_str)
+        return str(value)
+    except Exception as e:
+        logger.warning(f"Error formatting datetime {value}: {str(e)}")
+        return str(value)
 
-    @app.template_filter('format_date')
-    def format_date(value):
-        try:
-            locale = session.get('lang', 'en')
-            format_str = '%Y-%m-%d' if locale == 'en' else '%d-%m-%Y'
-            if isinstance(value, datetime):
-                return value.strftime(format_str)
-            elif isinstance(value, date):
-                return value.strftime(format_str)
-            elif isinstance(value, str):
-                parsed = datetime.strptime(value, '%Y-%m-%d').date()
-                return parsed.strftime(format_str)
-            return str(value)
-        except Exception as e:
-            logger.warning(f"Error formatting date {value}: {str(e)}")
-            return str(value)
+def format_date(value):
+    try:
+        locale = session.get('lang', 'en')
+        format_str = '%Y-%m-%d' if locale == 'en' else '%d-%m-%Y'
+        if isinstance(value, datetime):
+            return value.strftime(format_str)
+        elif isinstance(value, date):
+            return value.strftime(format_str)
+        elif isinstance(value, str):
+            parsed = datetime.strptime(value, '%Y-%m-%d').date()
+            return parsed.strftime(format_str)
+        return str(value)
+    except Exception as e:
+        logger.warning(f"Error formatting date {value}: {str(e)}")
+        return str(value)
 
 # Localization configuration
-@babel.localeselector
 def get_locale():
     return session.get('lang', request.accept_languages.best_match(['en', 'ha'], default='en'))
 
-@app.route('/api/translations/<lang>')
 def get_translations(lang):
     valid_langs = ['en', 'ha']
     if lang in valid_langs:
-        return jsonify({'translations': app.config['TRANSLATIONS'].get(lang, app.config['TRANSLATIONS']['en'])})
-    return jsonify({'translations': app.config['TRANSLATIONS']['en']}), 400
+        return jsonify({'translations': current_app.config['TRANSLATIONS'].get(lang, current_app.config['TRANSLATIONS']['en'])})
+    return jsonify({'translations': current_app.config['TRANSLATIONS']['en']}), 400
 
-@app.route('/setlang/<lang>')
 def set_language(lang):
     valid_langs = ['en', 'ha']
     if lang in valid_langs:
@@ -251,7 +184,6 @@ def set_language(lang):
         flash(trans('invalid_language', default='Invalid language'), 'danger')
     return redirect(request.referrer or url_for('index'))
 
-@app.route('/set_dark_mode', methods=['POST'])
 def set_dark_mode():
     data = request.get_json()
     dark_mode = str(data.get('dark_mode', False)).lower() == 'true'
@@ -389,6 +321,7 @@ def setup_database():
             })
         db.receipts.create_index([('user_id', ASCENDING)])
         db.receipts.create_index([('upload_date', DESCENDING)])
+        ensure_storage_indexes(db)
 
         # Payments collection
         if 'payments' not in collections:
@@ -466,6 +399,7 @@ def setup_database():
             db.transactions.create_index([('user_id', ASCENDING)])
             db.transactions.create_index([('created_at', DESCENDING)])
             db.transactions.create_index([('category', ASCENDING)])
+        ensure_recurring_indexes(db)
 
         if 'inventory' not in collections:
             db.create_collection('inventory', validator={
@@ -489,9 +423,12 @@ def setup_database():
             db.feedback.create_index([('user_id', ASCENDING)], sparse=True)
             db.feedback.create_index([('timestamp', DESCENDING)])
 
-        if 'sessions' not in collections:
-            db.create_collection('sessions')
-            db.sessions.create_index([('expires', ASCENDING)], expireAfterSeconds=0)
+        ensure_outbox_indexes(db)
+        ensure_slowlog_collections(db)
+
+        # Server-side sessions: create_app leaves this to us (or the first session write)
+        if hasattr(current_app.session_interface, 'ensure_indexes'):
+            current_app.session_interface.ensure_indexes()
 
         logger.info("Database setup completed successfully")
         return True
@@ -500,7 +437,6 @@ def setup_database():
         return False
 
 # Security headers
-@app.after_request
 def add_security_headers(response):
     response.headers['Content-Security-Policy'] = (
         "default-src 'self'; "
@@ -515,21 +451,29 @@ def add_security_headers(response):
     response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
     return response
 
-@app.route('/service-worker.js')
+def no_store_flashed_pages(response):
+    # A page showing a one-off flashed message must not be replayed later
+    # by the service worker (static/sw.js) or the browser cache
+    if request_ctx.flashes:
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
 def service_worker():
-    return app.send_static_file('service-worker.js')
+    # Served from the root so its scope covers every page
+    response = Response(service_worker_script(), mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-@app.route('/manifest.json')
 def manifest():
     return {
-        'name': app.config['PWA_NAME'],
-        'short_name': app.config['PWA_SHORT_NAME'],
-        'description': app.config['PWA_DESCRIPTION'],
-        'theme_color': app.config['PWA_THEME_COLOR'],
-        'background_color': app.config['PWA_BACKGROUND_COLOR'],
-        'display': app.config['PWA_DISPLAY'],
-        'scope': app.config['PWA_SCOPE'],
-        'start_url': app.config['PWA_START_URL'],
+        'name': current_app.config['PWA_NAME'],
+        'short_name': current_app.config['PWA_SHORT_NAME'],
+        'description': current_app.config['PWA_DESCRIPTION'],
+        'theme_color': current_app.config['PWA_THEME_COLOR'],
+        'background_color': current_app.config['PWA_BACKGROUND_COLOR'],
+        'display': current_app.config['PWA_DISPLAY'],
+        'scope': current_app.config['PWA_SCOPE'],
+        'start_url': current_app.config['PWA_START_URL'],
         'icons': [
             {'src': '/static/icons/icon-192x192.png', 'sizes': '192x192', 'type': 'image/png'},
             {'src': '/static/icons/icon-512x512.png', 'sizes': '512x512', 'type': 'image/png'}
@@ -537,15 +481,12 @@ def manifest():
     }
 
 # Routes
-@app.route('/')
 def index():
     return render_template('general/home.html')
 
-@app.route('/about')
 def about():
     return render_template('general/about.html')
 
-@app.route('/feedback', methods=['GET', 'POST'])
 @login_required
 def feedback():
     lang = session.get('lang', 'en')
@@ -576,7 +517,6 @@ def feedback():
             if not rating or not rating.isdigit() or int(rating) < 1 or int(rating) > 5:
                 flash(trans('invalid_rating', default='Invalid rating'), 'danger')
                 return render_template('general/feedback.html', tool_options=tool_options)
-            mongo.db.users.update_one({'_id': current_user.id}, {'$inc': {'coin_balance': -1}})
             mongo.db.coin_transactions.insert_one({
                 'user_id': current_user.id,
                 'amount': -1,
@@ -584,6 +524,8 @@ def feedback():
                 'ref': f"FEEDBACK_{datetime.utcnow().isoformat()}",
                 'date': datetime.utcnow()
             })
+            # After the log entry, so the new data version covers it
+            mongo.db.users.update_one({'_id': current_user.id}, {'$inc': {'coin_balance': -1, **BUMP}})
             feedback_entry = {
                 'user_id': current_user.id,
                 'tool_name': tool_name,
@@ -606,52 +548,71 @@ def feedback():
             return render_template('general/feedback.html', tool_options=tool_options), 500
     return render_template('general/feedback.html', tool_options=tool_options)
 
-@app.route('/dashboard/admin')
+# Last good dashboard data, served while Mongo is failing or too slow
+admin_dashboard_cache = SnapshotCache('admin_dashboard', max_entries=1)
+general_dashboard_cache = SnapshotCache('general_dashboard')
+
+def load_admin_dashboard():
+    invoices, invoices_complete = bounded_find(mongo.db.invoices, {}, sort=[('created_at', DESCENDING)], limit=50)
+    transactions, transactions_complete = bounded_find(mongo.db.transactions, {}, sort=[('created_at', DESCENDING)], limit=50)
+    coin_transactions, coins_complete = bounded_find(mongo.db.coin_transactions, {}, sort=[('date', DESCENDING)], limit=50)
+    for invoice in invoices:
+        invoice['_id'] = str(invoice['_id'])
+    for transaction in transactions:
+        transaction['_id'] = str(transaction['_id'])
+    for coin_tx in coin_transactions:
+        coin_tx['_id'] = str(coin_tx['_id'])
+    data = {'invoices': invoices, 'transactions': transactions, 'coin_transactions': coin_transactions}
+    return data, invoices_complete and transactions_complete and coins_complete
+
 @login_required
 @requires_role('admin')
 def admin_dashboard():
     try:
-        invoices = list(mongo.db.invoices.find().sort('created_at', DESCENDING).limit(50))
-        transactions = list(mongo.db.transactions.find().sort('created_at', DESCENDING).limit(50))
-        coin_transactions = list(mongo.db.coin_transactions.find().sort('date', DESCENDING).limit(50))
-        for invoice in invoices:
-            invoice['_id'] = str(invoice['_id'])
-        for transaction in transactions:
-            transaction['_id'] = str(transaction['_id'])
-        for coin_tx in coin_transactions:
-            coin_tx['_id'] = str(coin_tx['_id'])
-        return render_template('dashboard/admin_dashboard.html', 
-                              invoices=invoices, 
-                              transactions=transactions,
-                              coin_transactions=coin_transactions)
+        result = admin_dashboard_cache.get('all', load_admin_dashboard)
+        if result.stale:
+            stale_data_notice(result.saved_at)
+        elif not result.complete:
+            partial_results_notice()
+        return render_template('dashboard/admin_dashboard.html', **result.data)
     except Exception as e:
         logger.error(f"Error loading admin dashboard: {str(e)}")
         flash(trans('core_something_went_wrong', default='An error occurred'), 'danger')
         return redirect(url_for('index')), 500
 
-@app.route('/dashboard/general')
+def load_general_dashboard(user_id):
+    # Runs outside the request when refreshing in the background: no current_user here
+    user = mongo.db.users.find_one({'_id': user_id})
+    query = {'user_id': user_id}
+    if user.get('role') == 'admin':
+        query = {}
+    recent_invoices, invoices_complete = bounded_find(mongo.db.invoices, query, sort=[('created_at', DESCENDING)], limit=50)
+    recent_transactions, transactions_complete = bounded_find(mongo.db.transactions, query, sort=[('created_at', DESCENDING)], limit=50)
+    recent_coin_txs, coins_complete = bounded_find(mongo.db.coin_transactions, query, sort=[('date', DESCENDING)], limit=10)
+    for invoice in recent_invoices:
+        invoice['_id'] = str(invoice['_id'])
+    for transaction in recent_transactions:
+        transaction['_id'] = str(transaction['_id'])
+    for coin_tx in recent_coin_txs:
+        coin_tx['_id'] = str(coin_tx['_id'])
+    data = {
+        'recent_invoices': recent_invoices,
+        'recent_transactions': recent_transactions,
+        'recent_coin_txs': recent_coin_txs,
+        'coin_balance': user.get('coin_balance', 0)
+    }
+    return data, invoices_complete and transactions_complete and coins_complete
+
 @login_required
 def general_dashboard():
     try:
-        user = mongo.db.users.find_one({'_id': current_user.id})
-        query = {'user_id': current_user.id}
-        if user.get('role') == 'admin':
-            query = {}
-        recent_invoices = list(mongo.db.invoices.find(query).sort('created_at', DESCENDING).limit(50))
-        recent_transactions = list(mongo.db.transactions.find(query).sort('created_at', DESCENDING).limit(50))
-        recent_coin_txs = list(mongo.db.coin_transactions.find(query).sort('date', DESCENDING).limit(10))
-        for invoice in recent_invoices:
-            invoice['_id'] = str(invoice['_id'])
-        for transaction in recent_transactions:
-            transaction['_id'] = str(transaction['_id'])
-        for coin_tx in recent_coin_txs:
-            coin_tx['_id'] = str(coin_tx['_id'])
-        coin_balance = user.get('coin_balance', 0)
-        return render_template('dashboard/general_dashboard.html',
-                              recent_invoices=recent_invoices,
-                              recent_transactions=recent_transactions,
-                              recent_coin_txs=recent_coin_txs,
-                              coin_balance=coin_balance)
+        user_id = current_user.id
+        result = general_dashboard_cache.get(user_id, lambda: load_general_dashboard(user_id))
+        if result.stale:
+            stale_data_notice(result.saved_at)
+        elif not result.complete:
+            partial_results_notice()
+        return render_template('dashboard/general_dashboard.html', **result.data)
     except Exception as e:
         logger.error(f"Error fetching dashboard data: {str(e)}")
         flash(trans('core_something_went_wrong', default='An error occurred'), 'danger')
@@ -661,7 +622,6 @@ def general_dashboard():
                               recent_coin_txs=[],
                               coin_balance=0), 500
 
-@app.route('/setup', methods=['GET'])
 @limiter.limit("10 per minute")
 def setup_database_route():
     setup_key = request.args.get('key')
@@ -677,27 +637,209 @@ def setup_database_route():
         flash(trans('database_setup_error', default='Database setup failed'), 'danger')
         return render_template('errors/500.html', content=trans('internal_error', default='Internal server error')), 500
 
-@app.errorhandler(403)
+def csrf_token():
+    # For the JSON API (api/): writes send this back in the X-CSRFToken header
+    return jsonify({'csrf_token': generate_csrf()})
+
 def forbidden(e):
     return render_template('errors/403.html', message=trans('forbidden', default='Forbidden')), 403
 
-@app.errorhandler(404)
 def page_not_found(e):
     return render_template('errors/404.html', message=trans('page_not_found', default='Page not found')), 404
 
-@app.errorhandler(500)
+def request_entity_too_large(e):
+    return render_template('errors/500.html', message=trans('file_too_large', default='Uploaded file is too large')), 413
+
 def internal_server_error(e):
     return render_template('errors/500.html', message=trans('internal_server_error', default='Internal server error')), 500
 
-with app.app_context():
-    if os.getenv('FLASK_ENV', 'development') != 'production' or os.getenv('ALLOW_DB_SETUP', 'false').lower() == 'true':
-        if not setup_database():
-            logger.error("Application startup aborted due to database initialization failure")
-            raise RuntimeError("Database initialization failed")
-    else:
-        logger.info("Database initialization skipped in production environment")
+def rebind_session_store(app):
+    """Point the session store at this process's client after a fork."""
+    interface = app.session_interface
+    if hasattr(interface, 'store'):
+        interface.client = mongo.cx
+        interface.store = interface.client[app.config['SESSION_MONGODB_DB']][app.config['SESSION_MONGODB_COLLECTION']]
+
+def register_blueprints(app):
+    """Import and register the core blueprints plus the enabled optional ones."""
+    enabled = app.config['ENABLED_BLUEPRINTS']
+    for name in CORE_BLUEPRINTS + tuple(name for name in OPTIONAL_BLUEPRINTS if name in enabled):
+        module = import_module(f'{name}.routes')
+        app.register_blueprint(getattr(module, f'{name}_bp'), url_prefix=f'/{name}')
+
+def register_routes(app):
+    app.add_url_rule('/api/translations/<lang>', view_func=get_translations)
+    app.add_url_rule('/api/csrf-token', view_func=csrf_token)
+    app.add_url_rule('/setlang/<lang>', view_func=set_language)
+    app.add_url_rule('/set_dark_mode', view_func=set_dark_mode, methods=['POST'])
+    app.add_url_rule('/service-worker.js', view_func=service_worker)
+    app.add_url_rule('/manifest.json', view_func=manifest)
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/about', view_func=about)
+    app.add_url_rule('/feedback', view_func=feedback, methods=['GET', 'POST'])
+    app.add_url_rule('/dashboard/admin', view_func=admin_dashboard)
+    app.add_url_rule('/dashboard/general', view_func=general_dashboard)
+    app.add_url_rule('/setup', view_func=setup_database_route, methods=['GET'])
+    # Its own limit instead of the defaults: a 15s scrape interval is 240 requests an hour
+    app.add_url_rule('/metrics', view_func=limiter.limit("30 per minute")(metrics_view))
+    app.after_request(add_security_headers)
+    app.after_request(no_store_flashed_pages)
+    app.register_error_handler(403, forbidden)
+    app.register_error_handler(404, page_not_found)
+    app.register_error_handler(413, request_entity_too_large)
+    app.register_error_handler(500, internal_server_error)
+
+def create_app(config=None):
+    """Build the Flask application.
+
+    `config` overrides the environment-derived settings, which lets tests and
+    the startup benchmark skip database setup or optional blueprints.
+    """
+    app = Flask(__name__, template_folder='templates', static_folder='static')
+
+    # Environment configuration
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config['MONGO_URI'] = os.getenv('MONGO_URI', 'mongodb://localhost:27017/ficore')
+    # 'mongodb' (server-side, see session_store.py) or 'cookie' (signed client-side state)
+    app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'mongodb')
+    # Seconds a process may reuse a session it has already seen (0 disables). Anonymous sessions then
+    # cost no read; logged-in ones still cost a small existence check, so logouts apply at once
+    app.config['SESSION_CACHE_TTL'] = int(os.getenv('SESSION_CACHE_TTL', 60))
+    # Write the session back on every request instead of only when it changed
+    app.config['SESSION_REFRESH_EACH_REQUEST'] = os.getenv('SESSION_REFRESH_EACH_REQUEST', 'false').lower() == 'true'
+    app.config['SESSION_MONGODB_DB'] = 'ficore'
+    app.config['SESSION_MONGODB_COLLECTION'] = 'sessions'
+    app.config['SESSION_PERMANENT'] = False
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
+    app.config['SESSION_COOKIE_SECURE'] = os.getenv('FLASK_ENV', 'development') == 'production'
+    app.config['SESSION_COOKIE_HTTPONLY'] = True
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Strict'
+    app.config['SESSION_COOKIE_NAME'] = 'ficore_session'
+    app.jinja_env.undefined = jinja2.Undefined
+
+    # Upload limits: requests above MAX_CONTENT_LENGTH are rejected from the
+    # Content-Length header before the body is read
+    app.config['RECEIPT_MAX_BYTES'] = int(os.getenv('RECEIPT_MAX_BYTES', 5 * 1024 * 1024))
+    app.config['MAX_CONTENT_LENGTH'] = app.config['RECEIPT_MAX_BYTES'] + 64 * 1024
+
+    # Social links
+    app.config['FACEBOOK_URL'] = os.getenv('FACEBOOK_URL', 'https://www.facebook.com')
+    app.config['TWITTER_URL'] = os.getenv('TWITTER_URL', 'https://www.twitter.com')
+    app.config['LINKEDIN_URL'] = os.getenv('LINKEDIN_URL', 'https://www.linkedin.com')
+
+    # Email configuration (mail is sent by the outbox worker, see outbox.py)
+    app.config.update(mail_settings_from_env())
+
+    # PWA configuration
+    app.config['PWA_NAME'] = 'Ficore'
+    app.config['PWA_SHORT_NAME'] = 'Ficore'
+    app.config['PWA_DESCRIPTION'] = 'Manage your finances with ease'
+    app.config['PWA_THEME_COLOR'] = '#007bff'
+    app.config['PWA_BACKGROUND_COLOR'] = '#ffffff'
+    app.config['PWA_DISPLAY'] = 'standalone'
+    app.config['PWA_SCOPE'] = '/'
+    app.config['PWA_START_URL'] = '/'
+
+    # Optional blueprints, comma separated; all of them by default
+    enabled_blueprints = os.getenv('ENABLED_BLUEPRINTS')
+    app.config['ENABLED_BLUEPRINTS'] = (
+        [name.strip() for name in enabled_blueprints.split(',') if name.strip()]
+        if enabled_blueprints is not None else list(OPTIONAL_BLUEPRINTS)
+    )
+    # Per-request Mongo command stats as X-Mongo-* headers (always on in debug)
+    app.config['MONGO_STATS_HEADERS'] = os.getenv('MONGO_STATS_HEADERS', 'false').lower() == 'true'
+    app.config['MONGO_REPEAT_WARNING'] = int(os.getenv('MONGO_REPEAT_WARNING', 10))
+    # Reply sizes re-encode every reply; counted in debug, with the headers or when asked for
+    if os.getenv('MONGO_STATS_BYTES'):
+        app.config['MONGO_STATS_BYTES'] = os.getenv('MONGO_STATS_BYTES').lower() == 'true'
+    # Commands slower than this are logged with their plan in slow_queries
+    app.config['SLOW_QUERY_MS'] = int(os.getenv('SLOW_QUERY_MS', 100))
+    # Default server-side time limit (maxTimeMS) for list and export queries, see queries.py
+    app.config['QUERY_MAX_TIME_MS'] = int(os.getenv('QUERY_MAX_TIME_MS', 2000))
+    # How long an admin-issued profiling token stays valid, in seconds
+    app.config['PROFILE_TOKEN_MAX_AGE'] = int(os.getenv('PROFILE_TOKEN_MAX_AGE', 3600))
+    # Bearer token required to scrape /metrics; without one /metrics is not served
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    # Load tests run from a single address and need the limits switched off
+    app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    # Counters shared by all workers on the host (see ratelimit_storage.py); memory:// is per process
+    app.config['RATELIMIT_STORAGE_URI'] = os.getenv('RATELIMIT_STORAGE_URI', 'sqlite://')
+    app.config['RATELIMIT_STRATEGY'] = os.getenv('RATELIMIT_STRATEGY', 'sliding-window-counter')
+    # Response compression (see compression.py): smallest body worth compressing, and the levels
+    # (moderate ones: every dynamic response pays for them)
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+    app.config['COMPRESS_GZIP_LEVEL'] = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+    app.config['COMPRESS_BROTLI_QUALITY'] = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+    app.config['DATABASE_SETUP_ON_START'] = (
+        os.getenv('FLASK_ENV', 'development') != 'production' or os.getenv('ALLOW_DB_SETUP', 'false').lower() == 'true'
+    )
+
+    if config:
+        app.config.update(config)
+    if not app.config['SECRET_KEY']:
+        raise ValueError("SECRET_KEY must be set in environment variables")
+
+    # Initialize extensions
+    CORS(app)
+    # Registered before the other after_request hooks so it runs after them
+    init_compression(app)
+    csrf.init_app(app)
+    register_listeners(command_listener, pool_listener, slow_query_listener, write_time_listener)
+    mongo.init_app(app)
+    init_session_store(app, mongo.cx)
+    after_fork(lambda: rebind_session_store(app))
+    limiter.init_app(app)
+    babel.init_app(app, locale_selector=get_locale)
+    login_manager.init_app(app)
+    init_monitoring(app)
+    init_metrics(app)
+    init_slowlog(app)
+    init_profiling(app)
+    init_readrouting(app)
+    init_queries(app)
+    init_lite(app)
+    init_assets(app)
+    init_dataversion(app)
+
+    register_blueprints(app)
+    register_routes(app)
+
+    # Jinja2 globals and filters
+    app.jinja_env.globals.update(
+        FACEBOOK_URL=app.config['FACEBOOK_URL'],
+        TWITTER_URL=app.config['TWITTER_URL'],
+        LINKEDIN_URL=app.config['LINKEDIN_URL'],
+        trans=trans
+    )
+    app.add_template_filter(trans_filter, 'trans')
+    app.add_template_filter(format_number, 'format_number')
+    app.add_template_filter(format_currency, 'format_currency')
+    app.add_template_filter(format_datetime, 'format_datetime')
+    app.add_template_filter(format_date, 'format_date')
+
+    with app.app_context():
+        if app.config['DATABASE_SETUP_ON_START']:
+            if not setup_database():
+                logger.error("Application startup aborted due to database initialization failure")
+                raise RuntimeError("Database initialization failed")
+        else:
+            logger.info("Database initialization skipped in production environment")
+    return app
+
+_app = None
+
+def __getattr__(name):
+    # `gunicorn app:app` and `from app import app` build the application on
+    # first access, so importing this module (blueprints, worker, tests) stays cheap
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
+    app = create_app()
     port = int(os.getenv('PORT', 5000))
     logger.info(f"Starting Flask app on port {port} at {datetime.now().strftime('%I:%M %p WAT on %B %d, %Y')}")
-    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_ENV', 'development') == 'development')
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_ENV', 'development') == 'development')
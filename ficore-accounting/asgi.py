@@ -0,0 +1,34 @@
+"""ASGI entry point: the async JSON API (api/) in front of the Flask app.
+
+    gunicorn -c gunicorn.conf.py              # GUNICORN_WORKER_CLASS=uvicorn
+    uvicorn asgi:app --port 5000              # development
+
+API routes are matched first and served on the event loop. Everything
+else, including the Flask /api/translations and /api/csrf-token views,
+falls through to Flask, which runs on a pool of GUNICORN_THREADS threads
+exactly as under the gthread worker.
+"""
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.routing import Mount
+import os
+
+def create_asgi_app(flask_app=None):
+    from app import create_app
+    from api import routes as api_routes
+    flask_app = flask_app or create_app()
+    wsgi = WSGIMiddleware(flask_app, workers=int(os.getenv('GUNICORN_THREADS', 8)))
+    asgi_app = Starlette(routes=api_routes + [Mount('/', app=wsgi)])
+    asgi_app.state.flask_app = flask_app
+    return asgi_app
+
+_app = None
+
+def __getattr__(name):
+    # Built on first access, like app.app
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_asgi_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,197 @@
+"""Static asset build: bundled, minified, fingerprinted and precompressed.
+
+    python assets.py [--fetch]
+
+Concatenates each bundle in BUNDLES (paths relative to static/), minifies
+it, and writes it to static/dist/ under a name carrying a hash of its
+content, with .gz and .br siblings (.br only if brotli is installed).
+static/dist/manifest.json maps logical names to the built files.
+--fetch first downloads missing vendor files (VENDOR) into static/vendor/.
+A bundle with a missing source is skipped, and pages fall back to the
+unbundled files, so a failed download never breaks the site.
+
+At runtime asset_url('app.css') gives the built file's URL (None when it
+was not built). /static/dist/ serves the precompressed sibling the client
+accepts, cached as immutable since a change gives a new name. The service
+worker's precache list is generated from the same manifest.
+"""
+from flask import current_app, request, send_from_directory
+from compression import COMPRESSIBLE_TYPES, negotiate
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import urllib.request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Logical name -> sources, concatenated in order
+BUNDLES = {
+    'app.css': ['vendor/bootstrap.min.css', 'css/styles.css'],
+    'app.js': ['js/bootstrap.bundle.min.js']
+}
+# Single files fingerprinted as they are (they are already compressed)
+FILES = ['icons/icon-192x192.png', 'favicon.ico']
+VENDOR = {
+    'vendor/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css'
+}
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+# A year: the name changes whenever the content does
+MAX_AGE = 365 * 24 * 3600
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+def minify_css(text):
+    text = re.sub(r'/\*(?!!).*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    # Not before a colon: `a :hover` and `a:hover` are different selectors
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+def minify_js(text):
+    # Whitespace only: anything cleverer needs a real parser. The vendor
+    # bundles are minified already.
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+def fetch_vendor(static_folder):
+    for path, url in VENDOR.items():
+        target = os.path.join(static_folder, path)
+        if os.path.exists(target):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                data = response.read()
+        except OSError as e:
+            logger.warning(f"Could not download {url}: {str(e)}")
+            continue
+        with open(target, 'wb') as f:
+            f.write(data)
+        logger.info(f"Downloaded {path} ({len(data)} bytes)")
+
+def _bundle(static_folder, name, sources):
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            text = f.read()
+        if not source.endswith(f'.min{os.path.splitext(source)[1]}'):
+            text = minify_css(text) if name.endswith('.css') else minify_js(text)
+        parts.append(text)
+    return ('\n' if name.endswith('.css') else ';\n').join(parts).encode('utf-8')
+
+def _write(dist, name, data):
+    """Write data under a fingerprinted name with compressed siblings; return the name."""
+    stem, ext = os.path.splitext(name)
+    built = f"{stem}.{hashlib.blake2b(data, digest_size=5).hexdigest()}{ext}"
+    path = os.path.join(dist, built)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if (mimetypes.guess_type(name)[0] or '') in COMPRESSIBLE_TYPES:
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+    return built
+
+def build(static_folder, fetch=False):
+    """Build every bundle and file whose sources exist; return the manifest."""
+    if fetch:
+        fetch_vendor(static_folder)
+    dist = os.path.join(static_folder, DIST)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        missing = [source for source in sources if not os.path.exists(os.path.join(static_folder, source))]
+        if missing:
+            logger.warning(f"Not building {name}, missing {', '.join(missing)} (python assets.py --fetch)")
+            continue
+        manifest[name] = _write(dist, name, _bundle(static_folder, name, sources))
+    for name in FILES:
+        try:
+            with open(os.path.join(static_folder, name), 'rb') as f:
+                manifest[name] = _write(dist, name, f.read())
+        except FileNotFoundError:
+            logger.warning(f"Not fingerprinting {name}, it does not exist")
+    os.makedirs(dist, exist_ok=True)
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.info("No static/dist/manifest.json, serving unbundled assets (python assets.py builds them)")
+        return {}
+
+def asset_url(name):
+    built = current_app.extensions['assets'].get(name)
+    return f"{current_app.static_url_path}/{DIST}/{built}" if built else None
+
+def precache_urls():
+    """URLs of every built asset, for the service worker to precache."""
+    return sorted(f"{current_app.static_url_path}/{DIST}/{built}" for built in current_app.extensions['assets'].values())
+
+def asset_version():
+    """Changes whenever any built asset does."""
+    manifest = current_app.extensions['assets']
+    return hashlib.blake2b(json.dumps(manifest, sort_keys=True).encode(), digest_size=5).hexdigest()
+
+def service_worker_script():
+    """static/sw.js preceded by its precache list and cache version.
+
+    The worker's bytes change with the manifest, so browsers install the
+    new one (and drop the old cache) after every asset build.
+    """
+    with open(os.path.join(current_app.static_folder, 'sw.js'), encoding='utf-8') as f:
+        source = f.read()
+    return (
+        f"const PRECACHE_URLS = {json.dumps(precache_urls())};\n"
+        f"const ASSET_VERSION = {json.dumps(asset_version())};\n{source}"
+    )
+
+def dist_file(filename):
+    directory = os.path.join(current_app.static_folder, DIST)
+    # Whichever siblings the build wrote; serving .br needs no brotli here
+    available = [encoding for encoding, suffix in ENCODINGS.items() if os.path.isfile(os.path.join(directory, filename + suffix))]
+    encoding = negotiate(request.headers.get('Accept-Encoding'), available)
+    if encoding:
+        suffix = ENCODINGS[encoding]
+        response = send_from_directory(
+            directory, filename + suffix, mimetype=mimetypes.guess_type(filename)[0], max_age=MAX_AGE
+        )
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(directory, filename, max_age=MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def init_app(app):
+    app.extensions['assets'] = load_manifest(app.static_folder)
+    # More specific than the static route, so it matches /static/dist/ first
+    app.add_url_rule(f'{app.static_url_path}/{DIST}/<path:filename>', endpoint='dist_file', view_func=dist_file)
+    app.jinja_env.globals['asset_url'] = asset_url
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the static asset bundles into static/dist/.')
+    parser.add_argument('--fetch', action='store_true', help='download missing vendor files first')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    manifest = build(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'), fetch=args.fetch)
+    print(json.dumps(manifest, indent=2, sort_keys=True))
@@ -0,0 +1,108 @@
+"""Compare gunicorn worker modes under the same concurrent load.
+
+Starts gunicorn with gunicorn.conf.py once per mode, drives it with
+loadtest.py (the dashboard and history scenarios by default) and prints
+throughput and latency per mode as JSON:
+
+    MONGO_URI=mongodb://localhost:27017/ficore_bench python benchmarks/seed.py --users 1000
+    MONGO_URI=mongodb://localhost:27017/ficore_bench \\
+        python benchmarks/concurrency.py --modes sync,gthread,uvicorn --workers 2 --concurrency 64
+
+Every mode gets the same number of processes; gthread adds --threads per
+process, gevent --connections greenlets and uvicorn serves asgi:app with
+--threads threads for the Flask pages. Rate limiting is switched off
+because all load comes from one address.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCENARIOS = 'general_dashboard,coin_history,receipts_history,payments_history'
+
+def wait_until_ready(base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urlopen(f'{base_url}/about', timeout=2):
+                return True
+        except (URLError, OSError):
+            time.sleep(0.5)
+    return False
+
+def run_mode(mode, args):
+    port = args.port
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(
+        os.environ,
+        GUNICORN_WORKER_CLASS=mode,
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_WORKER_CONNECTIONS=str(args.connections),
+        PORT=str(port),
+        RATELIMIT_ENABLED='false'
+    )
+    env.setdefault('SECRET_KEY', 'concurrency-benchmark')
+    # Pool size follows the worker mode, see gunicorn.conf.py
+    env.pop('MONGO_MAX_POOL_SIZE', None)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    try:
+        if not wait_until_ready(base_url, args.startup_timeout):
+            server.terminate()
+            raise SystemExit(f'{mode}: gunicorn did not answer within {args.startup_timeout}s:\n{server.communicate()[1][-2000:]}')
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            subprocess.run(
+                [sys.executable, os.path.join(ROOT, 'benchmarks', 'loadtest.py'),
+                 '--base-url', base_url,
+                 '--concurrency', str(args.concurrency),
+                 '--duration', str(args.duration),
+                 '--users', str(args.users),
+                 '--scenarios', args.scenarios,
+                 '--output', output.name],
+                cwd=ROOT, check=True, stdout=subprocess.DEVNULL
+            )
+            report = json.load(open(output.name))
+    finally:
+        server.terminate()
+        server.wait(30)
+    return {
+        'throughput_rps': report['throughput_rps'],
+        'p50_ms': report['p50_ms'],
+        'p95_ms': report['p95_ms'],
+        'p99_ms': report['p99_ms'],
+        'errors': report['errors'],
+        'endpoints': {name: {'requests': stats['requests'], 'p95_ms': stats['p95_ms']} for name, stats in report['endpoints'].items()}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='sync,gthread,uvicorn', help='comma separated GUNICORN_WORKER_CLASS values')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--connections', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=64, help='concurrent virtual clients')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--users', type=int, default=1000, help='number of seeded users to log in as')
+    parser.add_argument('--scenarios', default=DEFAULT_SCENARIOS)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--startup-timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    report = {mode: run_mode(mode, args) for mode in args.modes.split(',')}
+    baseline = report.get('sync')
+    if baseline and baseline['throughput_rps']:
+        for mode, result in report.items():
+            result['throughput_vs_sync'] = round(result['throughput_rps'] / baseline['throughput_rps'], 2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
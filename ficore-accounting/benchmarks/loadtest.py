@@ -0,0 +1,254 @@
+"""Concurrent load generator for the hot Ficore endpoints.
+
+Start the app against a seeded database (see seed.py) with rate limiting
+off, then run:
+
+    RATELIMIT_ENABLED=false MONGO_URI=mongodb://localhost:27017/ficore_bench \\
+        gunicorn app:app -w 4 -b 127.0.0.1:5000
+    python benchmarks/loadtest.py --base-url http://127.0.0.1:5000 \\
+        --concurrency 32 --duration 60 --output baseline.json
+
+Each virtual client logs in as a different seeded user and picks endpoints
+by weight. The JSON report has p50/p95/p99 latency, throughput and errors
+per endpoint, plus MongoDB operations per request taken from serverStatus
+opcounters (run against a mongod that serves nothing else). With
+--baseline the run is compared against an earlier report and the script
+exits non-zero when an endpoint's p95 or Mongo ops per request regressed by
+more than --tolerance.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, build_opener
+
+USER_PREFIX = 'benchuser'
+DEFAULT_PASSWORD = 'BenchPass123!'
+CSRF_TOKEN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+# name -> (path, weight). Exports and reports are rare but expensive.
+SCENARIOS = {
+    'general_dashboard': ('/dashboard/general', 20),
+    'receipts_history': ('/transactions/receipts', 15),
+    'payments_history': ('/transactions/payments', 10),
+    'debtors_dashboard': ('/invoices/debtors', 10),
+    'creditors_dashboard': ('/invoices/creditors', 5),
+    'coin_history': ('/coins/history', 10),
+    'inventory': ('/inventory/', 8),
+    'profit_loss_report': ('/reports/profit_loss', 5),
+    'inventory_report': ('/reports/inventory', 3),
+    'transactions_export': ('/transactions/export/receipt/csv', 2),
+    'invoices_export': ('/invoices/export/debtor/csv', 2),
+    'login': ('/users/login', 10)
+}
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class Client:
+    """One virtual user with its own cookie jar."""
+
+    def __init__(self, base_url, username, password, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def request(self, path, data=None):
+        """Return (status, body_bytes); HTTP errors are returned, not raised."""
+        body = urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.base_url + path, data=body, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except HTTPError as e:
+            return e.code, e.read()
+
+    def login(self):
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+        status, body = self.request('/users/login')
+        match = CSRF_TOKEN.search(body.decode('utf-8', 'replace'))
+        if status != 200 or not match:
+            return status
+        status, body = self.request('/users/login', {
+            'csrf_token': match.group(1),
+            'username': self.username,
+            'password': self.password
+        })
+        # A failed login re-renders the form instead of redirecting away from it
+        if status == 200 and b'name="password"' in body:
+            return 401
+        return status
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, name, seconds, ok):
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds * 1000)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+def run_client(client, scenarios, recorder, deadline, max_requests, counter, rng):
+    names = list(scenarios)
+    weights = [scenarios[name][1] for name in names]
+    started = time.perf_counter()
+    try:
+        ok = 200 <= client.login() < 400
+    except (URLError, OSError):
+        ok = False
+    recorder.add('login', time.perf_counter() - started, ok)
+    while time.monotonic() < deadline:
+        with counter['lock']:
+            if max_requests and counter['issued'] >= max_requests:
+                return
+            counter['issued'] += 1
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            if name == 'login':
+                status = client.login()
+            else:
+                status, _ = client.request(scenarios[name][0])
+            ok = 200 <= status < 400
+        except (URLError, OSError):
+            ok = False
+        recorder.add(name, time.perf_counter() - started, ok)
+
+def opcounters(mongo_uri):
+    if not mongo_uri:
+        return None
+    from pymongo import MongoClient
+    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=2000)
+    try:
+        return dict(client.admin.command('serverStatus')['opcounters'])
+    finally:
+        client.close()
+
+def summarize(recorder, elapsed, ops_before, ops_after):
+    endpoints = {}
+    all_samples = []
+    for name, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        all_samples.extend(samples)
+        endpoints[name] = {
+            'requests': len(samples),
+            'errors': recorder.errors.get(name, 0),
+            'p50_ms': round(percentile(samples, 50), 2),
+            'p95_ms': round(percentile(samples, 95), 2),
+            'p99_ms': round(percentile(samples, 99), 2),
+            'mean_ms': round(sum(samples) / len(samples), 2)
+        }
+    all_samples.sort()
+    total = len(all_samples)
+    report = {
+        'duration_seconds': round(elapsed, 2),
+        'requests': total,
+        'errors': sum(recorder.errors.values()),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(all_samples, 50), 2) if total else None,
+        'p95_ms': round(percentile(all_samples, 95), 2) if total else None,
+        'p99_ms': round(percentile(all_samples, 99), 2) if total else None,
+        'endpoints': endpoints
+    }
+    if ops_before and ops_after and total:
+        # The two serverStatus calls themselves count as commands
+        delta = {op: ops_after.get(op, 0) - ops_before.get(op, 0) for op in ops_before}
+        delta['command'] = max(0, delta.get('command', 0) - 2)
+        report['mongo_ops'] = delta
+        report['mongo_ops_per_request'] = round(sum(delta.values()) / total, 2)
+    return report
+
+def compare(report, baseline, tolerance):
+    """Return a list of human-readable regressions against a baseline report."""
+    regressions = []
+    for name, current in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+    previous_ops = baseline.get('mongo_ops_per_request')
+    current_ops = report.get('mongo_ops_per_request')
+    if previous_ops and current_ops and current_ops > previous_ops * (1 + tolerance):
+        regressions.append(f"mongo ops/request {previous_ops} -> {current_ops}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--requests', type=int, default=0, help='stop after this many requests (0 = duration only)')
+    parser.add_argument('--users', type=int, default=10_000, help='number of seeded users to log in as')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    parser.add_argument('--scenarios', help='comma separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--mongo-uri', default=os.getenv('MONGO_URI'), help='mongod to read opcounters from')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--baseline', help='earlier JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative slowdown, e.g. 0.15 = 15%%')
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS
+    if args.scenarios:
+        scenarios = {name: SCENARIOS[name] for name in args.scenarios.split(',')}
+    rng = random.Random(args.seed)
+    clients = [
+        Client(args.base_url, f"{USER_PREFIX}{rng.randrange(args.users):05d}", args.password, args.timeout)
+        for _ in range(args.concurrency)
+    ]
+    recorder = Recorder()
+    counter = {'lock': threading.Lock(), 'issued': 0}
+    ops_before = opcounters(args.mongo_uri)
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(
+            target=run_client,
+            args=(client, scenarios, recorder, deadline, args.requests, counter, random.Random(args.seed + index)),
+            daemon=True
+        )
+        for index, client in enumerate(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    report = summarize(recorder, elapsed, ops_before, opcounters(args.mongo_uri))
+    report['concurrency'] = args.concurrency
+    report['base_url'] = args.base_url
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
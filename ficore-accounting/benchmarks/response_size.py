@@ -0,0 +1,104 @@
+"""Measure bytes on the wire per endpoint for each response variant.
+
+Logs a seeded user in (see seed.py) and fetches every page and API endpoint
+below once per variant through the ASGI app in-process, counting the body
+bytes as sent (before the client decompresses them) and the header bytes,
+and prints a JSON report:
+
+    MONGO_URI=mongodb://localhost:27017/ficore_bench python benchmarks/response_size.py --user benchuser00000
+
+Page variants: `plain` (no compression), `gzip`, `br` (only if brotli is
+installed) and `lite` (Save-Data, gzip). API variants: `json`, `gzip`,
+`compact` (?compact=1, gzip), `msgpack` (gzip) and `compact-msgpack`.
+`vs_plain` is each variant's total bytes over the first variant's.
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_PASSWORD = 'BenchPass123!'
+PAGES = [
+    '/dashboard/general',
+    '/transactions/receipts',
+    '/transactions/payments',
+    '/invoices/debtors',
+    '/coins/history',
+    '/transactions/export/receipt/csv',
+    '/invoices/export/debtor/csv'
+]
+API = ['/api/invoices', '/api/transactions', '/api/coins/history', '/api/totals', '/api/inventory']
+PAGE_VARIANTS = {
+    'plain': ({}, {'Accept-Encoding': 'identity'}),
+    'gzip': ({}, {'Accept-Encoding': 'gzip'}),
+    'br': ({}, {'Accept-Encoding': 'br'}),
+    'lite': ({}, {'Accept-Encoding': 'gzip', 'Save-Data': 'on'})
+}
+API_VARIANTS = {
+    'json': ({}, {'Accept-Encoding': 'identity'}),
+    'gzip': ({}, {'Accept-Encoding': 'gzip'}),
+    'compact': ({'compact': '1'}, {'Accept-Encoding': 'gzip'}),
+    'msgpack': ({}, {'Accept-Encoding': 'gzip', 'Accept': 'application/msgpack'}),
+    'compact-msgpack': ({'compact': '1'}, {'Accept-Encoding': 'gzip', 'Accept': 'application/msgpack'})
+}
+
+def measure(client, path, params, headers):
+    with client.stream('GET', path, params=params, headers=headers) as response:
+        body = sum(len(chunk) for chunk in response.iter_raw())
+        header_bytes = sum(len(name) + len(value) + 4 for name, value in response.headers.raw)
+        return {
+            'status': response.status_code,
+            'encoding': response.headers.get('Content-Encoding', 'identity'),
+            'body_bytes': body,
+            'header_bytes': header_bytes
+        }
+
+def measure_all(client, paths, variants):
+    report = {}
+    for path in paths:
+        results = {name: measure(client, path, params, headers) for name, (params, headers) in variants.items()}
+        baseline = next(iter(results.values()))
+        base_total = baseline['body_bytes'] + baseline['header_bytes']
+        for result in results.values():
+            result['vs_plain'] = round((result['body_bytes'] + result['header_bytes']) / base_total, 3) if base_total else None
+        report[path] = results
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mongo-uri', default=os.getenv('MONGO_URI', 'mongodb://localhost:27017/ficore_bench'))
+    parser.add_argument('--user', default='benchuser00000', help='a seeded user, ideally a trader with data')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    args = parser.parse_args()
+
+    os.environ.setdefault('SECRET_KEY', 'response-size-benchmark')
+    from starlette.testclient import TestClient
+    import compression
+    from app import create_app
+    from asgi import create_asgi_app
+
+    flask_app = create_app({
+        'MONGO_URI': args.mongo_uri,
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'RATELIMIT_ENABLED': False,
+        'DATABASE_SETUP_ON_START': False
+    })
+    page_variants = dict(PAGE_VARIANTS)
+    if compression.brotli is None:
+        page_variants.pop('br')
+    with TestClient(create_asgi_app(flask_app)) as client:
+        response = client.post('/users/login', data={'username': args.user, 'password': args.password}, follow_redirects=False)
+        if response.status_code != 302:
+            raise SystemExit(f'login failed with {response.status_code}')
+        report = {
+            'pages': measure_all(client, PAGES, page_variants),
+            'api': measure_all(client, API, API_VARIANTS)
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Fill a local MongoDB with synthetic Ficore data for load testing.
+
+    MONGO_URI=mongodb://localhost:27017/ficore_bench \\
+        python benchmarks/seed.py --users 10000 --transactions 1000000 --drop
+
+Collections, validators and indexes are created by the app's own
+setup_database(), so benchmarks run against the production index set.
+Every generated user is `benchuserNNNNN` with the password given by
+--password; loadtest.py logs in with the same convention.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pymongo import MongoClient
+from werkzeug.security import generate_password_hash
+
+USER_PREFIX = 'benchuser'
+DEFAULT_PASSWORD = 'BenchPass123!'
+CATEGORIES = ['sales', 'rent', 'salary', 'utilities', 'supplies', 'transport', 'other']
+UNITS = ['piece', 'carton', 'kg', 'litre', 'bag']
+PARTIES = ['Adamu Stores', 'Bello Ventures', 'Chika Foods', 'Danjuma & Sons', 'Emeka Traders', 'Fatima Textiles']
+
+def username(index):
+    return f"{USER_PREFIX}{index:05d}"
+
+def _owner(rng, users, skew):
+    # paretovariate gives a few heavy accounts and a long tail of light ones,
+    # like real traders; skew=0 spreads documents evenly
+    if skew <= 0:
+        return username(rng.randrange(users))
+    return username(min(int(rng.paretovariate(skew)) - 1, users - 1) if rng.random() < 0.2 else rng.randrange(users))
+
+def _when(rng, now, days):
+    return now - timedelta(seconds=rng.randrange(days * 24 * 3600))
+
+def generate_users(count, password_hash, now):
+    for index in range(count):
+        yield {
+            '_id': username(index),
+            'email': f"{username(index)}@bench.ficoreapp.com",
+            'password': password_hash,
+            'role': 'trader',
+            'coin_balance': 1_000_000,
+            'language': 'en',
+            'dark_mode': False,
+            'setup_complete': True,
+            'display_name': f"Bench User {index}",
+            'created_at': now - timedelta(days=365)
+        }
+
+def generate_transactions(count, rng, args, now):
+    for _ in range(count):
+        created_at = _when(rng, now, args.days)
+        yield {
+            'user_id': _owner(rng, args.users, args.skew),
+            'type': rng.choice(('receipt', 'payment')),
+            'party_name': rng.choice(PARTIES),
+            'amount': round(rng.uniform(100, 500_000), 2),
+            'description': 'Synthetic benchmark transaction',
+            'category': rng.choice(CATEGORIES),
+            'photo_url': None,
+            'is_recurring': False,
+            'recurring_period': 'none',
+            'date': created_at,
+            'created_at': created_at,
+            'updated_at': created_at
+        }
+
+def generate_invoices(count, rng, args, now):
+    for number in range(1, count + 1):
+        created_at = _when(rng, now, args.days)
+        items = [{
+            'desc': f"Item {rng.randrange(1000)}",
+            'qty': float(rng.randint(1, 50)),
+            'price': round(rng.uniform(50, 20_000), 2)
+        } for _ in range(rng.randint(1, args.max_invoice_items))]
+        total = sum(item['qty'] * item['price'] for item in items)
+        status = rng.choice(('unpaid', 'partially_paid', 'paid'))
+        paid_amount = {'unpaid': 0, 'partially_paid': round(total / 2, 2), 'paid': total}[status]
+        yield {
+            'user_id': _owner(rng, args.users, args.skew),
+            'type': rng.choice(('debtor', 'creditor')),
+            'party_name': rng.choice(PARTIES),
+            'phone': None,
+            'items': items,
+            'total': total,
+            'paid_amount': paid_amount,
+            'due_date': created_at + timedelta(days=30),
+            'status': status,
+            'payments': [],
+            'created_at': created_at,
+            'invoice_number': str(number).zfill(6)
+        }
+
+def generate_inventory(count, rng, args, now):
+    for index in range(count):
+        buying_price = round(rng.uniform(50, 10_000), 2)
+        yield {
+            'user_id': _owner(rng, args.users, args.skew),
+            'item_name': f"Product {index}",
+            'qty': rng.randint(0, 500),
+            'unit': rng.choice(UNITS),
+            'buying_price': buying_price,
+            'selling_price': round(buying_price * rng.uniform(1.05, 1.6), 2),
+            'threshold': rng.randint(1, 20),
+            'created_at': _when(rng, now, args.days)
+        }
+
+def generate_coin_transactions(count, rng, args, now):
+    for index in range(count):
+        purchase = rng.random() < 0.2
+        yield {
+            'user_id': _owner(rng, args.users, args.skew),
+            'amount': rng.choice((10, 50, 100)) if purchase else -rng.randint(1, 3),
+            'type': 'purchase' if purchase else 'spend',
+            'ref': f"BENCH_{index}",
+            'date': _when(rng, now, args.days)
+        }
+
+def insert_batches(collection, documents, batch_size):
+    inserted = 0
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            inserted += len(collection.insert_many(batch, ordered=False, bypass_document_validation=True).inserted_ids)
+            batch = []
+    if batch:
+        inserted += len(collection.insert_many(batch, ordered=False, bypass_document_validation=True).inserted_ids)
+    return inserted
+
+def setup_schema(mongo_uri):
+    """Create collections and indexes through the application itself."""
+    from app import create_app
+    create_app({'MONGO_URI': mongo_uri, 'DATABASE_SETUP_ON_START': True})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mongo-uri', default=os.getenv('MONGO_URI', 'mongodb://localhost:27017/ficore_bench'))
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--invoices', type=int, default=200_000)
+    parser.add_argument('--max-invoice-items', type=int, default=5)
+    parser.add_argument('--inventory', type=int, default=100_000)
+    parser.add_argument('--coin-transactions', type=int, default=300_000)
+    parser.add_argument('--days', type=int, default=365, help='spread documents over this many past days')
+    parser.add_argument('--skew', type=float, default=1.2, help='Pareto shape for per-user volume; 0 = uniform')
+    parser.add_argument('--batch-size', type=int, default=5_000)
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='drop the target database first')
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    db = client.get_default_database('ficore_bench')
+    if args.drop:
+        client.drop_database(db.name)
+    os.environ.setdefault('SECRET_KEY', 'seed-benchmark')
+    setup_schema(args.mongo_uri)
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    # One hash for every account: hashing 10k passwords would dominate seeding
+    password_hash = generate_password_hash(args.password)
+    plan = [
+        ('users', generate_users(args.users, password_hash, now)),
+        ('transactions', generate_transactions(args.transactions, rng, args, now)),
+        ('invoices', generate_invoices(args.invoices, rng, args, now)),
+        ('inventory', generate_inventory(args.inventory, rng, args, now)),
+        ('coin_transactions', generate_coin_transactions(args.coin_transactions, rng, args, now))
+    ]
+    report = {'database': db.name, 'collections': {}}
+    started = time.perf_counter()
+    for name, documents in plan:
+        collection_started = time.perf_counter()
+        count = insert_batches(db[name], documents, args.batch_size)
+        elapsed = time.perf_counter() - collection_started
+        report['collections'][name] = {'inserted': count, 'seconds': round(elapsed, 2), 'docs_per_second': round(count / elapsed) if elapsed else None}
+        print(f"{name}: {count} documents in {elapsed:.1f}s", file=sys.stderr)
+    report['seconds'] = round(time.perf_counter() - started, 2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Count session-store round trips per request for each session backend.
+
+Logs a test user in and browses a fixed set of pages through the Flask test
+client, counting the Mongo commands sent to the sessions collection, and
+prints a JSON report with one entry per variant:
+
+    MONGO_URI=mongodb://localhost:27017/ficore_bench python benchmarks/session_io.py --rounds 20
+
+`before` is Flask-Session's behaviour (read every request, write every
+request); `mongodb` is the default store from session_store.py (write only
+on change, per-process read cache); `mongodb-nocache` turns the read cache
+off; `cookie` keeps the session client-side. The test user is logged in, so
+`mongodb` and `mongodb-nocache` send the same number of session commands:
+for a logged-in session the cache swaps the body read for an existence
+check, it does not remove the round trip.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from pymongo import MongoClient, monitoring
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USERNAME = 'sessionbench'
+PASSWORD = 'SessionBench123!'
+PAGES = ['/dashboard/general', '/transactions/receipts', '/coins/history', '/invoices/debtors', '/about', '/dashboard/general']
+
+VARIANTS = {
+    'before': {'SESSION_BACKEND': 'mongodb', 'SESSION_CACHE_TTL': 0, 'SESSION_REFRESH_EACH_REQUEST': True},
+    'mongodb': {'SESSION_BACKEND': 'mongodb', 'SESSION_CACHE_TTL': 60, 'SESSION_REFRESH_EACH_REQUEST': False},
+    'mongodb-nocache': {'SESSION_BACKEND': 'mongodb', 'SESSION_CACHE_TTL': 0, 'SESSION_REFRESH_EACH_REQUEST': False},
+    'cookie': {'SESSION_BACKEND': 'cookie', 'SESSION_CACHE_TTL': 0, 'SESSION_REFRESH_EACH_REQUEST': False}
+}
+
+class SessionCommands(monitoring.CommandListener):
+    """Count commands by (command, collection) while enabled."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.counts = Counter()
+        self.enabled = False
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if not self.enabled:
+            return
+        target = event.command.get(event.command_name)
+        with self._lock:
+            self.counts['total'] += 1
+            if target == self.collection:
+                self.counts[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def ensure_user(mongo_uri):
+    db = MongoClient(mongo_uri).get_default_database()
+    db.users.update_one(
+        {'_id': USERNAME},
+        {'$setOnInsert': {
+            'email': f'{USERNAME}@example.com',
+            'password': generate_password_hash(PASSWORD),
+            'role': 'trader',
+            'coin_balance': 100,
+            'language': 'en',
+            'setup_complete': True,
+            'created_at': datetime.utcnow()
+        }},
+        upsert=True
+    )
+
+def run_variant(create_app, listener, mongo_uri, overrides, rounds):
+    flask_app = create_app({
+        'MONGO_URI': mongo_uri,
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'RATELIMIT_ENABLED': False,
+        'DATABASE_SETUP_ON_START': False,
+        **overrides
+    })
+    client = flask_app.test_client()
+    response = client.post('/users/login', data={'username': USERNAME, 'password': PASSWORD})
+    if response.status_code != 302:
+        raise SystemExit(f'login failed with {response.status_code}')
+    listener.counts.clear()
+    listener.enabled = True
+    requests = 0
+    try:
+        for _ in range(rounds):
+            for page in PAGES:
+                client.get(page)
+                requests += 1
+    finally:
+        listener.enabled = False
+    counts = listener.counts
+    session_commands = sum(count for name, count in counts.items() if name != 'total')
+    return {
+        'requests': requests,
+        'session_reads': counts['find'],
+        'session_writes': counts['update'],
+        'session_deletes': counts['delete'],
+        'session_commands_per_request': round(session_commands / requests, 3),
+        'mongo_commands_per_request': round(counts['total'] / requests, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mongo-uri', default=os.getenv('MONGO_URI', 'mongodb://localhost:27017/ficore_bench'))
+    parser.add_argument('--rounds', type=int, default=20, help='times to walk the page list per variant')
+    parser.add_argument('--variants', help='comma separated subset of: ' + ', '.join(VARIANTS))
+    args = parser.parse_args()
+
+    os.environ.setdefault('SECRET_KEY', 'session-io-benchmark')
+    # The listener has to be known before the shared client is created
+    from database import register_listeners
+    listener = SessionCommands('sessions')
+    register_listeners(listener)
+    from app import create_app
+
+    ensure_user(args.mongo_uri)
+    names = args.variants.split(',') if args.variants else list(VARIANTS)
+    report = {name: run_variant(create_app, listener, args.mongo_uri, VARIANTS[name], args.rounds) for name in names}
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
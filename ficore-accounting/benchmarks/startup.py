@@ -0,0 +1,95 @@
+"""Measure cold-start cost of the web app.
+
+Runs each measurement in a fresh interpreter so nothing is cached between
+runs, and prints a JSON report:
+
+    python benchmarks/startup.py --runs 5 --top 15
+
+`import_ms` is the wall time of `import app` (cheap: the app is built lazily),
+`create_app_ms` the time to build the application and `first_request_ms`
+the time to serve the first GET of --path through the test client.
+No database is needed: setup is skipped, create_app opens no connection
+and sessions are signed cookies, so the first request stays off Mongo.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMING_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+flask_app = app_module.create_app({'DATABASE_SETUP_ON_START': False, 'WTF_CSRF_ENABLED': False})
+created = time.perf_counter()
+response = flask_app.test_client().get(%(path)r)
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - start) * 1000,
+    'status': response.status_code
+}))
+"""
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault('SECRET_KEY', 'startup-benchmark')
+    env.setdefault('SESSION_BACKEND', 'cookie')
+    return env
+
+def measure_once(path):
+    result = subprocess.run(
+        [sys.executable, '-c', TIMING_SCRIPT % {'path': path}],
+        cwd=ROOT, env=_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def import_profile(module, top):
+    """Return the slowest top-level imports reported by `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=_env(), capture_output=True, text=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and len(match.group(3)) <= 1:
+            modules.append({'module': match.group(4), 'cumulative_ms': int(match.group(2)) / 1000})
+    modules.sort(key=lambda item: item['cumulative_ms'], reverse=True)
+    return modules[:top]
+
+def summarize(samples, key):
+    values = [sample[key] for sample in samples]
+    return {'median': round(statistics.median(values), 2), 'min': round(min(values), 2), 'max': round(max(values), 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='number of slowest imports to list')
+    # Not '/': pages built on templates/base.html link to endpoints that do not exist yet
+    parser.add_argument('--path', default='/manifest.json', help='URL used for the first request')
+    parser.add_argument('--module', default='app', help='module profiled with -X importtime')
+    args = parser.parse_args()
+
+    samples = [measure_once(args.path) for _ in range(args.runs)]
+    report = {
+        'runs': args.runs,
+        'path': args.path,
+        'status': samples[-1]['status'],
+        'timings_ms': {key: summarize(samples, key) for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms')},
+        'slowest_imports': import_profile(args.module, args.top)
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
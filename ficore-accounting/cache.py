@@ -0,0 +1,131 @@
+from flask import flash
+from pymongo.errors import PyMongoError
+from collections import OrderedDict, namedtuple
+from translations import trans_function
+from metrics import record_cache
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# data: what the loader returned; complete: False for partial (timed out)
+# results; stale: data is a saved snapshot; saved_at: when it was saved
+Result = namedtuple('Result', 'data complete stale saved_at')
+
+class SnapshotCache:
+    """Last good result per key, served when the live fetch fails.
+
+    The loader runs on every request while Mongo is healthy; the cache only
+    remembers its last complete result. When the loader raises a
+    PyMongoError the snapshot is served instead, marked stale, and that key
+    stays degraded for `retry_after` seconds: its requests get the snapshot
+    straight away rather than waiting on server selection again, while a
+    background thread retries the loader and replaces the snapshot once the
+    database answers. Other keys keep fetching live. A partial result also
+    falls back to the snapshot, but the next request tries live again.
+
+    Bounded to `max_entries` keys (least recently used are dropped);
+    snapshots older than `max_age` seconds are never served.
+    """
+
+    def __init__(self, name, max_entries=1000, max_age=3600, retry_after=5, max_refreshers=4):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self.max_refreshers = max_refreshers
+        self._snapshots = OrderedDict()
+        self._refreshing = set()
+        self._degraded_until = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """Return a Result for key. loader() returns (data, complete).
+
+        Raises the loader's PyMongoError only when there is no snapshot to
+        fall back to.
+        """
+        snapshot = self._snapshot(key)
+        if snapshot is not None and time.monotonic() < self._degraded_until.get(key, 0):
+            return self._serve_stale(key, loader, snapshot)
+        try:
+            data, complete = loader()
+        except PyMongoError as e:
+            logger.warning(f"Live fetch for {self.name} cache failed: {str(e)}")
+            if snapshot is None:
+                raise
+            self._degrade(key)
+            return self._serve_stale(key, loader, snapshot)
+        if complete:
+            self._store(key, data)
+        elif snapshot is not None:
+            # A slow query, not an outage: no degraded period, and no
+            # background re-runs of the loader that just timed out
+            return self._serve_stale(key, loader, snapshot, refresh=False)
+        record_cache(self.name, False)
+        return Result(data, complete, False, None)
+
+    def _snapshot(self, key):
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is None:
+                return None
+            if time.time() - snapshot[1] > self.max_age:
+                del self._snapshots[key]
+                return None
+            self._snapshots.move_to_end(key)
+            return snapshot
+
+    def _store(self, key, data):
+        with self._lock:
+            self._snapshots[key] = (data, time.time())
+            self._snapshots.move_to_end(key)
+            self._degraded_until.pop(key, None)
+            while len(self._snapshots) > self.max_entries:
+                dropped, _ = self._snapshots.popitem(last=False)
+                self._degraded_until.pop(dropped, None)
+
+    def _degrade(self, key):
+        with self._lock:
+            self._degraded_until[key] = time.monotonic() + self.retry_after
+
+    def _serve_stale(self, key, loader, snapshot, refresh=True):
+        record_cache(self.name, True)
+        if refresh:
+            self._refresh_in_background(key, loader)
+        return Result(snapshot[0], True, True, snapshot[1])
+
+    def _refresh_in_background(self, key, loader):
+        with self._lock:
+            if key in self._refreshing or len(self._refreshing) >= self.max_refreshers:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key, loader), name=f'{self.name}-refresh', daemon=True).start()
+
+    def _refresh(self, key, loader, attempts=6):
+        delay = self.retry_after
+        try:
+            for _ in range(attempts):
+                try:
+                    data, complete = loader()
+                    if complete:
+                        self._store(key, data)
+                        logger.info(f"Refreshed {self.name} snapshot after degraded fetch")
+                        return
+                except PyMongoError as e:
+                    logger.debug(f"Background refresh of {self.name} failed: {str(e)}")
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+            self._degraded_until.clear()
+
+def stale_data_notice(saved_at):
+    message = trans_function('stale_data', default='The database is not responding, so this page shows data saved at {time}.')
+    flash(message.format(time=time.strftime('%H:%M UTC', time.gmtime(saved_at))), 'warning')
@@ -4,11 +4,16 @@ from wtforms import FloatField, StringField, SelectField, validators, SubmitFiel
 from flask_wtf.file import FileField, FileAllowed
 from flask_login import login_required, current_user
 from datetime import datetime
-from app.utils import trans_function as trans, requires_role, check_coin_balance
+from utils import trans_function as trans, requires_role, check_coin_balance
 from bson import ObjectId
 from app import limiter
 import logging
-from gridfs import GridFS
+from storage import store_file, release_files, sniff_content_type, FileTooLargeError
+from images import schedule_receipt_variants
+from queries import bounded_find, partial_results_notice
+from cache import SnapshotCache, stale_data_notice
+from lite import render_page
+from dataversion import BUMP, conditional_list
 
 logger = logging.getLogger(__name__)
 
@@ -35,10 +40,6 @@ class ReceiptUploadForm(FlaskForm):
 def credit_coins(user_id, amount, ref, type='purchase'):
     """Credit coins to a user and log transaction."""
     mongo = current_app.extensions['pymongo']
-    mongo.db.users.update_one(
-        {'_id': ObjectId(user_id)},
-        {'$inc': {'coin_balance': amount}}
-    )
     mongo.db.coin_transactions.insert_one({
         'user_id': user_id,
         'amount': amount,
@@ -46,6 +47,11 @@ def credit_coins(user_id, amount, ref, type='purchase'):
         'ref': ref,
         'date': datetime.utcnow()
     })
+    # Last: the data version also covers the log entry (dataversion.py)
+    mongo.db.users.update_one(
+        {'_id': ObjectId(user_id)},
+        {'$inc': {'coin_balance': amount, **BUMP}}
+    )
     # Log audit action
     try:
         mongo.db.audit_logs.insert_one({
@@ -80,25 +86,47 @@ def purchase():
             return render_template('coins/purchase.html', form=form), 500
     return render_template('coins/purchase.html', form=form)
 
+# Last good history per user, served while Mongo is failing or too slow
+history_cache = SnapshotCache('coin_history')
+
+def load_history(mongo, user_id):
+    # May run on a background refresh thread: takes the handle and id explicitly
+    user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+    query = {'user_id': user_id}
+    if user.get('role') == 'admin':
+        query.pop('user_id')
+    transactions, transactions_complete = bounded_find(mongo.db.coin_transactions, query, sort=[('date', -1)], limit=50)
+    for tx in transactions:
+        tx['_id'] = str(tx['_id'])
+    receipts, receipts_complete = bounded_find(
+        mongo.db.receipts,
+        {'user_id': user_id},
+        {'filename': 1, 'upload_date': 1, 'variants': 1},
+        sort=[('upload_date', -1)],
+        limit=12
+    )
+    data = {'transactions': transactions, 'receipts': receipts, 'coin_balance': user.get('coin_balance', 0)}
+    return data, transactions_complete and receipts_complete
+
 @coins_bp.route('/history', methods=['GET'])
 @login_required
 @limiter.limit("100 per hour")
+@conditional_list
 def history():
     """View coin transaction history."""
     try:
         mongo = current_app.extensions['pymongo']
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user.id)})
-        query = {'user_id': str(current_user.id)}
-        if user.get('role') == 'admin':
-            query.pop('user_id')
-        transactions = list(mongo.db.coin_transactions.find(query).sort('date', -1).limit(50))
-        for tx in transactions:
-            tx['_id'] = str(tx['_id'])
-        return render_template('coins/history.html', transactions=transactions, coin_balance=user.get('coin_balance', 0))
+        user_id = str(current_user.id)
+        result = history_cache.get(user_id, lambda: load_history(mongo, user_id))
+        if result.stale:
+            stale_data_notice(result.saved_at)
+        elif not result.complete:
+            partial_results_notice()
+        return render_page('coins/history.html', **result.data)
     except Exception as e:
         logger.error(f"Error fetching coin history for user {current_user.id}: {str(e)}")
         flash(trans('core_something_went_wrong', default='An error occurred'), 'danger')
-        return render_template('coins/history.html', transactions=[], coin_balance=0), 500
+        return render_page('coins/history.html', transactions=[], receipts=[], coin_balance=0), 500
 
 @coins_bp.route('/receipt_upload', methods=['GET', 'POST'])
 @login_required
@@ -111,15 +139,33 @@ def receipt_upload():
         flash(trans('insufficient_coins', default='Insufficient coins to upload receipt. Purchase more coins.'), 'danger')
         return redirect(url_for('coins.purchase'))
     if form.validate_on_submit():
+        mongo = current_app.extensions['pymongo']
+        file_id = receipt_id = None
+        charged = False
         try:
-            mongo = current_app.extensions['pymongo']
-            fs = GridFS(mongo.db)
             receipt_file = form.receipt.data
-            file_id = fs.put(receipt_file, filename=receipt_file.filename, user_id=str(current_user.id), upload_date=datetime.utcnow())
-            mongo.db.users.update_one(
-                {'_id': ObjectId(current_user.id)},
-                {'$inc': {'coin_balance': -1}}
+            # The browser-supplied mimetype is not trusted: check the bytes
+            content_type = sniff_content_type(receipt_file.stream)
+            if content_type is None:
+                flash(trans('invalid_file_type', default='Only JPG, PNG, or PDF files are allowed'), 'danger')
+                return render_template('coins/receipt_upload.html', form=form), 400
+            upload_date = datetime.utcnow()
+            file_id, sha256 = store_file(
+                mongo.db,
+                receipt_file.stream,
+                receipt_file.filename,
+                content_type=content_type,
+                max_bytes=current_app.config['RECEIPT_MAX_BYTES'],
+                metadata={'user_id': str(current_user.id)}
             )
+            receipt_id = mongo.db.receipts.insert_one({
+                'user_id': str(current_user.id),
+                'file_id': file_id,
+                'filename': receipt_file.filename,
+                'content_type': content_type,
+                'sha256': sha256,
+                'upload_date': upload_date
+            }).inserted_id
             ref = f"RECEIPT_UPLOAD_{datetime.utcnow().isoformat()}"
             mongo.db.coin_transactions.insert_one({
                 'user_id': str(current_user.id),
@@ -128,6 +174,12 @@ def receipt_upload():
                 'ref': ref,
                 'date': datetime.utcnow()
             })
+            mongo.db.users.update_one(
+                {'_id': current_user.id},
+                {'$inc': {'coin_balance': -1, **BUMP}}
+            )
+            charged = True
+            schedule_receipt_variants(current_app.config['MONGO_URI'], file_id, content_type)
             mongo.db.audit_logs.insert_one({
                 'admin_id': 'system',
                 'action': 'receipt_upload',
@@ -137,12 +189,26 @@ def receipt_upload():
             flash(trans('receipt_uploaded', default='Receipt uploaded successfully'), 'success')
             logger.info(f"User {current_user.id} uploaded receipt {file_id}")
             return redirect(url_for('coins.history'))
+        except FileTooLargeError:
+            flash(trans('file_too_large', default='Receipt file is too large'), 'danger')
+            return render_template('coins/receipt_upload.html', form=form), 413
         except Exception as e:
             logger.error(f"Error uploading receipt for user {current_user.id}: {str(e)}")
+            if file_id is not None and not charged:
+                discard_receipt(mongo.db, file_id, receipt_id)
             flash(trans('core_something_went_wrong', default='An error occurred'), 'danger')
             return render_template('coins/receipt_upload.html', form=form), 500
     return render_template('coins/receipt_upload.html', form=form)
 
+def discard_receipt(db, file_id, receipt_id=None):
+    """Undo an upload that failed before it was paid for: its record and blob reference."""
+    try:
+        if receipt_id is not None:
+            db.receipts.delete_one({'_id': receipt_id})
+        release_files(db, [file_id])
+    except Exception as e:
+        logger.error(f"Error discarding receipt file {file_id}: {str(e)}")
+
 @coins_bp.route('/balance', methods=['GET'])
 @login_required
 @limiter.limit("100 per minute")
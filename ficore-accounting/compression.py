@@ -0,0 +1,97 @@
+"""Response compression, negotiated from Accept-Encoding.
+
+Brotli when the client accepts it and the brotli package is installed,
+gzip otherwise. Only text bodies (HTML, CSV, JSON, JS, CSS, SVG) of at
+least COMPRESS_MIN_SIZE bytes are compressed: images and PDFs are already
+compressed and tiny bodies gain nothing. The Flask pages go through the
+after_request hook below; the API compresses its own responses with the
+same functions (api/common.py).
+
+HTML pages carry the CSRF token, so an HTML response to a request with a
+query string or a form body is sent uncompressed: if the page echoes that
+input (a search box, a form shown again with its errors), its compressed
+size would let an attacker guess the token byte by byte (BREACH).
+"""
+from flask import current_app, request
+import gzip
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/csv', 'text/plain', 'text/css', 'text/javascript',
+    'application/javascript', 'application/json', 'application/manifest+json', 'image/svg+xml'
+)
+
+def _qualities(accept_encoding):
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities
+
+def negotiate(accept_encoding, candidates=None):
+    """The best of candidates (by default br, if brotli is installed, and
+    gzip; earlier wins a tie) for an Accept-Encoding header, or None."""
+    qualities = _qualities(accept_encoding or '')
+    default = qualities.get('*', 0.0)
+    if candidates is None:
+        candidates = (['br'] if brotli is not None else []) + ['gzip']
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda coding: qualities.get(coding, default))
+    return best if qualities.get(best, default) > 0 else None
+
+def compressible(content_type):
+    return content_type is not None and content_type.split(';')[0].strip().lower() in COMPRESSIBLE_TYPES
+
+def compress(data, encoding, config):
+    """data compressed with encoding at the levels from config."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY'])
+    # mtime=0 keeps the output (and so any ETag of it) stable
+    return gzip.compress(data, compresslevel=config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+def reflects_input(response):
+    """An HTML response to a request carrying input that the page may echo."""
+    return response.mimetype == 'text/html' and bool(request.query_string or request.form)
+
+def compress_response(response):
+    if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers or not compressible(response.mimetype)
+            or reflects_input(response)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    # send_file responses (CSV exports, static files) are read into memory;
+    # the exports are bounded queries and the static files are small
+    response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+    response.set_data(compress(data, encoding, current_app.config))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # Same content, different bytes
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_app(app):
+    if brotli is None:
+        logger.info("brotli is not installed, compressing responses with gzip only")
+    app.after_request(compress_response)
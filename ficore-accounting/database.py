@@ -1,23 +1,186 @@
 from pymongo import MongoClient
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+from importlib.util import find_spec
 import os
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_URI = 'mongodb://localhost:27017/minirecords'
+DEFAULT_DB = 'minirecords'
+
+# One MongoClient per URI per process. A MongoClient is thread-safe and
+# owns the connection pool, so creating one per call (and pinging it)
+# throws the pool away every time.
+_clients = {}
+_databases = {}
+# Motor clients for the async API (api/), one per URI per process
+_async_clients = {}
+_clients_lock = threading.Lock()
+_event_listeners = []
+_fork_callbacks = []
+
+def client_options():
+    """Pool, timeout and compression settings for every client, from the environment."""
+    options = {
+        'maxPoolSize': int(os.getenv('MONGO_MAX_POOL_SIZE', 50)),
+        'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+        'maxIdleTimeMS': int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000)),
+        'waitQueueTimeoutMS': int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+        'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        'retryWrites': True,
+        'uuidRepresentation': 'standard',
+        'appname': os.getenv('MONGO_APP_NAME', 'ficore')
+    }
+    compressors = [name.strip() for name in os.getenv('MONGO_COMPRESSORS', '').split(',') if name.strip()]
+    if 'zstd' in compressors and find_spec('zstandard') is None:
+        logger.warning("zstd compression requested but the zstandard package is not installed, skipping it")
+        compressors.remove('zstd')
+    if 'snappy' in compressors and find_spec('snappy') is None:
+        logger.warning("snappy compression requested but python-snappy is not installed, skipping it")
+        compressors.remove('snappy')
+    if compressors:
+        options['compressors'] = ','.join(compressors)
+        if 'zlib' in compressors:
+            options['zlibCompressionLevel'] = int(os.getenv('MONGO_ZLIB_LEVEL', 1))
+    return options
+
+def register_listeners(*listeners):
+    """Attach pymongo event listeners to every client created afterwards."""
+    for listener in listeners:
+        if listener not in _event_listeners:
+            _event_listeners.append(listener)
+
+def after_fork(callback):
+    """Run callback in a forked child once its inherited clients are dropped."""
+    _fork_callbacks.append(callback)
+
+def get_client(mongo_uri=None):
+    """Return this process's shared MongoClient for mongo_uri.
+
+    The client is created with connect=False, so nothing touches the network
+    until the first operation, and is never pinged: server selection fails
+    fast (serverSelectionTimeoutMS) if the server is unreachable.
+    """
+    mongo_uri = mongo_uri or os.getenv('MONGO_URI', DEFAULT_URI)
+    client = _clients.get(mongo_uri)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(mongo_uri)
+            if client is None:
+                client = MongoClient(mongo_uri, connect=False, event_listeners=list(_event_listeners), **client_options())
+                _clients[mongo_uri] = client
+    return client
+
 def get_db(mongo_uri=None):
     """
-    Connects to the MongoDB database specified by mongo_uri.
-    Returns the database object.
-    """
-    try:
-        mongo_uri = mongo_uri or os.getenv('MONGO_URI', 'mongodb://localhost:27017/minirecords')
-        client = MongoClient(mongo_uri, uuidRepresentation='standard')
-        db_name = mongo_uri.split('/')[-1].split('?')[0] or 'minirecords'
-        db = client[db_name]
-        # Test connection
-        db.command('ping')
-        logger.info(f"Successfully connected to MongoDB database: {db_name}")
-        return db
-    except Exception as e:
-        logger.error(f"Error connecting to database: {str(e)}")
-        raise
+    Returns the database named in mongo_uri, on the shared client.
+    """
+    mongo_uri = mongo_uri or os.getenv('MONGO_URI', DEFAULT_URI)
+    db = _databases.get(mongo_uri)
+    if db is None:
+        db = _databases[mongo_uri] = get_client(mongo_uri).get_default_database(DEFAULT_DB)
+    return db
+
+def get_async_client(mongo_uri=None):
+    """Return this process's Motor client for mongo_uri, for the async API.
+
+    Same options as get_client, except that the pool is sized by
+    API_MONGO_MAX_POOL_SIZE. Every coroutine on the event loop shares the
+    pool; operations beyond its size wait up to waitQueueTimeoutMS.
+    """
+    from motor.motor_asyncio import AsyncIOMotorClient
+    mongo_uri = mongo_uri or os.getenv('MONGO_URI', DEFAULT_URI)
+    client = _async_clients.get(mongo_uri)
+    if client is None:
+        options = dict(client_options(), maxPoolSize=int(os.getenv('API_MONGO_MAX_POOL_SIZE', 100)))
+        client = AsyncIOMotorClient(mongo_uri, connect=False, event_listeners=list(_event_listeners), **options)
+        _async_clients[mongo_uri] = client
+    return client
+
+def get_async_db(mongo_uri=None):
+    """
+    Returns the database named in mongo_uri, on the shared Motor client.
+    """
+    return get_async_client(mongo_uri).get_default_database(DEFAULT_DB)
+
+def reporting_read_preference():
+    """Read preference for heavy, staleness-tolerant reads (reports, exports).
+
+    REPORTING_READ_PREFERENCE defaults to secondaryPreferred, bounded by
+    MONGO_MAX_STALENESS_SECONDS (90 is the smallest value the server accepts).
+    On a standalone server the preference is ignored and reads go to it.
+    """
+    mode = os.getenv('REPORTING_READ_PREFERENCE', 'secondaryPreferred')
+    if mode == 'primary':
+        return make_read_preference(0, None)
+    max_staleness = max(int(os.getenv('MONGO_MAX_STALENESS_SECONDS', 90)), 90)
+    return make_read_preference(read_pref_mode_from_name(mode), None, max_staleness=max_staleness)
+
+def get_reporting_db(mongo_uri=None):
+    """
+    Returns the database from get_db, reading from secondaries where allowed.
+    """
+    mongo_uri = mongo_uri or os.getenv('MONGO_URI', DEFAULT_URI)
+    key = (mongo_uri, 'reporting')
+    db = _databases.get(key)
+    if db is None:
+        db = _databases[key] = get_db(mongo_uri).with_options(read_preference=reporting_read_preference())
+    return db
+
+def close_all():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        _databases.clear()
+        for client in _async_clients.values():
+            client.close()
+        _async_clients.clear()
+
+def _reset_after_fork():
+    # Sockets inherited from the parent (e.g. gunicorn --preload) must not
+    # be shared; drop the references and let each child connect lazily.
+    global _clients_lock
+    _clients.clear()
+    _databases.clear()
+    _async_clients.clear()
+    _clients_lock = threading.Lock()
+    for callback in _fork_callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Error in after-fork callback: {str(e)}")
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+class Mongo:
+    """Flask-PyMongo compatible handle (`mongo.db`, `mongo.cx`) on the shared client.
+
+    Both attributes resolve through get_client on every access, so they
+    always point at the current process's client, including after a fork.
+    """
+
+    def __init__(self, app=None):
+        self.uri = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.uri = app.config['MONGO_URI']
+        app.extensions['pymongo'] = self
+
+    @property
+    def cx(self):
+        return get_client(self.uri)
+
+    @property
+    def db(self):
+        return get_db(self.uri)
+
+    @property
+    def reporting_db(self):
+        return get_reporting_db(self.uri)
@@ -0,0 +1,105 @@
+"""Per-user data version, for conditional GETs of the list pages.
+
+Every write to a user's records increments users.data_version; paths that
+already update the user document (spending coins) fold the increment into
+that update. A list view decorated with @conditional_list sends an ETag
+made from the version, the view and its filters, the page variant and the
+release. A client revalidating with that ETag gets a 304 without a single
+list query: the version arrives with the user document Flask-Login loads
+for every request anyway.
+
+Bump after the write, never before it: a reader that sees the new version
+must also see the new data.
+"""
+from flask import current_app, make_response, request, session
+from flask.globals import request_ctx
+from flask_login import current_user
+from functools import wraps
+from datetime import date
+from lite import lite_mode
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+VERSION_FIELD = 'data_version'
+BUMP = {VERSION_FIELD: 1}
+
+def bump(db, user_id):
+    db.users.update_one({'_id': user_id}, {'$inc': BUMP})
+
+async def bump_async(db, user_id):
+    await db.users.update_one({'_id': user_id}, {'$inc': BUMP})
+
+def bump_many(db, user_ids):
+    user_ids = sorted({user_id for user_id in user_ids if user_id})
+    if user_ids:
+        db.users.update_many({'_id': {'$in': user_ids}}, {'$inc': BUMP})
+
+def bump_owners(db, collection, query):
+    """Bump every user owning a document of collection matching query (background writers)."""
+    bump_many(db, db[collection].distinct('user_id', query))
+
+def release_fingerprint(root):
+    """Identifies the deployed code and templates, so a deploy changes every ETag.
+
+    RELEASE (a commit id, say) when set, otherwise the sizes and mtimes of
+    the app's source files, which every worker of one deploy shares.
+    """
+    if os.getenv('RELEASE'):
+        return os.getenv('RELEASE')
+    digest = hashlib.blake2b(digest_size=8)
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = sorted(name for name in subdirectories if name not in ('tests', 'benchmarks', 'static', 'frontend', '__pycache__') and not name.startswith('.'))
+        for name in sorted(files):
+            if name.endswith(('.py', '.html')):
+                stat = os.stat(os.path.join(directory, name))
+                digest.update(f'{os.path.relpath(os.path.join(directory, name), root)}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()
+
+def list_etag():
+    """The current request's list ETag, or None when it must not be conditional."""
+    if not current_user.is_authenticated or getattr(current_user, 'data_version', None) is None:
+        return None
+    # Admins list everyone's records, which no single version covers; pending
+    # flashed messages have to be rendered
+    if current_user.role == 'admin' or session.get('_flashes'):
+        return None
+    parts = [
+        current_app.extensions['data_version'],
+        str(current_user.id),
+        str(current_user.data_version),
+        request.endpoint,
+        repr(sorted((request.view_args or {}).items())),
+        repr(sorted(request.args.items(multi=True))),
+        session.get('lang', 'en'),
+        str(session.get('dark_mode', False)),
+        str(lite_mode()),
+        # Overdue markers change with the date alone
+        date.today().isoformat()
+    ]
+    return hashlib.blake2b('\x00'.join(parts).encode(), digest_size=10).hexdigest()
+
+def conditional_list(view):
+    """Answer If-None-Match for a list view from the data version alone."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        etag = list_etag()
+        if etag is None:
+            return view(*args, **kwargs)
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            # A page showing a flashed message (a partial or stale list) is not
+            # reusable: shown ones are on the request, pending ones in the session
+            if response.status_code != 200 or request_ctx.flashes or session.get('_flashes'):
+                return response
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapped
+
+def init_app(app):
+    app.extensions['data_version'] = release_fingerprint(app.root_path)
@@ -1,9 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
-from app.utils import requires_role, check_coin_balance, format_currency, format_date
-from app.translations import trans_function as trans
+from utils import requires_role, check_coin_balance, format_currency, format_date
+from translations import trans_function as trans
 from app import mongo
 from bson import ObjectId
+from dataversion import BUMP, bump
 from datetime import datetime
 import logging
 
@@ -57,10 +58,6 @@ def add():
                 'created_at': datetime.utcnow()
             }
             mongo.db.invoices.insert_one(invoice)
-            mongo.db.users.update_one(
-                {'_id': ObjectId(current_user.id)},
-                {'$inc': {'coin_balance': -1}}
-            )
             mongo.db.coin_transactions.insert_one({
                 'user_id': str(current_user.id),
                 'amount': -1,
@@ -68,6 +65,10 @@ def add():
                 'date': datetime.utcnow(),
                 'ref': f"Debtor creation: {invoice['party_name']}"
             })
+            mongo.db.users.update_one(
+                {'_id': ObjectId(current_user.id)},
+                {'$inc': {'coin_balance': -1, **BUMP}}
+            )
             flash(trans('create_debtor_success', default='Debtor created successfully'), 'success')
             return redirect(url_for('debtors.index'))
         except Exception as e:
@@ -114,6 +115,7 @@ def edit(id):
                     {'_id': ObjectId(id)},
                     {'$set': updated_invoice}
                 )
+                bump(mongo.db, current_user.id)
                 flash(trans('edit_debtor_success', default='Debtor updated successfully'), 'success')
                 return redirect(url_for('debtors.index'))
             except Exception as e:
@@ -137,6 +139,7 @@ def delete(id):
             'type': 'debtor'
         })
         if result.deleted_count:
+            bump(mongo.db, current_user.id)
             flash(trans('delete_debtor_success', default='Debtor deleted successfully'), 'success')
         else:
             flash(trans('invoice_not_found'), 'danger')
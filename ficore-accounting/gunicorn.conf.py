@@ -0,0 +1,93 @@
+"""Gunicorn settings for the web process: `gunicorn -c gunicorn.conf.py`.
+
+GUNICORN_WORKER_CLASS picks the concurrency mode, and with it the app:
+
+- uvicorn (default): serves asgi:app. The JSON API (api/) runs on each
+  worker's event loop, so thousands of open client connections cost
+  coroutines, not threads; Flask pages run on GUNICORN_THREADS threads.
+  Needs the uvicorn-worker package, otherwise falls back to gthread.
+- gthread: serves app:app with WEB_CONCURRENCY processes x
+  GUNICORN_THREADS threads. A thread blocked on Mongo only holds up its
+  own request. The async API is not served.
+- gevent: WEB_CONCURRENCY processes x GUNICORN_WORKER_CONNECTIONS greenlets.
+  Needs the gevent package. The standard library is monkey-patched here,
+  before gunicorn or the preloaded app import socket, ssl or threading.
+- sync: one request per process, the old behaviour.
+
+The app is built once in the master (preload_app) and forked. database.py
+drops the inherited MongoClient in each child (os.register_at_fork), and the
+pool is sized to the number of requests a worker can run at once.
+"""
+from importlib.util import find_spec
+import os
+import sys
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'uvicorn')
+
+if worker_class == 'uvicorn':
+    if find_spec('uvicorn_worker') is None:
+        print("gunicorn.conf.py: uvicorn-worker is not installed, falling back to gthread workers", file=sys.stderr)
+        worker_class = 'gthread'
+elif worker_class == 'gevent':
+    try:
+        from gevent import monkey
+    except ImportError:
+        print("gunicorn.conf.py: gevent is not installed, falling back to gthread workers", file=sys.stderr)
+        worker_class = 'gthread'
+    else:
+        # Must run before anything below imports threading or socket
+        monkey.patch_all()
+
+import multiprocessing
+
+# The multiprocess metrics directory must exist, without stale files from a
+# previous run, before the app creates its metrics. on_starting is too late:
+# it runs after the app is preloaded. Done once per master, not on reload.
+_metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if _metrics_dir and not os.getenv('FICORE_METRICS_DIR_READY'):
+    os.makedirs(_metrics_dir, exist_ok=True)
+    for name in os.listdir(_metrics_dir):
+        if name.endswith('.db'):
+            os.remove(os.path.join(_metrics_dir, name))
+    os.environ['FICORE_METRICS_DIR_READY'] = '1'
+
+# Imported here, not in child_exit: that hook runs from a SIGCHLD handler and
+# can re-enter itself while a lazy import is still half done
+from metrics import mark_process_dead
+
+if worker_class == 'uvicorn':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    wsgi_app = 'asgi:app'
+else:
+    wsgi_app = 'app:app'
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2, 8)))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so a slow leak cannot grow without bound
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+# One pooled connection per request a worker can have in flight, plus two
+# for the snapshot cache's background refreshes. Read by
+# database.client_options() when the app creates its client, so it has to
+# be in the environment before the app is loaded. Under uvicorn this is the
+# Flask threads' pool; the API's Motor pool is API_MONGO_MAX_POOL_SIZE.
+if worker_class == 'gevent':
+    concurrency = worker_connections
+elif worker_class in ('gthread', 'uvicorn_worker.UvicornWorker'):
+    concurrency = threads
+else:
+    concurrency = 1
+os.environ.setdefault('MONGO_MAX_POOL_SIZE', str(concurrency + 2))
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} started ({worker_class}, Mongo pool {os.environ['MONGO_MAX_POOL_SIZE']})")
+
+def child_exit(server, worker):
+    mark_process_dead(worker.pid)
@@ -0,0 +1,102 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from io import BytesIO
+from bson import ObjectId
+from dataversion import bump_owners
+from importlib.util import find_spec
+import os
+import threading
+import logging
+
+# Pillow is optional; uploads still work without variants. It is only
+# imported inside the pool workers that actually decode images.
+HAS_PIL = find_spec('PIL') is not None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TYPES = ('image/jpeg', 'image/png')
+# name -> (longest edge in pixels, JPEG quality)
+VARIANTS = {
+    'thumb': (240, 70),
+    'web': (1280, 80)
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Return this process's image pool, creating it after any fork."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            # spawn, not fork: children open their own Mongo client
+            _executor = ProcessPoolExecutor(
+                max_workers=int(os.getenv('IMAGE_WORKERS', 2)),
+                mp_context=get_context('spawn')
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+def _render_variant(image, max_edge, quality):
+    from PIL import Image
+    variant = image.copy()
+    variant.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    output = BytesIO()
+    variant.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    output.seek(0)
+    return output
+
+def generate_variants(mongo_uri, file_id):
+    """Create and link every variant of an uploaded image. Runs in the pool."""
+    from database import get_db
+    from gridfs import GridFSBucket
+    from PIL import Image, ImageOps
+    from storage import store_file
+    db = get_db(mongo_uri)
+    file_id = ObjectId(file_id)
+    original = db.fs.files.find_one({'_id': file_id}, {'variants': 1, 'filename': 1})
+    if not original:
+        return None
+    variants = original.get('variants')
+    if not variants:
+        with GridFSBucket(db).open_download_stream(file_id) as grid_out:
+            image = Image.open(grid_out)
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'L'):
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.convert('RGBA').split()[-1])
+                image = background
+        variants = {}
+        base_name = os.path.splitext(original.get('filename') or str(file_id))[0]
+        for name, (max_edge, quality) in VARIANTS.items():
+            variants[name], _ = store_file(
+                db,
+                _render_variant(image, max_edge, quality),
+                f"{base_name}_{name}.jpg",
+                content_type='image/jpeg',
+                metadata={'variant_of': file_id, 'variant': name}
+            )
+        db.fs.files.update_one({'_id': file_id}, {'$set': {'variants': variants}})
+    db.receipts.update_many({'file_id': file_id}, {'$set': {'variants': variants}})
+    bump_owners(db, 'receipts', {'file_id': file_id})
+    return {name: str(variant_id) for name, variant_id in variants.items()}
+
+def _log_failure(future):
+    error = future.exception()
+    if error:
+        logger.error(f"Error generating image variants: {str(error)}")
+
+def schedule_receipt_variants(mongo_uri, file_id, content_type):
+    """Queue thumbnail/web variant generation for an uploaded image."""
+    global _executor
+    if not HAS_PIL or content_type not in IMAGE_TYPES:
+        return None
+    try:
+        future = _get_executor().submit(generate_variants, mongo_uri, str(file_id))
+    except BrokenProcessPool:
+        _executor = None
+        future = _get_executor().submit(generate_variants, mongo_uri, str(file_id))
+    future.add_done_callback(_log_failure)
+    return future
@@ -1,9 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
-from app.utils import requires_role, check_coin_balance, format_currency, format_date
-from app.translations import trans_function as trans
+from utils import requires_role, check_coin_balance, format_currency, format_date
+from translations import trans_function as trans
 from app import mongo
 from bson import ObjectId
+from dataversion import BUMP, bump, conditional_list
 from datetime import datetime
 import logging
 
@@ -14,6 +15,7 @@ inventory_bp = Blueprint('inventory', __name__, url_prefix='/inventory')
 @inventory_bp.route('/')
 @login_required
 @requires_role('trader')
+@conditional_list
 def index():
     """List all inventory items for the current user."""
     try:
@@ -65,10 +67,6 @@ def add():
                 'created_at': datetime.utcnow()
             }
             mongo.db.inventory.insert_one(item)
-            mongo.db.users.update_one(
-                {'_id': ObjectId(current_user.id)},
-                {'$inc': {'coin_balance': -1}}
-            )
             mongo.db.coin_transactions.insert_one({
                 'user_id': str(current_user.id),
                 'amount': -1,
@@ -76,6 +74,10 @@ def add():
                 'date': datetime.utcnow(),
                 'ref': f"Inventory item creation: {item['item_name']}"
             })
+            mongo.db.users.update_one(
+                {'_id': ObjectId(current_user.id)},
+                {'$inc': {'coin_balance': -1, **BUMP}}
+            )
             flash(trans('add_item_success', default='Inventory item added successfully'), 'success')
             return redirect(url_for('inventory.index'))
         except Exception as e:
@@ -120,6 +122,7 @@ def edit(id):
                     {'_id': ObjectId(id)},
                     {'$set': updated_item}
                 )
+                bump(mongo.db, current_user.id)
                 flash(trans('edit_item_success', default='Inventory item updated successfully'), 'success')
                 return redirect(url_for('inventory.index'))
             except Exception as e:
@@ -142,6 +145,7 @@ def delete(id):
             'user_id': str(current_user.id)
         })
         if result.deleted_count:
+            bump(mongo.db, current_user.id)
             flash(trans('delete_item_success', default='Inventory item deleted successfully'), 'success')
         else:
             flash(trans('item_not_found'), 'danger')
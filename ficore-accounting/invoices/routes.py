@@ -10,6 +10,10 @@ from io import StringIO
 import pymongo
 from bson import ObjectId
 from app import limiter
+from readrouting import reporting_reads
+from queries import bounded_find, partial_results_notice
+from lite import render_page
+from dataversion import BUMP, bump, conditional_list
 
 logger = logging.getLogger(__name__)
 
@@ -66,10 +70,6 @@ def check_coins_required(action, required_coins=1):
 def deduct_coins(action, coins=1):
     """Deduct coins and log transaction."""
     mongo = current_app.extensions['pymongo']
-    mongo.db.users.update_one(
-        {'_id': current_user.id},
-        {'$inc': {'coin_balance': -coins}}
-    )
     mongo.db.coin_transactions.insert_one({
         'user_id': str(current_user.id),
         'amount': -coins,
@@ -77,9 +77,15 @@ def deduct_coins(action, coins=1):
         'ref': f"{action}_{datetime.utcnow().isoformat()}",
         'date': datetime.utcnow()
     })
+    # Last: the data version also covers the write this paid for (dataversion.py)
+    mongo.db.users.update_one(
+        {'_id': current_user.id},
+        {'$inc': {'coin_balance': -coins, **BUMP}}
+    )
 
 @invoices_bp.route('/debtors', methods=['GET'])
 @login_required
+@conditional_list
 def debtors_dashboard():
     form = FilterForm(request.args)
     status_filter = request.args.get('status', '')
@@ -103,12 +109,14 @@ def debtors_dashboard():
                 query['created_at'] = {'$gte': start_date, '$lte': end_date}
             except ValueError:
                 flash(trans_function('invalid_date_format', default='Invalid date format'), 'danger')
-        invoices = list(mongo.db.invoices.find(query).sort('created_at', -1).limit(50))
+        invoices, complete = bounded_find(mongo.db.invoices, query, sort=[('created_at', -1)], limit=50)
+        if not complete:
+            partial_results_notice()
         for invoice in invoices:
             invoice['_id'] = str(invoice['_id'])
             invoice['total'] = sum(item['qty'] * item['price'] for item in invoice.get('items', []))
             invoice['is_overdue'] = invoice['status'] == 'unpaid' and invoice.get('due_date') and invoice['due_date'] < date.today()
-        return render_template(
+        return render_page(
             'invoices/debtors.html',
             invoices=invoices,
             form=form,
@@ -121,10 +129,11 @@ def debtors_dashboard():
     except pymongo.errors.PyMongoError as e:
         logger.error(f"MongoDB error fetching debtors for user {current_user.id}: {str(e)}")
         flash(trans_function('core_something_went_wrong', default='An error occurred'), 'danger')
-        return render_template('invoices/debtors.html', invoices=[], form=form, type='debtor'), 500
+        return render_page('invoices/debtors.html', invoices=[], form=form, type='debtor'), 500
 
 @invoices_bp.route('/creditors', methods=['GET'])
 @login_required
+@conditional_list
 def creditors_dashboard():
     form = FilterForm(request.args)
     status_filter = request.args.get('status', '')
@@ -148,12 +157,14 @@ def creditors_dashboard():
                 query['created_at'] = {'$gte': start_date, '$lte': end_date}
             except ValueError:
                 flash(trans_function('invalid_date_format', default='Invalid date format'), 'danger')
-        invoices = list(mongo.db.invoices.find(query).sort('created_at', -1).limit(50))
+        invoices, complete = bounded_find(mongo.db.invoices, query, sort=[('created_at', -1)], limit=50)
+        if not complete:
+            partial_results_notice()
         for invoice in invoices:
             invoice['_id'] = str(invoice['_id'])
             invoice['total'] = sum(item['qty'] * item['price'] for item in invoice.get('items', []))
             invoice['is_overdue'] = invoice['status'] == 'unpaid' and invoice.get('due_date') and invoice['due_date'] < date.today()
-        return render_template(
+        return render_page(
             'invoices/creditors.html',
             invoices=invoices,
             form=form,
@@ -166,7 +177,7 @@ def creditors_dashboard():
     except pymongo.errors.PyMongoError as e:
         logger.error(f"MongoDB error fetching creditors for user {current_user.id}: {str(e)}")
         flash(trans_function('core_something_went_wrong', default='An error occurred'), 'danger')
-        return render_template('invoices/creditors.html', invoices=[], form=form, type='creditor'), 500
+        return render_page('invoices/creditors.html', invoices=[], form=form, type='creditor'), 500
 
 @invoices_bp.route('/create/<type>', methods=['GET', 'POST'])
 @login_required
@@ -278,6 +289,7 @@ def delete_invoice(type, invoice_id):
         if result.deleted_count == 0:
             flash(trans_function('invoice_not_found', default='Invoice not found'), 'danger')
         else:
+            bump(mongo.db, current_user.id)
             flash(trans_function('invoice_deleted', default='Invoice deleted successfully'), 'success')
             logger.info(f"{type.capitalize()} invoice {invoice_id} deleted by user {current_user.id}")
         return redirect(url_for(f'invoices.{type}s_dashboard'))
@@ -299,7 +311,9 @@ def export_invoices_csv(type):
         query = {'user_id': str(current_user.id), 'type': type}
         if user.get('role') == 'admin':
             query.pop('user_id')
-        invoices = list(mongo.db.invoices.find(query))
+        # Full-history export, fine to serve from a secondary
+        with reporting_reads() as (db, read_session):
+            invoices, complete = bounded_find(db.invoices, query, session=read_session)
         output = StringIO()
         writer = csv.writer(output)
         writer.writerow(['Invoice Number', 'Party Name', 'Phone', 'Total', 'Paid Amount', 'Status', 'Created At', 'Due Date'])
@@ -314,6 +328,9 @@ def export_invoices_csv(type):
                 invoice.get('created_at', '').strftime('%Y-%m-%d') if invoice.get('created_at') else '',
                 invoice.get('due_date', '').strftime('%Y-%m-%d') if invoice.get('due_date') else ''
             ])
+        if not complete:
+            # A download cannot carry a flash message; say so in the file itself
+            writer.writerow([trans_function('partial_results', default='This search took too long, so only part of the results is shown. Narrow the filters to see everything.')])
         output.seek(0)
         return send_file(
             output,
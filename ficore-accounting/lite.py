@@ -0,0 +1,44 @@
+"""Lite pages for slow, metered connections.
+
+A lite page is the same view rendered from templates/lite/: no CSS
+framework, scripts or decorative markup, only the data and its actions.
+It is chosen by ?lite=1 (remembered in a cookie, ?lite=0 turns it off) or,
+without a choice, by the Save-Data header that data-saver modes send.
+Views opt in by calling render_page() instead of render_template(); a page
+without a lite template renders normally.
+"""
+from flask import current_app, g, render_template, request
+
+COOKIE_NAME = 'ficore_lite'
+COOKIE_MAX_AGE = 365 * 24 * 3600
+
+def lite_mode():
+    choice = request.args.get('lite')
+    if choice in ('0', '1'):
+        return choice == '1'
+    choice = request.cookies.get(COOKIE_NAME)
+    if choice in ('0', '1'):
+        return choice == '1'
+    return request.headers.get('Save-Data', '').strip().lower() == 'on'
+
+def render_page(template, **context):
+    """render_template, from the lite variant of template in lite mode."""
+    g.lite_page = True
+    if lite_mode():
+        return render_template([f'lite/{template}', template], **context)
+    return render_template(template, **context)
+
+def remember_choice(response):
+    if g.get('lite_page'):
+        response.vary.add('Save-Data')
+    choice = request.args.get('lite')
+    if choice in ('0', '1') and request.cookies.get(COOKIE_NAME) != choice:
+        response.set_cookie(
+            COOKIE_NAME, choice, max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+            secure=current_app.config['SESSION_COOKIE_SECURE']
+        )
+    return response
+
+def init_app(app):
+    app.after_request(remember_choice)
+    app.jinja_env.globals['lite_mode'] = lite_mode
@@ -0,0 +1,209 @@
+from flask import Response, current_app, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+from monitoring import current_stats
+from datetime import datetime
+import hmac
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# With PROMETHEUS_MULTIPROC_DIR set (one directory shared by all gunicorn
+# workers, emptied before start) every worker writes its samples there and
+# /metrics merges them, whichever worker answers the scrape.
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+# Queue depths cost three counts each; scrapes within this many seconds share them
+QUEUE_DEPTH_TTL = 15
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    'ficore_request_latency_seconds', 'Time spent handling a request',
+    ['endpoint', 'method'], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter(
+    'ficore_requests_total', 'Requests handled, by endpoint and status code',
+    ['endpoint', 'method', 'status']
+)
+IN_FLIGHT = Gauge(
+    'ficore_requests_in_flight', 'Requests currently being handled',
+    multiprocess_mode='livesum'
+)
+MONGO_COMMANDS = Histogram(
+    'ficore_mongo_commands_per_request', 'Mongo commands issued per request',
+    ['endpoint'], buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+)
+POOL_CHECKED_OUT = Gauge(
+    'ficore_mongo_pool_checked_out', 'Mongo connections currently checked out of the pool',
+    multiprocess_mode='livesum'
+)
+POOL_CONNECTIONS = Gauge(
+    'ficore_mongo_pool_connections', 'Open Mongo connections in the pool',
+    multiprocess_mode='livesum'
+)
+POOL_CHECKOUT_FAILURES = Counter(
+    'ficore_mongo_pool_checkout_failures_total', 'Failed connection checkouts, by reason',
+    ['reason']
+)
+CACHE_REQUESTS = Counter(
+    'ficore_cache_requests_total', 'Cache lookups, by cache and result (hit or miss)',
+    ['cache', 'result']
+)
+
+SESSION_OPERATIONS = Counter(
+    'ficore_session_operations_total', 'Session store operations (read, cache_hit, verify, write, touch, skip, delete)',
+    ['operation']
+)
+QUERY_TIMEOUTS = Counter(
+    'ficore_query_timeouts_total', 'Queries stopped by their maxTimeMS budget, by endpoint and collection',
+    ['endpoint', 'collection']
+)
+
+def record_cache(cache, hit):
+    """Count one lookup against a named cache; hit ratio = hit / (hit + miss)."""
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+def record_session_op(operation):
+    SESSION_OPERATIONS.labels(operation).inc()
+
+def record_query_timeout(endpoint, collection):
+    QUERY_TIMEOUTS.labels(endpoint or 'unmatched', collection).inc()
+
+def record_request(endpoint, method, status, seconds):
+    """Count a request served outside Flask (the async API in api/)."""
+    REQUEST_LATENCY.labels(endpoint, method).observe(seconds)
+    REQUESTS.labels(endpoint, method, str(status)).inc()
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Track Mongo connection pool usage for this process."""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        POOL_CONNECTIONS.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        POOL_CONNECTIONS.dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        POOL_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        POOL_CHECKED_OUT.inc()
+
+    def connection_checked_in(self, event):
+        POOL_CHECKED_OUT.dec()
+
+pool_listener = PoolMetricsListener()
+
+_queue_depths = {'at': None, 'values': None}
+_queue_depths_lock = threading.Lock()
+
+def queue_depths(db):
+    """[(queue, depth)], counted at most once per QUEUE_DEPTH_TTL seconds per process."""
+    with _queue_depths_lock:
+        at = _queue_depths['at']
+        if at is None or time.monotonic() - at >= QUEUE_DEPTH_TTL:
+            now = datetime.utcnow()
+            _queue_depths['values'] = [
+                ('email_outbox', db.email_outbox.count_documents({'status': 'pending', 'next_attempt_at': {'$lte': now}})),
+                ('email_outbox_failed', db.email_outbox.count_documents({'status': 'failed'})),
+                ('recurring_transactions', db.transactions.count_documents({'next_run_at': {'$lte': now}}))
+            ]
+            _queue_depths['at'] = time.monotonic()
+        return _queue_depths['values']
+
+class QueueDepthCollector:
+    """Report background job backlogs straight from Mongo at scrape time.
+
+    The web workers never enqueue-and-forget in memory, so the queues are
+    the outbox collection and the recurring templates that are due.
+    """
+
+    def __init__(self, get_db):
+        self.get_db = get_db
+
+    def collect(self):
+        depth = GaugeMetricFamily('ficore_job_queue_depth', 'Background jobs waiting to run', labels=['queue'])
+        try:
+            for queue, value in queue_depths(self.get_db()):
+                depth.add_metric([queue], value)
+        except Exception as e:
+            logger.warning(f"Error collecting job queue depth: {str(e)}")
+        yield depth
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+    g.metrics_in_flight = True
+    IN_FLIGHT.inc()
+
+def _observe(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+    REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+    stats = current_stats()
+    if stats is not None:
+        MONGO_COMMANDS.labels(endpoint).observe(stats.commands)
+    return response
+
+def _end_in_flight(exception=None):
+    if g.pop('metrics_in_flight', False):
+        IN_FLIGHT.dec()
+
+def metrics_view():
+    """Prometheus text exposition for every worker of this host.
+
+    Not served at all (404) unless METRICS_TOKEN is set, and then only to
+    scrapers sending it as a bearer token.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        return Response(status=404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response(status=401)
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    queues = CollectorRegistry()
+    queues.register(QueueDepthCollector(lambda: current_app.extensions['pymongo'].db))
+    return Response(generate_latest(registry) + generate_latest(queues), mimetype=CONTENT_TYPE_LATEST)
+
+def init_app(app):
+    """Time every request. The pool listener goes to the MongoClient."""
+    app.config.setdefault('METRICS_TOKEN', None)
+    app.before_request(_start_timer)
+    app.after_request(_observe)
+    app.teardown_request(_end_in_flight)
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges; call from gunicorn's child_exit hook."""
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,200 @@
+from flask import current_app, request
+from pymongo import monitoring
+from collections import Counter
+import bson
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds
+COMMAND_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+TIME_MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_local = threading.local()
+
+class RequestStats:
+    """Mongo commands issued while serving one request."""
+
+    def __init__(self):
+        self.commands = 0
+        self.duration_micros = 0
+        self.reply_bytes = 0
+        self.by_command = Counter()
+        self.pending = {}
+
+    @property
+    def time_ms(self):
+        return self.duration_micros / 1000
+
+    def most_repeated(self):
+        """Return (command, count) for the most frequent command shape."""
+        return self.by_command.most_common(1)[0] if self.by_command else (None, 0)
+
+def current_stats():
+    """Stats for the request being served on this thread, or None."""
+    return getattr(_local, 'stats', None)
+
+def _command_shape(event):
+    target = event.command.get(event.command_name)
+    if not isinstance(target, str):
+        # getMore carries the cursor id under its name and the collection separately
+        target = event.command.get('collection', '')
+    return f"{event.command_name} {target}".strip()
+
+class RequestCommandListener(monitoring.CommandListener):
+    """Attribute every Mongo command to the Flask request that issued it.
+
+    pymongo calls listeners synchronously on the thread running the
+    command, so a thread-local is enough to find the request. Commands
+    outside a request (startup, background jobs) are ignored.
+    """
+
+    def __init__(self, count_bytes=True):
+        self.count_bytes = count_bytes
+
+    def started(self, event):
+        stats = current_stats()
+        if stats is not None:
+            stats.pending[event.request_id] = _command_shape(event)
+
+    def succeeded(self, event):
+        self._finish(event, event.reply)
+
+    def failed(self, event):
+        self._finish(event, None)
+
+    def _finish(self, event, reply):
+        stats = current_stats()
+        if stats is None:
+            return
+        shape = stats.pending.pop(event.request_id, event.command_name)
+        stats.commands += 1
+        stats.duration_micros += event.duration_micros
+        stats.by_command[shape] += 1
+        if reply is not None and self.count_bytes:
+            stats.reply_bytes += len(bson.encode(reply))
+
+command_listener = RequestCommandListener()
+
+class Histogram:
+    """Fixed-bucket histogram; the last bucket catches everything above."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.sum = 0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.total:
+            return None
+        threshold = q * self.total
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return float('inf')
+
+    def summary(self):
+        return {
+            'count': self.total,
+            'mean': round(self.sum / self.total, 2) if self.total else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ('+Inf',), self.counts)}
+        }
+
+class EndpointStats:
+    def __init__(self):
+        self.commands = Histogram(COMMAND_BUCKETS)
+        self.time_ms = Histogram(TIME_MS_BUCKETS)
+        self.reply_bytes = Histogram(BYTES_BUCKETS)
+        self.repeated = Counter()
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+def record(endpoint, stats):
+    """Add one request's numbers to the per-endpoint histograms."""
+    with _endpoints_lock:
+        entry = _endpoints.get(endpoint)
+        if entry is None:
+            entry = _endpoints[endpoint] = EndpointStats()
+        entry.commands.observe(stats.commands)
+        entry.time_ms.observe(stats.time_ms)
+        if command_listener.count_bytes:
+            entry.reply_bytes.observe(stats.reply_bytes)
+        shape, count = stats.most_repeated()
+        if count > 1:
+            entry.repeated[shape] = max(entry.repeated[shape], count)
+
+def snapshot():
+    """Per-endpoint histogram summaries, busiest endpoints first."""
+    with _endpoints_lock:
+        items = sorted(_endpoints.items(), key=lambda item: item[1].commands.sum, reverse=True)
+        return {
+            endpoint: {
+                'commands': entry.commands.summary(),
+                'time_ms': entry.time_ms.summary(),
+                'reply_bytes': entry.reply_bytes.summary(),
+                'max_repeats': dict(entry.repeated.most_common(5))
+            }
+            for endpoint, entry in items
+        }
+
+def reset():
+    with _endpoints_lock:
+        _endpoints.clear()
+
+def _start_request():
+    _local.stats = RequestStats()
+
+def _finish_request(response):
+    stats = current_stats()
+    if stats is None:
+        return response
+    endpoint = request.endpoint or 'unknown'
+    record(endpoint, stats)
+    shape, count = stats.most_repeated()
+    if count >= current_app.config['MONGO_REPEAT_WARNING']:
+        logger.warning(f"{endpoint} issued '{shape}' {count} times in one request ({stats.commands} commands total)")
+    if current_app.debug or current_app.config['MONGO_STATS_HEADERS']:
+        response.headers['X-Mongo-Commands'] = str(stats.commands)
+        response.headers['X-Mongo-Time-Ms'] = f"{stats.time_ms:.2f}"
+        if command_listener.count_bytes:
+            response.headers['X-Mongo-Bytes'] = str(stats.reply_bytes)
+        if count > 1:
+            response.headers['X-Mongo-Most-Repeated'] = f"{shape}; count={count}"
+    return response
+
+def _clear_request(exception=None):
+    _local.stats = None
+
+def init_app(app):
+    """Hook per-request command accounting into the app.
+
+    The listener itself must be passed to the MongoClient via
+    event_listeners=[command_listener].
+    """
+    app.config.setdefault('MONGO_STATS_HEADERS', False)
+    app.config.setdefault('MONGO_REPEAT_WARNING', 10)
+    # Sizing a reply re-encodes it to BSON, which costs real CPU on cursor
+    # heavy pages: only by default when the numbers are being looked at
+    command_listener.count_bytes = app.config.setdefault('MONGO_STATS_BYTES', app.debug or app.config['MONGO_STATS_HEADERS'])
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_clear_request)
@@ -0,0 +1,142 @@
+from pymongo import ASCENDING, ReturnDocument
+from datetime import datetime, timedelta
+import os
+import smtplib
+import socket
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 6))
+RETRY_BASE_SECONDS = int(os.getenv('OUTBOX_RETRY_BASE_SECONDS', 30))
+RETRY_MAX_SECONDS = 3600
+LEASE_SECONDS = 120
+# Sent and permanently failed messages are kept this long, without their body
+RETENTION_SECONDS = 7 * 24 * 3600
+# Errors that mean the SMTP connection is unusable for the rest of the batch
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+def mail_settings_from_env():
+    """Flask-Mail settings shared by the web app and the outbox worker."""
+    return {
+        'MAIL_SERVER': os.getenv('MAIL_SERVER', 'smtp.gmail.com'),
+        'MAIL_PORT': int(os.getenv('MAIL_PORT', 587)),
+        'MAIL_USE_TLS': os.getenv('MAIL_USE_TLS', 'true').lower() == 'true',
+        'MAIL_USERNAME': os.getenv('MAIL_USERNAME'),
+        'MAIL_PASSWORD': os.getenv('MAIL_PASSWORD'),
+        'MAIL_DEFAULT_SENDER': os.getenv('MAIL_DEFAULT_SENDER', 'support@ficoreapp.com')
+    }
+
+def ensure_indexes(db):
+    """Create the indexes used to claim outbox messages."""
+    db.email_outbox.create_index([('status', ASCENDING), ('next_attempt_at', ASCENDING)])
+    db.email_outbox.create_index([('sent_at', ASCENDING)], expireAfterSeconds=RETENTION_SECONDS, sparse=True)
+    db.email_outbox.create_index([('failed_at', ASCENDING)], expireAfterSeconds=RETENTION_SECONDS, sparse=True)
+
+def enqueue_email(db, subject, recipients, body):
+    """Queue an email for the outbox worker. Never talks to SMTP."""
+    now = datetime.utcnow()
+    return db.email_outbox.insert_one({
+        'subject': subject,
+        'recipients': list(recipients),
+        'body': body,
+        'status': 'pending',
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now
+    }).inserted_id
+
+def retry_delay(attempts):
+    """Exponential backoff for the given number of failed attempts."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+def claim_batch(db, worker_id, batch_size=50):
+    """Atomically lease up to batch_size due messages for this worker.
+
+    Messages stuck in 'sending' past their lease (a crashed worker) are
+    claimable again.
+    """
+    now = datetime.utcnow()
+    claimed = []
+    for _ in range(batch_size):
+        message = db.email_outbox.find_one_and_update(
+            {'$or': [
+                {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+                {'status': 'sending', 'lease_expires_at': {'$lte': now}}
+            ]},
+            {'$set': {
+                'status': 'sending',
+                'claimed_by': worker_id,
+                'lease_expires_at': now + timedelta(seconds=LEASE_SECONDS)
+            }},
+            sort=[('next_attempt_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        if not message:
+            break
+        claimed.append(message)
+    return claimed
+
+def _mark_sent(db, message):
+    # The body holds OTP codes and reset links: drop it once it is delivered
+    db.email_outbox.update_one(
+        {'_id': message['_id'], 'claimed_by': message['claimed_by']},
+        {'$set': {'status': 'sent', 'sent_at': datetime.utcnow()}, '$unset': {'lease_expires_at': '', 'body': ''}}
+    )
+
+def _mark_failed(db, message, error):
+    attempts = message.get('attempts', 0) + 1
+    update = {'attempts': attempts, 'last_error': str(error)}
+    unset = {'lease_expires_at': ''}
+    if attempts >= MAX_ATTEMPTS:
+        update['status'] = 'failed'
+        update['failed_at'] = datetime.utcnow()
+        unset['body'] = ''
+        logger.error(f"Giving up on email {message['_id']} after {attempts} attempts: {str(error)}")
+    else:
+        update['status'] = 'pending'
+        update['next_attempt_at'] = datetime.utcnow() + retry_delay(attempts)
+    db.email_outbox.update_one(
+        {'_id': message['_id'], 'claimed_by': message['claimed_by']},
+        {'$set': update, '$unset': unset}
+    )
+
+def deliver_pending(db, mail, batch_size=50, worker_id=None):
+    """Send one batch of queued emails over a single SMTP connection.
+
+    Must run inside an app context with Flask-Mail configured. Returns the
+    number of messages sent.
+    """
+    from flask_mail import Message
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    pending = claim_batch(db, worker_id, batch_size)
+    if not pending:
+        return 0
+    claimed = len(pending)
+    sent = 0
+    try:
+        with mail.connect() as connection:
+            while pending:
+                message = pending[0]
+                try:
+                    connection.send(Message(
+                        subject=message['subject'],
+                        recipients=message['recipients'],
+                        body=message['body']
+                    ))
+                except CONNECTION_ERRORS:
+                    raise
+                except Exception as e:
+                    # Rejected message (bad recipient etc.); the connection is still usable
+                    pending.pop(0)
+                    _mark_failed(db, message, e)
+                    continue
+                pending.pop(0)
+                _mark_sent(db, message)
+                sent += 1
+    except Exception as e:
+        logger.warning(f"SMTP connection failed, {len(pending)} emails will be retried: {str(e)}")
+        for message in pending:
+            _mark_failed(db, message, e)
+    logger.info(f"Delivered {sent} of {claimed} queued emails")
+    return sent
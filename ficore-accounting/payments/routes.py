@@ -1,9 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
-from app.utils import requires_role, check_coin_balance, format_currency, format_date
-from app.translations import trans_function as trans
+from utils import requires_role, check_coin_balance, format_currency, format_date
+from translations import trans_function as trans
 from app import mongo
 from bson import ObjectId
+from dataversion import BUMP, bump
 from datetime import datetime
 import logging
 
@@ -50,10 +51,6 @@ def add():
                 'created_at': datetime.utcnow()
             }
             mongo.db.transactions.insert_one(transaction)
-            mongo.db.users.update_one(
-                {'_id': ObjectId(current_user.id)},
-                {'$inc': {'coin_balance': -1}}
-            )
             mongo.db.coin_transactions.insert_one({
                 'user_id': str(current_user.id),
                 'amount': -1,
@@ -61,6 +58,10 @@ def add():
                 'date': datetime.utcnow(),
                 'ref': f"Payment creation: {transaction['party_name']}"
             })
+            mongo.db.users.update_one(
+                {'_id': ObjectId(current_user.id)},
+                {'$inc': {'coin_balance': -1, **BUMP}}
+            )
             flash(trans('add_payment_success', default='Payment added successfully'), 'success')
             return redirect(url_for('payments.index'))
         except Exception as e:
@@ -104,6 +105,7 @@ def edit(id):
                     {'_id': ObjectId(id)},
                     {'$set': updated_transaction}
                 )
+                bump(mongo.db, current_user.id)
                 flash(trans('edit_payment_success', default='Payment updated successfully'), 'success')
                 return redirect(url_for('payments.index'))
             except Exception as e:
@@ -127,6 +129,7 @@ def delete(id):
             'type': 'payment'
         })
         if result.deleted_count:
+            bump(mongo.db, current_user.id)
             flash(trans('delete_payment_success', default='Payment deleted successfully'), 'success')
         else:
             flash(trans('transaction_not_found'), 'danger')
@@ -0,0 +1,129 @@
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from datetime import datetime
+from io import BytesIO
+import cProfile
+import marshal
+import pstats
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_FICORE_PROFILE'
+PROFILE_ARG = '_profile='
+PROFILE_BUCKET = 'profiles'
+TOKEN_SALT = 'request-profiler'
+
+def _serializer(secret_key):
+    return URLSafeTimedSerializer(secret_key, salt=TOKEN_SALT)
+
+def issue_token(secret_key, admin_id):
+    """Signed token an admin hands out to profile requests carrying it."""
+    return _serializer(secret_key).dumps({'admin_id': admin_id})
+
+def verify_token(secret_key, token, max_age):
+    """Return the issuing admin's id, or None for a bad or expired token."""
+    try:
+        return _serializer(secret_key).loads(token, max_age=max_age).get('admin_id')
+    except (BadSignature, AttributeError):
+        return None
+
+def _token_from_environ(environ):
+    token = environ.get(PROFILE_HEADER)
+    if token:
+        return token
+    for part in environ.get('QUERY_STRING', '').split('&'):
+        if part.startswith(PROFILE_ARG):
+            return part[len(PROFILE_ARG):]
+    return None
+
+def top_functions(stats, limit=20):
+    """The most expensive functions by cumulative time, for the listing."""
+    rows = []
+    for (filename, line, name), (calls, _, total, cumulative, _) in stats.stats.items():
+        rows.append({'function': f"{filename}:{line}({name})", 'calls': calls, 'tottime': round(total, 4), 'cumtime': round(cumulative, 4)})
+    rows.sort(key=lambda row: row['cumtime'], reverse=True)
+    return rows[:limit]
+
+class RequestProfiler:
+    """WSGI middleware that cProfiles requests carrying a valid admin token.
+
+    The token is read from the X-Ficore-Profile header or the _profile query
+    argument. Requests without either cost one dict lookup and a substring
+    test; nothing is imported or allocated for them. The whole WSGI call is
+    profiled, response body included, and the marshalled pstats are stored
+    in the `profiles` GridFS bucket.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi_app = flask_app.wsgi_app
+
+    def __call__(self, environ, start_response):
+        if PROFILE_HEADER not in environ and PROFILE_ARG not in environ.get('QUERY_STRING', ''):
+            return self.wsgi_app(environ, start_response)
+        config = self.flask_app.config
+        admin_id = verify_token(config['SECRET_KEY'], _token_from_environ(environ) or '', config['PROFILE_TOKEN_MAX_AGE'])
+        if not admin_id:
+            return self.wsgi_app(environ, start_response)
+        return self._profile(environ, start_response, admin_id)
+
+    def _profile(self, environ, start_response, admin_id):
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+            return None
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            result = self.wsgi_app(environ, capture_start_response)
+            try:
+                body = [chunk for chunk in result]
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        finally:
+            profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+        headers = list(captured['headers'])
+        try:
+            profile_id = self._store(profiler, environ, admin_id, captured['status'], duration_ms)
+            headers.append(('X-Profile-Id', str(profile_id)))
+        except Exception as e:
+            logger.error(f"Error storing request profile: {str(e)}")
+        start_response(captured['status'], headers, captured['exc_info'])
+        return body
+
+    def _store(self, profiler, environ, admin_id, status, duration_ms):
+        from gridfs import GridFSBucket
+        profiler.create_stats()
+        stats = pstats.Stats(profiler)
+        path = environ.get('PATH_INFO', '')
+        db = self.flask_app.extensions['pymongo'].db
+        return GridFSBucket(db, bucket_name=PROFILE_BUCKET).upload_from_stream(
+            f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}{path.replace('/', '_')}.prof",
+            BytesIO(marshal.dumps(profiler.stats)),
+            metadata={
+                'content_type': 'application/octet-stream',
+                'method': environ.get('REQUEST_METHOD'),
+                'path': path,
+                'status': status,
+                'duration_ms': round(duration_ms, 2),
+                'admin_id': admin_id,
+                'total_calls': stats.total_calls,
+                'top_functions': top_functions(stats)
+            }
+        )
+
+def list_profiles(db, limit=50):
+    return list(db[f'{PROFILE_BUCKET}.files'].find().sort('uploadDate', -1).limit(limit))
+
+def init_app(app):
+    """Wrap the WSGI app; profiling stays inert until a token is presented."""
+    app.config.setdefault('PROFILE_TOKEN_MAX_AGE', 3600)
+    app.wsgi_app = RequestProfiler(app)
@@ -0,0 +1,77 @@
+from flask import current_app, flash, has_request_context, request
+from pymongo.errors import ExecutionTimeout
+from translations import trans_function
+from metrics import record_query_timeout
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TIME_MS = 2000
+# Routes that legitimately scan more than a page of data get a larger budget
+ROUTE_TIME_BUDGETS = {
+    'transactions.export_transactions_csv': 15000,
+    'invoices.export_invoices_csv': 15000,
+    'reports.profit_loss': 10000,
+    'reports.inventory': 10000,
+    'admin.dashboard': 5000,
+    'admin.manage_users': 5000,
+    'admin_dashboard': 5000
+}
+
+def time_budget(endpoint=None):
+    """maxTimeMS for queries issued by endpoint (the current request's by default)."""
+    if not has_request_context():
+        return DEFAULT_MAX_TIME_MS
+    endpoint = endpoint or request.endpoint
+    config = current_app.config
+    return config['QUERY_TIME_BUDGETS'].get(endpoint, config['QUERY_MAX_TIME_MS'])
+
+def _timed_out(collection, max_time_ms):
+    endpoint = request.endpoint if has_request_context() else None
+    logger.warning(f"Query on {collection.name} exceeded {max_time_ms}ms for {endpoint}")
+    record_query_timeout(endpoint, collection.name)
+
+def bounded_find(collection, query, projection=None, sort=None, limit=0, session=None, max_time_ms=None):
+    """Run find under the route's maxTimeMS budget.
+
+    Returns (documents, complete). If the server stops the query,
+    documents holds whatever batches arrived before the budget ran out
+    and complete is False; the caller shows them with partial_results_notice.
+    """
+    max_time_ms = max_time_ms or time_budget()
+    cursor = collection.find(query, projection, session=session).max_time_ms(max_time_ms)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    documents = []
+    try:
+        for document in cursor:
+            documents.append(document)
+    except ExecutionTimeout:
+        _timed_out(collection, max_time_ms)
+        return documents, False
+    return documents, True
+
+def bounded_count(collection, query, session=None, max_time_ms=None):
+    """count_documents under the route's budget; returns (count, complete).
+
+    A timed-out count of the whole collection falls back to the metadata
+    estimate; a filtered one has nothing to fall back to and returns None.
+    """
+    max_time_ms = max_time_ms or time_budget()
+    try:
+        return collection.count_documents(query, maxTimeMS=max_time_ms, session=session), True
+    except ExecutionTimeout:
+        _timed_out(collection, max_time_ms)
+        if not query:
+            return collection.estimated_document_count(), False
+        return None, False
+
+def partial_results_notice():
+    flash(trans_function('partial_results', default='This search took too long, so only part of the results is shown. Narrow the filters to see everything.'), 'warning')
+
+def init_app(app):
+    """QUERY_MAX_TIME_MS is the default budget; QUERY_TIME_BUDGETS overrides it per endpoint."""
+    app.config.setdefault('QUERY_MAX_TIME_MS', DEFAULT_MAX_TIME_MS)
+    app.config['QUERY_TIME_BUDGETS'] = {**ROUTE_TIME_BUDGETS, **app.config.get('QUERY_TIME_BUDGETS', {})}
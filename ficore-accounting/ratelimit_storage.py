@@ -0,0 +1,174 @@
+from limits.storage import Storage, SlidingWindowCounterSupport
+from limits.storage.base import TimestampedSlidingWindow
+from math import floor
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'ficore-ratelimit.sqlite')
+# Expired counters are purged every this many increments
+PURGE_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+# Start a fresh window when the stored one has expired, otherwise add to it
+UPSERT = """
+INSERT INTO counters (key, count, expires) VALUES (:key, :amount, :expires)
+ON CONFLICT (key) DO UPDATE SET
+    count = CASE WHEN counters.expires <= :now THEN :amount ELSE counters.count + :amount END,
+    expires = CASE WHEN counters.expires <= :now THEN :expires ELSE counters.expires END
+"""
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Rate limit counters in a local SQLite file shared by every worker on the host.
+
+    RATELIMIT_STORAGE_URI=sqlite:///var/run/ficore/ratelimit.sqlite (an
+    absolute path after the third slash; `sqlite://` alone uses the temp
+    directory). The database runs in WAL mode, so readers never block and
+    an increment is one short write transaction on a local file: no
+    network hop, and nothing written to Mongo. Counters survive restarts.
+
+    Supports the fixed-window and sliding-window-counter strategies. The
+    sliding window check and increment happen in a single transaction, so
+    concurrent workers cannot both take the last slot.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        path = uri.split('://', 1)[1] if uri and '://' in uri else ''
+        self.path = path or DEFAULT_PATH
+        self.timeout = float(options.get('timeout', 5))
+        self._local = threading.local()
+        self._increments = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        with self._transaction() as connection:
+            connection.execute(SCHEMA)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork (gunicorn --preload)
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(UPSERT, {'key': key, 'amount': amount, 'expires': now + expiry, 'now': now})
+            count = connection.execute('SELECT count FROM counters WHERE key = ?', (key,)).fetchone()[0]
+        self._increments += 1
+        if self._increments % PURGE_EVERY == 0:
+            self._purge(now)
+        return count
+
+    def decr(self, key, amount=1):
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE counters SET count = MAX(count - ?, 0) WHERE key = ? AND expires > ?',
+                (amount, key, time.time())
+            )
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT count FROM counters WHERE key = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._connection().execute(
+            'SELECT expires FROM counters WHERE key = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._connection().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        with self._transaction() as connection:
+            return connection.execute('DELETE FROM counters').rowcount
+
+    def clear(self, key):
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM counters WHERE key = ?', (key,))
+
+    def _purge(self, now):
+        try:
+            with self._transaction() as connection:
+                connection.execute('DELETE FROM counters WHERE expires <= ?', (now,))
+        except sqlite3.Error as e:
+            logger.warning(f"Error purging expired rate limit counters: {str(e)}")
+
+    def _window(self, connection, key, expiry, now):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        counts = dict(connection.execute(
+            'SELECT key, count FROM counters WHERE key IN (?, ?) AND expires > ?', (previous_key, current_key, now)
+        ).fetchall())
+        previous_count = counts.get(previous_key, 0)
+        current_count = counts.get(current_key, 0)
+        previous_ttl = 0.0 if previous_count == 0 else (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        with self._transaction() as connection:
+            previous_count, previous_ttl, current_count, _ = self._window(connection, key, expiry, now)
+            if floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+                return False
+            current_key = self.sliding_window_keys(key, expiry, now)[1]
+            # The current window's counter is still read as the previous one
+            # during the next window, hence twice the expiry
+            connection.execute(UPSERT, {'key': current_key, 'amount': amount, 'expires': now + 2 * expiry, 'now': now})
+        return True
+
+    def get_sliding_window(self, key, expiry):
+        return self._window(self._connection(), key, expiry, time.time())
+
+    def clear_sliding_window(self, key, expiry):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM counters WHERE key IN (?, ?)', (previous_key, current_key))
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT: takes the write lock up front, so a
+    read-then-write never has to upgrade (and fail) under contention."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
@@ -0,0 +1,102 @@
+from flask import current_app, session
+from pymongo import monitoring
+from contextlib import contextmanager
+import bson
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Commands whose reply time marks a write the user must be able to read back
+WRITE_COMMANDS = ('insert', 'update', 'delete', 'findAndModify')
+# Flask session key holding the operation and cluster time of the user's last write
+SESSION_KEY = '_last_write'
+
+_local = threading.local()
+
+def encode_marker(operation_time, cluster_time):
+    """Session-storable form of a write's operationTime and $clusterTime."""
+    return {
+        't': operation_time.time,
+        'i': operation_time.inc,
+        'cluster': bson.encode(cluster_time).hex() if cluster_time else None
+    }
+
+def decode_marker(marker):
+    """Return (operation_time, cluster_time) from encode_marker's output."""
+    operation_time = bson.Timestamp(marker['t'], marker['i'])
+    cluster_time = bson.decode(bytes.fromhex(marker['cluster'])) if marker.get('cluster') else None
+    return operation_time, cluster_time
+
+def is_newer(marker, other):
+    return other is None or (marker['t'], marker['i']) > (other['t'], other['i'])
+
+class WriteTimeListener(monitoring.CommandListener):
+    """Remember the latest write's operationTime for the current request.
+
+    Only replica sets and sharded clusters return operationTime, so on a
+    standalone server nothing is recorded and reads are never advanced.
+    """
+
+    def start(self):
+        _local.last_write = None
+        _local.active = True
+
+    def stop(self):
+        marker, _local.last_write, _local.active = getattr(_local, 'last_write', None), None, False
+        return marker
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if not getattr(_local, 'active', False) or event.command_name not in WRITE_COMMANDS:
+            return
+        operation_time = event.reply.get('operationTime')
+        if operation_time is None:
+            return
+        marker = encode_marker(operation_time, event.reply.get('$clusterTime'))
+        if is_newer(marker, _local.last_write):
+            _local.last_write = marker
+
+    def failed(self, event):
+        pass
+
+write_time_listener = WriteTimeListener()
+
+def causal_session(client, marker=None):
+    """Start a causally consistent session that reads no earlier than marker."""
+    client_session = client.start_session(causal_consistency=True)
+    if marker:
+        operation_time, cluster_time = decode_marker(marker)
+        if cluster_time:
+            client_session.advance_cluster_time(cluster_time)
+        client_session.advance_operation_time(operation_time)
+    return client_session
+
+@contextmanager
+def reporting_reads():
+    """Yield (db, session) for heavy read-only queries that may hit a secondary.
+
+    Pass the session to every read: if the user wrote something earlier,
+    the secondary waits until it has replicated that write before answering,
+    so a report run right after adding a transaction includes it. Results
+    must be consumed inside the block.
+    """
+    mongo = current_app.extensions['pymongo']
+    with causal_session(mongo.cx, session.get(SESSION_KEY)) as client_session:
+        yield mongo.reporting_db, client_session
+
+def _start_request():
+    write_time_listener.start()
+
+def _remember_write(response):
+    marker = write_time_listener.stop()
+    if marker and is_newer(marker, session.get(SESSION_KEY)):
+        session[SESSION_KEY] = marker
+    return response
+
+def init_app(app):
+    """Track write times per request. The listener goes to the MongoClient."""
+    app.before_request(_start_request)
+    app.after_request(_remember_write)
@@ -1,10 +1,13 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
 from flask_login import login_required, current_user
-from app.utils import requires_role, check_coin_balance, format_currency, format_date
-from app.translations import trans_function as trans
+from utils import requires_role, check_coin_balance, format_currency, format_date
+from translations import trans_function as trans
 from app import mongo
 from bson import ObjectId
+from dataversion import BUMP, bump
 from datetime import datetime
+from bson.errors import InvalidId
+from storage import file_response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -50,10 +53,6 @@ def add():
                 'created_at': datetime.utcnow()
             }
             mongo.db.transactions.insert_one(transaction)
-            mongo.db.users.update_one(
-                {'_id': ObjectId(current_user.id)},
-                {'$inc': {'coin_balance': -1}}
-            )
             mongo.db.coin_transactions.insert_one({
                 'user_id': str(current_user.id),
                 'amount': -1,
@@ -61,6 +60,10 @@ def add():
                 'date': datetime.utcnow(),
                 'ref': f"Receipt creation: {transaction['party_name']}"
             })
+            mongo.db.users.update_one(
+                {'_id': ObjectId(current_user.id)},
+                {'$inc': {'coin_balance': -1, **BUMP}}
+            )
             flash(trans('add_receipt_success', default='Receipt added successfully'), 'success')
             return redirect(url_for('receipts.index'))
         except Exception as e:
@@ -104,6 +107,7 @@ def edit(id):
                     {'_id': ObjectId(id)},
                     {'$set': updated_transaction}
                 )
+                bump(mongo.db, current_user.id)
                 flash(trans('edit_receipt_success', default='Receipt updated successfully'), 'success')
                 return redirect(url_for('receipts.index'))
             except Exception as e:
@@ -127,10 +131,36 @@ def delete(id):
             'type': 'receipt'
         })
         if result.deleted_count:
+            bump(mongo.db, current_user.id)
             flash(trans('delete_receipt_success', default='Receipt deleted successfully'), 'success')
         else:
             flash(trans('transaction_not_found'), 'danger')
     except Exception as e:
         logger.error(f"Error deleting receipt {id} for user {current_user.id}: {str(e)}")
         flash(trans('something_went_wrong'), 'danger')
-    return redirect(url_for('receipts.index'))
\ No newline at end of file
+    return redirect(url_for('receipts.index'))
+
+@receipts_bp.route('/file/<receipt_id>')
+@login_required
+def receipt_file(receipt_id):
+    """Stream an uploaded receipt, or its `thumb`/`web` variant, with Range and ETag support."""
+    from gridfs.errors import NoFile
+    try:
+        query = {'_id': ObjectId(receipt_id)}
+        if current_user.role != 'admin':
+            query['user_id'] = str(current_user.id)
+        receipt = mongo.db.receipts.find_one(query, {'file_id': 1, 'filename': 1, 'sha256': 1, 'variants': 1})
+        if not receipt:
+            abort(404)
+        variant_id = (receipt.get('variants') or {}).get(request.args.get('variant'))
+        if variant_id:
+            return file_response(mongo.db, variant_id)
+        return file_response(
+            mongo.db,
+            receipt['file_id'],
+            filename=receipt.get('filename'),
+            etag=receipt.get('sha256'),
+            as_attachment=request.args.get('download') == '1'
+        )
+    except (InvalidId, NoFile):
+        abort(404)
@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+from calendar import monthrange
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from dataversion import bump_many
+import logging
+
+logger = logging.getLogger(__name__)
+
+RECURRING_PERIODS = ('weekly', 'monthly', 'yearly')
+DUPLICATE_KEY_ERROR = 11000
+
+# Fields copied from a recurring template onto each generated occurrence
+TEMPLATE_FIELDS = ('user_id', 'type', 'party_name', 'amount', 'description', 'category')
+
+def add_period(anchor, period, count):
+    """Return the date `count` periods after `anchor`, clamping month ends."""
+    if period == 'weekly':
+        return anchor + timedelta(weeks=count)
+    if period == 'monthly':
+        month_index = anchor.month - 1 + count
+        year = anchor.year + month_index // 12
+        month = month_index % 12 + 1
+    elif period == 'yearly':
+        year = anchor.year + count
+        month = anchor.month
+    else:
+        raise ValueError(f"Unsupported recurring period: {period}")
+    day = min(anchor.day, monthrange(year, month)[1])
+    return anchor.replace(year=year, month=month, day=day)
+
+def schedule_fields(is_recurring, period, anchor):
+    """Build the $set/$unset documents that (re)start or stop a recurring schedule."""
+    if is_recurring and period in RECURRING_PERIODS:
+        return {
+            'recurring_anchor': anchor,
+            'recurring_count': 0,
+            'next_run_at': add_period(anchor, period, 1)
+        }, {}
+    return {}, {'recurring_anchor': '', 'recurring_count': '', 'next_run_at': ''}
+
+def ensure_indexes(db):
+    """Create the indexes the materializer relies on."""
+    db.transactions.create_index([('next_run_at', ASCENDING)], sparse=True)
+    db.transactions.create_index(
+        [('recurrence_key', ASCENDING)],
+        unique=True,
+        partialFilterExpression={'recurrence_key': {'$exists': True}}
+    )
+
+def backfill_schedules(db, batch_size=500):
+    """Give recurring transactions written before schedules existed their next_run_at.
+
+    Anchored at created_at, as new templates are at creation, so the
+    materializer also catches up the occurrences they missed. Only documents
+    without an anchor match, so running it again is a no-op.
+    """
+    scheduled = 0
+    while True:
+        legacy = list(db.transactions.find(
+            {
+                'is_recurring': True,
+                'recurring_period': {'$in': list(RECURRING_PERIODS)},
+                'recurring_anchor': {'$exists': False},
+                'next_run_at': {'$exists': False}
+            },
+            {'recurring_period': 1, 'created_at': 1}
+        ).limit(batch_size))
+        if not legacy:
+            break
+        updates = []
+        for doc in legacy:
+            schedule_set, _ = schedule_fields(True, doc['recurring_period'], doc.get('created_at') or datetime.utcnow())
+            updates.append(UpdateOne({'_id': doc['_id'], 'recurring_anchor': {'$exists': False}}, {'$set': schedule_set}))
+        scheduled += db.transactions.bulk_write(updates, ordered=False).modified_count
+        if len(legacy) < batch_size:
+            break
+    if scheduled:
+        logger.info(f"Scheduled {scheduled} recurring transactions created before next_run_at existed")
+    return scheduled
+
+def recurrence_key(template, count):
+    """Unique per occurrence of one schedule.
+
+    Changing a template's period or re-enabling it restarts the count with a
+    new anchor; the anchor in the key keeps those occurrences from colliding
+    with the ones the earlier schedule generated.
+    """
+    return f"{template['_id']}:{template['recurring_anchor']:%Y%m%dT%H%M%S%f}:{count}"
+
+def _occurrences(template, now, max_catch_up):
+    """Yield (index, due_date) for every occurrence of a template due by `now`."""
+    start = template.get('recurring_count', 0)
+    for count in range(start + 1, start + max_catch_up + 1):
+        due = add_period(template['recurring_anchor'], template['recurring_period'], count)
+        if due > now:
+            break
+        yield count, due
+
+def _insert_occurrences(db, docs):
+    """Insert generated transactions, ignoring ones another worker already wrote."""
+    if not docs:
+        return 0
+    try:
+        return len(db.transactions.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(err.get('code') != DUPLICATE_KEY_ERROR for err in errors):
+            raise
+        return e.details.get('nInserted', 0)
+
+def materialize_due_transactions(db, now=None, batch_size=500, max_catch_up=400):
+    """Generate every due occurrence of recurring transactions in batched passes.
+
+    Each generated transaction carries a deterministic `recurrence_key` (see
+    recurrence_key), which is unique, so re-running after a crash or racing another worker never creates
+    duplicates. Schedules are advanced with a compare-and-set on `recurring_count`
+    so only one worker moves a template forward.
+    """
+    now = now or datetime.utcnow()
+    inserted = 0
+    advanced = 0
+    while True:
+        templates = list(db.transactions.find(
+            {'next_run_at': {'$lte': now}, 'is_recurring': True},
+            {field: 1 for field in TEMPLATE_FIELDS + ('recurring_period', 'recurring_anchor', 'recurring_count')}
+        ).sort('next_run_at', ASCENDING).limit(batch_size))
+        if not templates:
+            break
+        docs = []
+        updates = []
+        for template in templates:
+            if template.get('recurring_period') not in RECURRING_PERIODS or not template.get('recurring_anchor'):
+                updates.append(UpdateOne({'_id': template['_id']}, {'$unset': {'next_run_at': ''}}))
+                continue
+            last_count = template.get('recurring_count', 0)
+            for count, due in _occurrences(template, now, max_catch_up):
+                doc = {field: template.get(field) for field in TEMPLATE_FIELDS}
+                doc.update({
+                    'is_recurring': False,
+                    'recurring_period': 'none',
+                    'recurring_parent_id': template['_id'],
+                    'recurrence_key': recurrence_key(template, count),
+                    'photo_url': None,
+                    'created_at': due,
+                    'updated_at': now
+                })
+                docs.append(doc)
+                last_count = count
+            updates.append(UpdateOne(
+                {'_id': template['_id'], 'recurring_count': template.get('recurring_count', 0)},
+                {'$set': {
+                    'recurring_count': last_count,
+                    'next_run_at': add_period(template['recurring_anchor'], template['recurring_period'], last_count + 1)
+                }}
+            ))
+        inserted += _insert_occurrences(db, docs)
+        if updates:
+            advanced += db.transactions.bulk_write(updates, ordered=False).modified_count
+        bump_many(db, [doc['user_id'] for doc in docs])
+        if len(templates) < batch_size:
+            break
+    if inserted or advanced:
+        logger.info(f"Materialized {inserted} recurring transactions, advanced {advanced} schedules")
+    return inserted
@@ -1,14 +1,13 @@
 from flask import Blueprint, render_template, Response, flash, request
 from flask_login import login_required, current_user
-from app.utils import requires_role, check_coin_balance, format_currency, format_date
-from app.translations import trans_function as trans
+from utils import requires_role, check_coin_balance, format_currency, format_date
+from translations import trans_function as trans
 from app import mongo
+from readrouting import reporting_reads
+from queries import bounded_find, partial_results_notice
 from bson import ObjectId
+from dataversion import BUMP
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.units import inch
 from io import BytesIO
 import csv
 import logging
@@ -49,16 +48,16 @@ def profit_loss():
                 query['date'] = query.get('date', {}) | {'$lte': form.end_date.data}
             if form.category.data:
                 query['category'] = form.category.data
-            transactions = mongo.db.transactions.find(query).sort('date', -1)
+            # Report scans may be served by a secondary, see readrouting.py
+            with reporting_reads() as (db, read_session):
+                transactions, complete = bounded_find(db.transactions, query, sort=[('date', -1)], session=read_session)
+            if not complete:
+                partial_results_notice()
             output_format = request.form.get('format', 'html')
             if output_format == 'pdf':
                 return generate_profit_loss_pdf(transactions)
             elif output_format == 'csv':
                 return generate_profit_loss_csv(transactions)
-            mongo.db.users.update_one(
-                {'_id': ObjectId(current_user.id)},
-                {'$inc': {'coin_balance': -1}}
-            )
             mongo.db.coin_transactions.insert_one({
                 'user_id': str(current_user.id),
                 'amount': -1,
@@ -66,11 +65,18 @@ def profit_loss():
                 'date': datetime.utcnow(),
                 'ref': 'Profit/Loss report generation'
             })
+            mongo.db.users.update_one(
+                {'_id': ObjectId(current_user.id)},
+                {'$inc': {'coin_balance': -1, **BUMP}}
+            )
         except Exception as e:
             logger.error(f"Error generating profit/loss report for user {current_user.id}: {str(e)}")
             flash(trans('something_went_wrong'), 'danger')
     else:
-        transactions = mongo.db.transactions.find(query).sort('date', -1)
+        with reporting_reads() as (db, read_session):
+            transactions, complete = bounded_find(db.transactions, query, sort=[('date', -1)], session=read_session)
+        if not complete:
+            partial_results_notice()
     return render_template('reports/profit_loss.html', form=form, transactions=transactions, format_currency=format_currency, format_date=format_date)
 
 @reports_bp.route('/inventory', methods=['GET', 'POST'])
@@ -89,16 +95,15 @@ def inventory():
         try:
             if form.item_name.data:
                 query['item_name'] = {'$regex': form.item_name.data, '$options': 'i'}
-            items = mongo.db.inventory.find(query).sort('item_name', 1)
+            with reporting_reads() as (db, read_session):
+                items, complete = bounded_find(db.inventory, query, sort=[('item_name', 1)], session=read_session)
+            if not complete:
+                partial_results_notice()
             output_format = request.form.get('format', 'html')
             if output_format == 'pdf':
                 return generate_inventory_pdf(items)
             elif output_format == 'csv':
                 return generate_inventory_csv(items)
-            mongo.db.users.update_one(
-                {'_id': ObjectId(current_user.id)},
-                {'$inc': {'coin_balance': -1}}
-            )
             mongo.db.coin_transactions.insert_one({
                 'user_id': str(current_user.id),
                 'amount': -1,
@@ -106,15 +111,27 @@ def inventory():
                 'date': datetime.utcnow(),
                 'ref': 'Inventory report generation'
             })
+            mongo.db.users.update_one(
+                {'_id': ObjectId(current_user.id)},
+                {'$inc': {'coin_balance': -1, **BUMP}}
+            )
         except Exception as e:
             logger.error(f"Error generating inventory report for user {current_user.id}: {str(e)}")
             flash(trans('something_went_wrong'), 'danger')
     else:
-        items = mongo.db.inventory.find(query).sort('item_name', 1)
+        with reporting_reads() as (db, read_session):
+            items, complete = bounded_find(db.inventory, query, sort=[('item_name', 1)], session=read_session)
+        if not complete:
+            partial_results_notice()
     return render_template('reports/inventory.html', form=form, items=items, format_currency=format_currency)
 
 def generate_profit_loss_pdf(transactions):
     """Generate PDF for profit/loss report."""
+    # reportlab is only needed when a PDF is actually rendered
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
     buffer = BytesIO()
     p = canvas.Canvas(buffer, pagesize=A4)
     p.setFont("Helvetica", 12)
@@ -178,6 +195,10 @@ def generate_profit_loss_csv(transactions):
 
 def generate_inventory_pdf(items):
     """Generate PDF for inventory report."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
     buffer = BytesIO()
     p = canvas.Canvas(buffer, pagesize=A4)
     p.setFont("Helvetica", 12)
@@ -0,0 +1,213 @@
+from flask import has_request_context, request
+from flask.sessions import SecureCookieSessionInterface
+from flask_session.base import ServerSideSessionInterface
+from flask_session.defaults import Defaults
+from flask_session.mongodb import MongoDBSessionInterface
+from itsdangerous import BadSignature, want_bytes
+from collections import OrderedDict
+from datetime import datetime
+from metrics import record_session_op
+import secrets
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+VERSION_COOKIE_SUFFIX = '_v'
+
+class CachedMongoDBSessionInterface(MongoDBSessionInterface):
+    """Flask-Session's MongoDB store, minus the round trips that change nothing.
+
+    - Writes: a session is written back only when its serialized content
+      differs from what was loaded (a flash that is shown in the same
+      request, or setting a key to its current value, is not a change), or
+      when less than half of its lifetime is left, to push the TTL out.
+      SESSION_REFRESH_EACH_REQUEST restores the write-every-request behaviour.
+    - Reads: every write stamps the document and a companion cookie with a
+      random version. A process that has already seen that version of the
+      session (it read or wrote it within `cache_ttl` seconds) serves it
+      from memory; a write from any other process changes the cookie's
+      version and so misses the cache. cache_ttl=0 disables the cache.
+      Only anonymous sessions skip the store entirely: a logged-in session
+      served from memory is still checked with a small indexed query, so a
+      logout or an admin deleting the session takes effect everywhere at
+      once. For those the cache saves reading and decoding the session
+      body, not the round trip. Expired entries are never served.
+
+    Unlike Flask-Session's constructor, this one does not talk to Mongo:
+    the TTL index on `expiration` is created by ensure_indexes, from
+    setup_database or before this process's first session write.
+    """
+
+    def __init__(self, app, client, cache_ttl=60, cache_size=10000,
+                 db=Defaults.SESSION_MONGODB_DB, collection=Defaults.SESSION_MONGODB_COLLECT, **kwargs):
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._indexed = False
+        self.client = client
+        self.store = client[db][collection]
+        self.use_deprecated_method = False
+        ServerSideSessionInterface.__init__(self, app, **kwargs)
+
+    def ensure_indexes(self):
+        """Let Mongo delete session documents once they expire."""
+        self.store.create_index('expiration', expireAfterSeconds=0)
+        self._indexed = True
+
+    def version_cookie_name(self, app):
+        return self.get_cookie_name(app) + VERSION_COOKIE_SUFFIX
+
+    def _cached(self, store_id, version):
+        if not self.cache_ttl or version is None:
+            return None
+        with self._cache_lock:
+            entry = self._cache.get(store_id)
+            if entry is None or entry[0] != version or time.monotonic() - entry[3] > self.cache_ttl:
+                return None
+            self._cache.move_to_end(store_id)
+            return entry
+
+    def _remember(self, store_id, version, serialized, expiration):
+        if not self.cache_ttl:
+            return
+        with self._cache_lock:
+            self._cache[store_id] = (version, serialized, expiration, time.monotonic())
+            self._cache.move_to_end(store_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def forget(self, store_id):
+        with self._cache_lock:
+            self._cache.pop(store_id, None)
+
+    def store_id_for(self, app, cookie):
+        """Store id for a session cookie value, or None if its signature is bad."""
+        sid = cookie
+        if self.use_signer:
+            try:
+                sid = self._unsign(app, sid)
+            except BadSignature:
+                return None
+        return self._get_store_id(sid)
+
+    def cached_session(self, store_id, version):
+        """(data, serialized, expiration, check) for a cached, unexpired version, else None.
+
+        `check` is the filter that must still match a stored session before a
+        logged-in session is used (None for anonymous ones). The caller runs
+        it with its own client; if nothing matches, the session was deleted
+        (logout, revoked) or rewritten elsewhere: call forget() and treat the
+        request as having no session.
+        """
+        entry = self._cached(store_id, version)
+        if entry is None:
+            return None
+        serialized, expiration = entry[1], entry[2]
+        if expiration is not None and expiration <= datetime.utcnow():
+            self.forget(store_id)
+            return None
+        data = self.serializer.decode(serialized)
+        check = {'id': store_id, 'v': version} if '_user_id' in data else None
+        return data, serialized, expiration, check
+
+    def open_session(self, app, request):
+        self._local.loaded = None
+        self._local.written = None
+        session = super().open_session(app, request)
+        # (serialized data, expiration) as loaded, for the change check on save
+        session.loaded = self._local.loaded
+        return session
+
+    def _retrieve_session_data(self, store_id):
+        version = request.cookies.get(self.version_cookie_name(self.app)) if has_request_context() else None
+        cached = self.cached_session(store_id, version)
+        if cached is not None:
+            data, serialized, expiration, check = cached
+            if check is not None:
+                record_session_op('verify')
+                if not self.store.find_one(check, {'_id': 1}):
+                    self.forget(store_id)
+                    return None
+            record_session_op('cache_hit')
+            self._local.loaded = (serialized, expiration)
+            return data
+        record_session_op('read')
+        document = self.store.find_one({'id': store_id})
+        if not document:
+            return None
+        serialized, expiration = want_bytes(document['val']), document.get('expiration')
+        self._remember(store_id, document.get('v'), serialized, expiration)
+        self._local.loaded = (serialized, expiration)
+        return self.serializer.decode(serialized)
+
+    def should_set_storage(self, app, session):
+        if app.config['SESSION_REFRESH_EACH_REQUEST']:
+            return True
+        loaded = getattr(session, 'loaded', None)
+        if loaded is None or loaded[1] is None:
+            return True
+        if session.modified and self.serializer.encode(session) != loaded[0]:
+            return True
+        if loaded[1] - datetime.utcnow() < app.permanent_session_lifetime / 2:
+            record_session_op('touch')
+            return True
+        record_session_op('skip')
+        return False
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        if not self._indexed:
+            self.ensure_indexes()
+        version = secrets.token_hex(6)
+        expiration = datetime.utcnow() + session_lifetime
+        serialized = self.serializer.encode(session)
+        self.store.update_one(
+            {'id': store_id},
+            {'$set': {'id': store_id, 'val': serialized, 'expiration': expiration, 'v': version}},
+            upsert=True
+        )
+        record_session_op('write')
+        self._remember(store_id, version, serialized, expiration)
+        self._local.written = version
+
+    def _delete_session(self, store_id):
+        super()._delete_session(store_id)
+        record_session_op('delete')
+        self.forget(store_id)
+
+    def save_session(self, app, session, response):
+        super().save_session(app, session, response)
+        name = self.version_cookie_name(app)
+        if not session and session.modified:
+            response.delete_cookie(name, domain=self.get_cookie_domain(app), path=self.get_cookie_path(app))
+        elif getattr(self._local, 'written', None):
+            response.set_cookie(
+                name,
+                self._local.written,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=self.get_cookie_domain(app),
+                path=self.get_cookie_path(app),
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+        self._local.written = None
+
+def init_app(app, client):
+    """Install the session interface selected by SESSION_BACKEND."""
+    if app.config['SESSION_BACKEND'] == 'cookie':
+        # Signed (not encrypted) client-side session: no Mongo I/O at all,
+        # but everything in it must stay small and non-secret
+        app.session_interface = SecureCookieSessionInterface()
+        return
+    app.session_interface = CachedMongoDBSessionInterface(
+        app,
+        client,
+        cache_ttl=app.config['SESSION_CACHE_TTL'],
+        permanent=app.config['SESSION_PERMANENT'],
+        db=app.config['SESSION_MONGODB_DB'],
+        collection=app.config['SESSION_MONGODB_COLLECTION']
+    )
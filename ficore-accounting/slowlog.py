@@ -0,0 +1,239 @@
+from flask import current_app, request
+from pymongo import monitoring, DESCENDING
+from pymongo.errors import CollectionInvalid, OperationFailure
+from bson import SON
+from datetime import datetime
+import hashlib
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Commands whose filter shape and plan are worth recording
+EXPLAINABLE = ('find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify')
+# Driver-added fields that are not part of the query and break explain
+DRIVER_FIELDS = ('lsid', '$clusterTime', '$db', '$readPreference', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern', 'writeConcern')
+SLOW_QUERY_COLLECTION = 'slow_queries'
+PLAN_COLLECTION = 'slow_query_plans'
+# Plan fields rendered as strings (SBE stage listings), which can embed literals
+RENDERED_PLAN_FIELDS = ('slotBasedPlan',)
+
+_local = threading.local()
+_known_plans = set()
+_collections_ready = False
+
+def normalize(value):
+    """Replace every literal in a query with '?' while keeping its structure.
+
+    {'party_name': {'$regex': 'ade', '$options': 'i'}} becomes
+    {'party_name': {'$regex': '?', '$options': '?'}}, so the same query with
+    different user input maps onto one shape.
+    """
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $in lists of any length are one shape; pipelines and $or keep every branch
+        if any(isinstance(item, dict) for item in value):
+            return [normalize(item) for item in value]
+        return ['?'] if value else []
+    return '?'
+
+def query_shape(command_name, command):
+    """Return (shape document, shape hash) for an explainable command."""
+    collection = command.get(command_name)
+    shape = {'command': command_name, 'collection': collection}
+    if command_name == 'find':
+        shape['filter'] = normalize(command.get('filter', {}))
+        if command.get('sort'):
+            shape['sort'] = dict(command['sort'])
+    elif command_name == 'aggregate':
+        shape['pipeline'] = normalize(command.get('pipeline', []))
+    elif command_name in ('count', 'distinct'):
+        shape['filter'] = normalize(command.get('query', {}))
+        if command_name == 'distinct':
+            shape['key'] = command.get('key')
+    elif command_name in ('update', 'delete'):
+        statements = command.get('updates' if command_name == 'update' else 'deletes') or [{}]
+        shape['filter'] = normalize(statements[0].get('q', {}))
+    elif command_name == 'findAndModify':
+        shape['filter'] = normalize(command.get('query', {}))
+        if command.get('sort'):
+            shape['sort'] = dict(command['sort'])
+    digest = hashlib.sha1(json.dumps(shape, sort_keys=True, default=str).encode()).hexdigest()
+    return shape, digest
+
+def _explainable_command(command):
+    return SON((key, value) for key, value in command.items() if key not in DRIVER_FIELDS)
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Collect commands slower than the threshold for the current request.
+
+    Nothing is written from inside the listener; the request's teardown
+    flushes what was collected, with recording switched off so the
+    recorder's own writes and explains are not recorded.
+    """
+
+    def __init__(self, threshold_ms=100):
+        self.threshold_ms = threshold_ms
+
+    def started(self, event):
+        pending = getattr(_local, 'pending', None)
+        if pending is None or getattr(_local, 'suppressed', False) or event.command_name not in EXPLAINABLE:
+            return
+        pending[event.request_id] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        pending = getattr(_local, 'pending', None)
+        if pending is None:
+            return
+        started = pending.pop(event.request_id, None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms >= self.threshold_ms:
+            _local.slow.append((started[0], event.command_name, started[1], duration_ms))
+
+slow_query_listener = SlowQueryListener()
+
+def ensure_collections(db, size_bytes=16 * 1024 * 1024):
+    """Create the capped slow-query log, or cap one an insert created plain."""
+    global _collections_ready
+    if SLOW_QUERY_COLLECTION not in db.list_collection_names():
+        try:
+            db.create_collection(SLOW_QUERY_COLLECTION, capped=True, size=size_bytes)
+        except (CollectionInvalid, OperationFailure):
+            # Another worker created it first
+            pass
+    if not db[SLOW_QUERY_COLLECTION].options().get('capped'):
+        logger.warning(f"{SLOW_QUERY_COLLECTION} is not capped, converting it")
+        db.command('convertToCapped', SLOW_QUERY_COLLECTION, size=size_bytes)
+    db[SLOW_QUERY_COLLECTION].create_index([('shape_id', 1)])
+    _collections_ready = True
+
+def _scrub_plan(node):
+    """Strip user data (filter literals, index bounds, SBE stage text) from an explain plan."""
+    if isinstance(node, list):
+        return [_scrub_plan(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    scrubbed = {}
+    for key, value in node.items():
+        if key in RENDERED_PLAN_FIELDS:
+            continue
+        if key in ('filter', 'transformBy'):
+            scrubbed[key] = normalize(value)
+        elif key == 'indexBounds':
+            scrubbed[key] = {field: ['?'] for field in value}
+        else:
+            scrubbed[key] = _scrub_plan(value)
+    return scrubbed
+
+def _summarize_plan(plan):
+    stages = []
+    node = plan
+    while isinstance(node, dict):
+        stage = node.get('stage')
+        if stage:
+            stages.append(stage if not node.get('indexName') else f"{stage}({node['indexName']})")
+        node = node.get('inputStage') or (node.get('inputStages') or [None])[0]
+    return stages
+
+def capture_plan(db, shape_id, shape, command, explain_db=None):
+    """Run explain (queryPlanner only, nothing executes) once per shape.
+
+    The plan is stored in `db`; the command is explained against
+    `explain_db`, the database it originally ran on.
+    """
+    if shape_id in _known_plans:
+        return
+    if db[PLAN_COLLECTION].find_one({'_id': shape_id}, {'_id': 1}):
+        _known_plans.add(shape_id)
+        return
+    try:
+        explain = (explain_db if explain_db is not None else db).command(SON([('explain', _explainable_command(command)), ('verbosity', 'queryPlanner')]))
+        planner = explain.get('queryPlanner') or explain.get('stages', [{}])[0].get('$cursor', {}).get('queryPlanner', {})
+        # SBE plans nest the tree under queryPlan; keep only that tree
+        winning = planner.get('winningPlan', {})
+        winning = _scrub_plan(winning.get('queryPlan', winning))
+        stages = _summarize_plan(winning)
+        document = {
+            'shape': shape,
+            'winning_plan': winning,
+            'stages': stages,
+            'collscan': any(stage.startswith('COLLSCAN') for stage in stages),
+            'captured_at': datetime.utcnow()
+        }
+    except Exception as e:
+        logger.warning(f"Error explaining slow query {shape_id}: {str(e)}")
+        document = {'shape': shape, 'error': str(e), 'captured_at': datetime.utcnow()}
+    db[PLAN_COLLECTION].update_one({'_id': shape_id}, {'$setOnInsert': document}, upsert=True)
+    _known_plans.add(shape_id)
+
+def _start_request():
+    _local.pending = {}
+    _local.slow = []
+
+def _flush(exception=None):
+    slow = getattr(_local, 'slow', None)
+    _local.pending = None
+    _local.slow = None
+    if not slow:
+        return
+    _local.suppressed = True
+    try:
+        client = current_app.extensions['pymongo'].cx
+        db = current_app.extensions['pymongo'].db
+        # setup_database() is off by default in production; an insert into a
+        # missing collection would create it uncapped
+        if not _collections_ready:
+            ensure_collections(db)
+        entries = []
+        for database_name, command_name, command, duration_ms in slow:
+            shape, shape_id = query_shape(command_name, command)
+            entries.append({
+                'shape_id': shape_id,
+                'shape': shape,
+                'duration_ms': round(duration_ms, 2),
+                'endpoint': request.endpoint,
+                'timestamp': datetime.utcnow()
+            })
+            capture_plan(db, shape_id, shape, command, explain_db=client[database_name])
+        db[SLOW_QUERY_COLLECTION].insert_many(entries, ordered=False)
+    except Exception as e:
+        logger.error(f"Error recording slow queries: {str(e)}")
+    finally:
+        _local.suppressed = False
+
+def ranked_shapes(db, limit=50):
+    """Slow query shapes ordered by total time, with their captured plans."""
+    shapes = list(db[SLOW_QUERY_COLLECTION].aggregate([
+        {'$group': {
+            '_id': '$shape_id',
+            'shape': {'$first': '$shape'},
+            'count': {'$sum': 1},
+            'total_ms': {'$sum': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'},
+            'endpoints': {'$addToSet': '$endpoint'},
+            'last_seen': {'$max': '$timestamp'}
+        }},
+        {'$sort': SON([('total_ms', DESCENDING)])},
+        {'$limit': limit}
+    ]))
+    plans = {plan['_id']: plan for plan in db[PLAN_COLLECTION].find({'_id': {'$in': [shape['_id'] for shape in shapes]}})}
+    for shape in shapes:
+        shape['avg_ms'] = round(shape['total_ms'] / shape['count'], 2)
+        shape['plan'] = plans.get(shape['_id'], {})
+    return shapes
+
+def init_app(app):
+    """Record slow queries per request. The listener goes to the MongoClient."""
+    slow_query_listener.threshold_ms = app.config.setdefault('SLOW_QUERY_MS', 100)
+    app.before_request(_start_request)
+    app.teardown_request(_flush)
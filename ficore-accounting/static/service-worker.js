@@ -1,43 +0,0 @@
-const CACHE_NAME = 'ficore-cache-v1';
-const urlsToCache = [
-    '/',
-    '/static/styles/tailwind.min.css',
-    '/manifest.json',
-    '/static/icons/icon-192x192.png',
-    '/static/icons/icon-512x512.png',
-    '/invoices/debtors',
-    '/invoices/creditors',
-    '/transactions/receipts',
-    '/transactions/payments',
-    '/inventory',
-    '/inventory/add'
-];
-
-self.addEventListener('install', event => {
-    event.waitUntil(
-        caches.open(CACHE_NAME)
-            .then(cache => cache.addAll(urlsToCache))
-    );
-});
-
-self.addEventListener('fetch', event => {
-    event.respondWith(
-        caches.match(event.request)
-            .then(response => response || fetch(event.request))
-    );
-});
-
-self.addEventListener('activate', event => {
-    const cacheWhitelist = [CACHE_NAME];
-    event.waitUntil(
-        caches.keys().then(cacheNames => {
-            return Promise.all(
-                cacheNames.map(cacheName => {
-                    if (!cacheWhitelist.includes(cacheName)) {
-                        return caches.delete(cacheName);
-                    }
-                })
-            );
-        })
-    );
-});
\ No newline at end of file
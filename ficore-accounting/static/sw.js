@@ -1,79 +1,146 @@
-const CACHE_NAME = 'ficore-accounting-v1';
-const urlsToCache = [
-    '/',
-    '/users/login',
-    '/users/signup',
-    '/users/profile',
-    '/users/setup_wizard',
-    '{{ url_for("static", filename="css/styles.css") }}',
-    '{{ url_for("static", filename="images/logo.png") }}',
-    '{{ url_for("static", filename="images/favicon.ico") }}',
-    '{{ url_for("static", filename="images/icons/icon-192x192.png") }}',
-    '{{ url_for("static", filename="images/icons/icon-512x512.png") }}',
-    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
-    'https://cdn.jsdelivr.net/npm/@popperjs/core@2.11.8/dist/umd/popper.min.js',
-    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.min.js',
-    '/templates/base.html',
-    '/templates/users/login.html',
-    '/templates/users/signup.html',
-    '/templates/users/profile.html',
-    '/templates/users/setup.html'
+// PRECACHE_URLS and ASSET_VERSION are prepended by the /service-worker.js
+// view from the asset manifest (assets.py)
+
+// Bump when the strategies below change; ASSET_VERSION changes with every asset build
+const SW_VERSION = 'v2';
+const STATIC_CACHE = `ficore-static-${SW_VERSION}-${ASSET_VERSION}`;
+const PAGES_CACHE = `ficore-pages-${SW_VERSION}`;
+const CACHE_LIMITS = {
+    [STATIC_CACHE]: 80,
+    [PAGES_CACHE]: 30
+};
+
+// Shown from cache at once and refreshed in the background
+const STALE_WHILE_REVALIDATE = [
+    /^\/$/,
+    /^\/dashboard\/general$/,
+    /^\/transactions\/(receipts|payments)$/,
+    /^\/invoices\/(debtors|creditors)$/,
+    /^\/coins\/history$/,
+    /^\/inventory\/?$/
+];
+// Pages that spend coins or handle login and payment: never served from cache
+const NETWORK_ONLY = [
+    /^\/coins\/(purchase|receipt_upload|balance)/,
+    /^\/invoices\/(create|update)\//,
+    /^\/transactions\/(add|update)\//,
+    /^\/inventory\/(add|edit)/,
+    /^\/users\//,
+    /^\/api\//,
+    /\/export\//
 ];
 
-// Install event: Cache static assets
+function matches(patterns, path) {
+    return patterns.some(pattern => pattern.test(path));
+}
+
+// Cache API keys come back in insertion order, so re-inserting an entry on
+// use and dropping the first keys keeps the most recently used ones
+async function trim(cacheName) {
+    const cache = await caches.open(cacheName);
+    const keys = await cache.keys();
+    const excess = keys.length - CACHE_LIMITS[cacheName];
+    for (let i = 0; i < excess; i++) {
+        await cache.delete(keys[i]);
+    }
+}
+
+async function store(cacheName, request, response) {
+    const cache = await caches.open(cacheName);
+    await cache.delete(request);
+    await cache.put(request, response);
+    await trim(cacheName);
+}
+
+function cacheable(response) {
+    // Redirects (to the login page, say) and pages that showed a one-off
+    // message are not worth replaying
+    return response && response.ok && response.type === 'basic' && !response.redirected
+        && !(response.headers.get('Cache-Control') || '').includes('no-store');
+}
+
+async function cacheFirst(event) {
+    const cache = await caches.open(STATIC_CACHE);
+    const cached = await cache.match(event.request);
+    if (cached) {
+        event.waitUntil(store(STATIC_CACHE, event.request, cached.clone()));
+        return cached;
+    }
+    const response = await fetch(event.request);
+    if (cacheable(response)) {
+        event.waitUntil(store(STATIC_CACHE, event.request, response.clone()));
+    }
+    return response;
+}
+
+async function staleWhileRevalidate(event) {
+    const cache = await caches.open(PAGES_CACHE);
+    const cached = await cache.match(event.request);
+    const refresh = fetch(event.request).then(async response => {
+        if (cacheable(response)) {
+            await store(PAGES_CACHE, event.request, response.clone());
+        } else if (response.redirected) {
+            // Signed out or session expired: drop everything cached for the old session
+            await caches.delete(PAGES_CACHE);
+        }
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(refresh.catch(() => {}));
+        return cached;
+    }
+    try {
+        return await refresh;
+    } catch (error) {
+        return offline();
+    }
+}
+
+function offline() {
+    return new Response('Offline', { status: 503, headers: { 'Content-Type': 'text/plain' } });
+}
+
 self.addEventListener('install', event => {
     event.waitUntil(
-        caches.open(CACHE_NAME)
-            .then(cache => {
-                console.log('Caching static assets');
-                return cache.addAll(urlsToCache);
-            })
-            .catch(error => {
-                console.error('Cache installation failed:', error);
-            })
+        caches.open(STATIC_CACHE)
+            .then(cache => cache.addAll(PRECACHE_URLS))
+            .catch(error => console.error('Precaching failed:', error))
     );
     self.skipWaiting();
 });
 
-// Activate event: Clean up old caches
 self.addEventListener('activate', event => {
+    const current = Object.keys(CACHE_LIMITS);
     event.waitUntil(
-        caches.keys().then(cacheNames => {
-            return Promise.all(
-                cacheNames
-                    .filter(cacheName => cacheName !== CACHE_NAME)
-                    .map(cacheName => caches.delete(cacheName))
-            );
-        })
+        caches.keys()
+            .then(names => Promise.all(names.filter(name => !current.includes(name)).map(name => caches.delete(name))))
+            .then(() => self.clients.claim())
     );
-    self.clients.claim();
 });
 
-// Fetch event: Serve from cache or fetch from network
 self.addEventListener('fetch', event => {
-    event.respondWith(
-        caches.match(event.request)
-            .then(response => {
-                if (response) {
-                    return response; // Return cached response
-                }
-                return fetch(event.request)
-                    .then(networkResponse => {
-                        if (!networkResponse || networkResponse.status !== 200 || networkResponse.type !== 'basic') {
-                            return networkResponse;
-                        }
-                        // Clone response for caching
-                        const responseToCache = networkResponse.clone();
-                        caches.open(CACHE_NAME)
-                            .then(cache => {
-                                cache.put(event.request, responseToCache);
-                            });
-                        return networkResponse;
-                    })
-                    .catch(error => {
-                        console.error('Fetch failed:', error);
-                        return caches.match('/templates/users/offline.html') || new Response('Offline', { status: 503 });
-                    });
-            })
-    );
-});
\ No newline at end of file
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+    if (request.method !== 'GET') {
+        // A write makes the cached lists stale; the response itself is never cached
+        event.respondWith(fetch(request).finally(() => caches.delete(PAGES_CACHE)));
+        return;
+    }
+    if (url.pathname === '/users/logout') {
+        event.waitUntil(caches.delete(PAGES_CACHE));
+        return;
+    }
+    if (matches(NETWORK_ONLY, url.pathname)) {
+        return;
+    }
+    if (url.pathname.startsWith('/static/')) {
+        event.respondWith(cacheFirst(event));
+    } else if (matches(STALE_WHILE_REVALIDATE, url.pathname) && !url.search) {
+        event.respondWith(staleWhileRevalidate(event));
+    } else if (request.mode === 'navigate') {
+        event.respondWith(fetch(request).catch(() => caches.match(request).then(cached => cached || offline())));
+    }
+});
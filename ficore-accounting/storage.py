@@ -0,0 +1,200 @@
+from flask import Response, request
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from collections import Counter
+from werkzeug.wsgi import wrap_file
+from datetime import datetime
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Matches the GridFS default so every read/write maps onto whole chunks
+CHUNK_SIZE = 255 * 1024
+# Stored blobs never change, so clients may keep them for a year
+FILE_MAX_AGE = 365 * 24 * 3600
+# The only stored types a browser may render in place; anything else downloads
+INLINE_TYPES = {'image/jpeg', 'image/png', 'application/pdf'}
+MAGIC_NUMBERS = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'%PDF-', 'application/pdf')
+)
+
+class FileTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size limit."""
+
+def sniff_content_type(stream):
+    """Return the INLINE_TYPES entry the stream's magic bytes match, or None.
+
+    Reads only the first few bytes and rewinds, so the caller can still
+    store the whole stream.
+    """
+    head = stream.read(8)
+    stream.seek(0)
+    for magic, content_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return content_type
+    return None
+
+def ensure_indexes(db):
+    """Create the indexes used by the content-addressed blob store."""
+    db.file_blobs.create_index([('file_id', ASCENDING)], unique=True)
+
+def store_file(db, stream, filename, content_type=None, max_bytes=None, metadata=None):
+    """Stream a file into GridFS, sharing one blob between identical uploads.
+
+    The upload is copied chunk by chunk while its SHA-256 is computed, so
+    memory stays bounded by CHUNK_SIZE. If a blob with the same hash already
+    exists its reference count is bumped and the new copy is discarded.
+    Returns (file_id, sha256).
+    """
+    from gridfs import GridFSBucket
+    bucket = GridFSBucket(db)
+    digest = hashlib.sha256()
+    size = 0
+    grid_in = bucket.open_upload_stream(
+        filename,
+        chunk_size_bytes=CHUNK_SIZE,
+        metadata=dict(metadata or {}, content_type=content_type)
+    )
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise FileTooLargeError(f"Upload exceeds {max_bytes} bytes")
+            digest.update(chunk)
+            grid_in.write(chunk)
+        sha256 = digest.hexdigest()
+        grid_in.sha256 = sha256
+    except BaseException:
+        grid_in.abort()
+        raise
+    grid_in.close()
+    try:
+        blob = _reference_blob(db, sha256, grid_in._id, size, content_type)
+    except BaseException:
+        _delete_grid_file(db, grid_in._id)
+        raise
+    if blob['file_id'] != grid_in._id:
+        _delete_grid_file(db, grid_in._id)
+        logger.info(f"Deduplicated upload {filename} against blob {blob['file_id']}")
+    return blob['file_id'], sha256
+
+def _reference_blob(db, sha256, file_id, size, content_type):
+    update = {
+        '$setOnInsert': {
+            'file_id': file_id,
+            'length': size,
+            'content_type': content_type,
+            'created_at': datetime.utcnow()
+        },
+        '$inc': {'refcount': 1}
+    }
+    try:
+        return db.file_blobs.find_one_and_update(
+            {'_id': sha256}, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # An identical upload inserted the blob first: the retry matches it
+        return db.file_blobs.find_one_and_update(
+            {'_id': sha256}, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+
+def _delete_grid_file(db, file_id):
+    db.fs.chunks.delete_many({'files_id': file_id})
+    db.fs.files.delete_one({'_id': file_id})
+
+def release_file(db, file_id):
+    """Drop one reference to a blob, deleting it and its variants when unused."""
+    blob = db.file_blobs.find_one_and_update(
+        {'file_id': file_id},
+        {'$inc': {'refcount': -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not blob or blob['refcount'] > 0:
+        return False
+    if db.file_blobs.delete_one({'_id': blob['_id'], 'refcount': {'$lte': 0}}).deleted_count:
+        from gridfs import GridFSBucket
+        original = db.fs.files.find_one({'_id': file_id}, {'variants': 1}) or {}
+        GridFSBucket(db).delete(file_id)
+        for variant_id in (original.get('variants') or {}).values():
+            release_file(db, variant_id)
+        return True
+    return False
+
+def release_files(db, file_ids):
+    """release_file for many references at once (file_ids may repeat).
+
+    A fixed number of commands however many files there are: one bulk
+    decrement, then the unused blobs, their GridFS files and chunks go in
+    one command each, and their variants in one more round. Returns the
+    number of files deleted.
+    """
+    counts = Counter(file_ids)
+    if not counts:
+        return 0
+    db.file_blobs.bulk_write(
+        [UpdateOne({'file_id': file_id}, {'$inc': {'refcount': -count}}) for file_id, count in counts.items()],
+        ordered=False
+    )
+    unused = {blob['_id']: blob['file_id'] for blob in db.file_blobs.find(
+        {'file_id': {'$in': list(counts)}, 'refcount': {'$lte': 0}}, {'file_id': 1}
+    )}
+    if not unused:
+        return 0
+    deleted = db.file_blobs.delete_many({'_id': {'$in': list(unused)}, 'refcount': {'$lte': 0}}).deleted_count
+    if deleted < len(unused):
+        # Re-referenced by an upload in between: keep those files
+        for blob in db.file_blobs.find({'_id': {'$in': list(unused)}}, {'_id': 1}):
+            unused.pop(blob['_id'])
+    gone = list(unused.values())
+    variants = [
+        variant_id
+        for original in db.fs.files.find({'_id': {'$in': gone}, 'variants': {'$exists': True}}, {'variants': 1})
+        for variant_id in original['variants'].values()
+    ]
+    db.fs.chunks.delete_many({'files_id': {'$in': gone}})
+    db.fs.files.delete_many({'_id': {'$in': gone}})
+    return len(gone) + release_files(db, variants)
+
+def _cache_headers(response, etag):
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = FILE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+def file_response(db, file_id, filename=None, etag=None, as_attachment=False, bucket_name='fs'):
+    """Stream a GridFS file to the client with Range, ETag and 304 support.
+
+    When the caller already knows the ETag (e.g. the receipt's stored hash),
+    a matching If-None-Match is answered without touching GridFS at all.
+    Only INLINE_TYPES are served inline; anything else is an attachment.
+    """
+    if etag and request.if_none_match.contains(etag):
+        return _cache_headers(Response(status=304), etag)
+    from gridfs import GridFSBucket
+    grid_out = GridFSBucket(db, bucket_name=bucket_name).open_download_stream(file_id)
+    mimetype = (grid_out.metadata or {}).get('content_type')
+    if mimetype not in INLINE_TYPES:
+        # Never let a browser render an unchecked type from our origin
+        mimetype, as_attachment = 'application/octet-stream', True
+    response = Response(
+        wrap_file(request.environ, grid_out, buffer_size=CHUNK_SIZE),
+        mimetype=mimetype,
+        direct_passthrough=True
+    )
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.call_on_close(grid_out.close)
+    response.content_length = grid_out.length
+    response.accept_ranges = 'bytes'
+    response.last_modified = grid_out.upload_date
+    disposition = 'attachment' if as_attachment else 'inline'
+    response.headers.set('Content-Disposition', disposition, filename=filename or grid_out.filename or str(file_id))
+    etag = etag or getattr(grid_out, 'sha256', None) or getattr(grid_out, 'md5', None) or str(file_id)
+    _cache_headers(response, etag)
+    return response.make_conditional(request, accept_ranges=True, complete_length=grid_out.length)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The app modules live at the repository root, not in an installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mongo command budgets per route, see query_budget.py
+pytest_plugins = ['query_budget']
@@ -0,0 +1,174 @@
+from datetime import timedelta
+import pytest
+from flask import Flask, session, jsonify
+from flask_wtf.csrf import generate_csrf
+
+pytest.importorskip('motor')
+pytest.importorskip('httpx')
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+@pytest.fixture
+def client():
+    import api
+    import session_store
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        SECRET_KEY='api-tests',
+        SESSION_BACKEND='cookie',
+        SESSION_COOKIE_NAME='ficore_session',
+        PERMANENT_SESSION_LIFETIME=timedelta(minutes=30),
+        MONGO_URI='mongodb://localhost:27017/ficore_api_test',
+        QUERY_MAX_TIME_MS=2000,
+        RATELIMIT_ENABLED=False,
+        COMPRESS_MIN_SIZE=500,
+        COMPRESS_GZIP_LEVEL=6,
+        COMPRESS_BROTLI_QUALITY=5
+    )
+    session_store.init_app(flask_app, None)
+
+    @flask_app.route('/login/<lang>')
+    def login(lang):
+        session['_user_id'] = 'ada'
+        session['lang'] = lang
+        return 'ok'
+
+    @flask_app.route('/api/csrf-token')
+    def csrf_token():
+        return jsonify({'csrf_token': generate_csrf()})
+
+    asgi_app = Starlette(routes=api.routes + [Mount('/', app=WSGIMiddleware(flask_app))])
+    asgi_app.state.flask_app = flask_app
+    return TestClient(asgi_app)
+
+def test_requests_without_a_session_are_rejected(client):
+    response = client.get('/api/invoices')
+    assert response.status_code == 401
+    assert response.json()['error'] == 'login_required'
+
+def test_writes_need_the_csrf_token_from_the_flask_session(client):
+    client.get('/login/ha')
+    response = client.post('/api/invoices', json={'party_name': 'Musa', 'amount': 100})
+    assert response.status_code == 403
+    body = response.json()
+    assert body['error'] == 'csrf_invalid'
+    # The session's language is used for the message
+    assert body['message'] != 'The form expired. Reload the page and try again.'
+
+    token = client.get('/api/csrf-token').json()['csrf_token']
+    response = client.post('/api/invoices', json={'party_name': 'Musa'}, headers={'X-CSRFToken': token + 'x'})
+    assert response.json()['error'] == 'csrf_invalid'
+
+def test_invoice_fields_accept_the_react_form():
+    from api.invoices import invoice_fields
+    fields = invoice_fields({'customer_name': 'Musa Ali', 'description': 'Rice', 'amount': '2500', 'due_date': '2025-03-01T00:00:00Z'}, creating=True)
+    assert fields['party_name'] == 'Musa Ali'
+    assert fields['type'] == 'debtor'
+    assert fields['items'] == [{'desc': 'Rice', 'qty': 1, 'price': 2500.0}]
+    assert fields['total'] == 2500.0
+    assert fields['due_date'].isoformat() == '2025-03-01T00:00:00'
+
+def test_invalid_fields_are_reported_together():
+    from api.common import APIError
+    from api.transactions import transaction_fields
+    with pytest.raises(APIError) as error:
+        transaction_fields({'type': 'gift', 'amount': -5, 'category': 'Sales'}, creating=True)
+    assert error.value.status == 400
+    assert set(error.value.details) == {'type', 'amount', 'description'}
+    fields = transaction_fields({'type': 'income', 'amount': 5, 'description': 'Sale', 'category': 'Sales'}, creating=True)
+    assert (fields['type'], fields['category'], fields['recurring_period']) == ('receipt', 'sales', 'none')
+
+def test_batch_results_carry_their_own_cache_headers():
+    import asyncio
+    import json
+    from api.batch import run_query, render_results
+    from api.common import Caller
+    caller = Caller({'_id': 'ada', 'role': 'personal', 'coin_balance': 7}, 'en', None, 'api.batch', 2000)
+    queries = [
+        {'name': 'balance', 'resource': 'coins.balance'},
+        {'name': 'stock', 'resource': 'inventory.list', 'params': {'low_stock': 1}},
+        {'name': 'unknown', 'resource': 'users.list'}
+    ]
+    results = [asyncio.run(run_query(caller, query)) for query in queries]
+    report = json.loads(render_results(queries, results))['results']
+    assert report['balance']['data'] == {'coin_balance': 7}
+    assert report['balance']['headers']['Cache-Control'] == 'private, no-cache'
+    # Only traders have inventory; the other entries are unaffected
+    assert report['stock']['status'] == 403
+    assert report['unknown']['status'] == 400
+
+    etag = report['balance']['headers']['ETag']
+    result, body = asyncio.run(run_query(caller, dict(queries[0], etag=etag)))
+    assert (result['status'], body) == (304, None)
+
+def test_compact_and_msgpack_encodings():
+    import msgspec
+    from api.encoding import Format, SHORT_KEYS, encode
+    page = {'items': [{'_id': 'x1', 'party_name': 'Musa', 'phone': None, 'amount': 2500.0}], 'next': None}
+    assert msgspec.json.decode(encode(page, Format(compact=True, msgpack=False))) == {'i': [{'id': 'x1', 'p': 'Musa', 'a': 2500.0}]}
+    assert msgspec.msgpack.decode(encode(page, Format(compact=False, msgpack=True))) == page
+    assert len(set(SHORT_KEYS.values())) == len(SHORT_KEYS)
+
+def test_compact_batch_keeps_the_envelope_readable():
+    import asyncio
+    import msgspec
+    from api.batch import run_query, render_results
+    from api.common import Caller
+    from api.encoding import Format
+    caller = Caller({'_id': 'ada', 'role': 'personal', 'coin_balance': 7}, 'en', None, 'api.batch', 2000)
+    fmt = Format(compact=True, msgpack=True)
+    queries = [{'name': 'balance', 'resource': 'coins.balance'}]
+    results = [asyncio.run(run_query(caller, queries[0], fmt))]
+    report = msgspec.msgpack.decode(render_results(queries, results, fmt))['results']
+    assert report['balance']['status'] == 200
+    assert report['balance']['data'] == {'cb': 7}
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+def test_cached_mongo_sessions_are_checked_for_revocation(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    import api.common
+    import session_store
+    mongomock = pytest.importorskip('mongomock')
+    client = mongomock.MongoClient()
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        SECRET_KEY='api-tests',
+        SESSION_BACKEND='mongodb',
+        SESSION_CACHE_TTL=60,
+        SESSION_REFRESH_EACH_REQUEST=False,
+        SESSION_PERMANENT=False,
+        SESSION_MONGODB_DB='ficore_test',
+        SESSION_MONGODB_COLLECTION='sessions',
+        MONGO_URI='mongodb://localhost:27017/ficore_api_test'
+    )
+    session_store.init_app(flask_app, client)
+    sessions = AsyncCollection(client.ficore_test.sessions)
+    monkeypatch.setattr(api.common, 'get_async_client', lambda uri: {'ficore_test': {'sessions': sessions}})
+
+    @flask_app.route('/login')
+    def login():
+        session['_user_id'] = 'ada'
+        return 'ok'
+
+    browser = flask_app.test_client()
+    browser.get('/login')
+    interface = flask_app.session_interface
+    names = (flask_app.config['SESSION_COOKIE_NAME'], interface.version_cookie_name(flask_app))
+    cookies = {name: browser.get_cookie(name).value for name in names}
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(flask_app=flask_app)), cookies=cookies)
+    store_id = interface.store_id_for(flask_app, cookies[flask_app.config['SESSION_COOKIE_NAME']])
+    assert interface.cached_session(store_id, cookies[interface.version_cookie_name(flask_app)]) is not None
+    assert asyncio.run(api.common.load_session(request))['_user_id'] == 'ada'
+    # Revoked (an admin deleted it, or a logout in another process)
+    client.ficore_test.sessions.delete_many({})
+    assert asyncio.run(api.common.load_session(request)) == {}
+    assert interface.cached_session(store_id, cookies[interface.version_cookie_name(flask_app)]) is None
@@ -0,0 +1,43 @@
+import gzip
+import json
+import pytest
+from flask import Flask
+import assets
+
+@pytest.fixture
+def static_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, 'BUNDLES', {'app.css': ['css/a.css', 'css/b.css'], 'app.js': ['js/missing.js']})
+    monkeypatch.setattr(assets, 'FILES', [])
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'a.css').write_text('/* header */\nbody {\n    color: red;\n}\n' * 40)
+    (tmp_path / 'css' / 'b.css').write_text('a :hover { margin: 0 }')
+    (tmp_path / 'sw.js').write_text('self.addEventListener("install", () => {});')
+    return tmp_path
+
+def test_build_fingerprints_minifies_and_precompresses(static_folder):
+    manifest = assets.build(str(static_folder))
+    # A bundle with a missing source is left out, not half built
+    assert list(manifest) == ['app.css']
+    built = static_folder / 'dist' / manifest['app.css']
+    css = built.read_text()
+    assert css.startswith('body{color:red}') and css.endswith('a :hover{margin:0}')
+    assert gzip.decompress((static_folder / 'dist' / (manifest['app.css'] + '.gz')).read_bytes()) == built.read_bytes()
+    assert json.loads((static_folder / 'dist' / 'manifest.json').read_text()) == manifest
+    # Same content, same name
+    assert assets.build(str(static_folder)) == manifest
+
+def test_dist_files_are_served_precompressed_and_immutable(static_folder):
+    manifest = assets.build(str(static_folder))
+    app = Flask(__name__, static_folder=str(static_folder), static_url_path='/static')
+    assets.init_app(app)
+    client = app.test_client()
+    url = f"/static/dist/{manifest['app.css']}"
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Content-Encoding' not in client.get(url).headers
+    with app.test_request_context():
+        assert assets.asset_url('app.css') == url
+        assert assets.asset_url('app.js') is None
+        assert f'const PRECACHE_URLS = ["{url}"];' in assets.service_worker_script()
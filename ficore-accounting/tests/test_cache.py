@@ -0,0 +1,93 @@
+import threading
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+from cache import SnapshotCache
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+        self.failing = False
+        self.complete = True
+        self.refreshed = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        if self.failing:
+            raise ServerSelectionTimeoutError('no primary')
+        self.refreshed.set()
+        return {'call': self.calls}, self.complete
+
+def test_failed_fetch_serves_the_last_snapshot_marked_stale():
+    cache = SnapshotCache('test', retry_after=60)
+    loader = Loader()
+    assert cache.get('ada', loader).data == {'call': 1}
+    loader.failing = True
+    result = cache.get('ada', loader)
+    assert result.stale and result.data == {'call': 1}
+
+def test_failure_without_a_snapshot_is_raised():
+    loader = Loader()
+    loader.failing = True
+    with pytest.raises(ServerSelectionTimeoutError):
+        SnapshotCache('test').get('ada', loader)
+
+def test_partial_results_fall_back_to_the_snapshot():
+    cache = SnapshotCache('test', retry_after=60)
+    loader = Loader()
+    cache.get('ada', loader)
+    loader.complete = False
+    assert cache.get('ada', loader).stale
+
+def test_degraded_cache_does_not_wait_on_the_database_again():
+    cache = SnapshotCache('test', retry_after=60, max_refreshers=0)
+    loader = Loader()
+    cache.get('ada', loader)
+    loader.failing = True
+    cache.get('ada', loader)
+    calls = loader.calls
+    assert cache.get('ada', loader).stale
+    assert loader.calls == calls
+
+def test_one_keys_outage_does_not_degrade_the_others():
+    cache = SnapshotCache('test', retry_after=60, max_refreshers=0)
+    ada, musa = Loader(), Loader()
+    cache.get('ada', ada)
+    cache.get('musa', musa)
+    ada.failing = True
+    assert cache.get('ada', ada).stale
+    assert not cache.get('musa', musa).stale
+    assert musa.calls == 2
+
+def test_partial_results_do_not_degrade_the_key():
+    cache = SnapshotCache('test', retry_after=60)
+    loader = Loader()
+    cache.get('ada', loader)
+    loader.complete = False
+    assert cache.get('ada', loader).stale
+    loader.complete = True
+    result = cache.get('ada', loader)
+    assert not result.stale and loader.calls == 3
+
+def test_background_refresh_replaces_the_snapshot_once_mongo_recovers():
+    cache = SnapshotCache('recovering', retry_after=0.01)
+    loader = Loader()
+    cache.get('ada', loader)
+    loader.refreshed.clear()
+    loader.failing = True
+    cache.get('ada', loader)
+    loader.failing = False
+    assert loader.refreshed.wait(2)
+    for thread in threading.enumerate():
+        if thread.name == 'recovering-refresh':
+            thread.join(2)
+    loader.failing = True
+    assert cache.get('ada', loader).data['call'] > 1
+
+def test_least_recently_used_snapshots_are_dropped():
+    cache = SnapshotCache('test', max_entries=2)
+    loader = Loader()
+    for key in ('ada', 'musa', 'chika'):
+        cache.get(key, loader)
+    loader.failing = True
+    with pytest.raises(ServerSelectionTimeoutError):
+        cache.get('ada', loader)
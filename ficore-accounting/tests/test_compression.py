@@ -0,0 +1,73 @@
+import gzip
+import pytest
+from flask import Flask, Response
+from jinja2 import DictLoader
+import compression
+import lite
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.config.update(COMPRESS_MIN_SIZE=500, COMPRESS_GZIP_LEVEL=6, COMPRESS_BROTLI_QUALITY=5, SESSION_COOKIE_SECURE=False)
+    app.jinja_loader = DictLoader({'list.html': 'full ' * 200, 'lite/list.html': 'lite'})
+    compression.init_app(app)
+    lite.init_app(app)
+
+    @app.route('/page', methods=['GET', 'POST'])
+    def page():
+        return lite.render_page('list.html')
+
+    @app.route('/tiny')
+    def tiny():
+        return 'ok'
+
+    @app.route('/export')
+    def export():
+        return Response('a,b\n' * 500, mimetype='text/csv')
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' * 500, mimetype='image/png')
+
+    return app.test_client()
+
+def test_negotiation_honours_quality_values(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    assert compression.negotiate('gzip, deflate, br') == 'gzip'
+    assert compression.negotiate('gzip;q=0, identity') is None
+    assert compression.negotiate('*') == 'gzip'
+    assert compression.negotiate(None) is None
+    monkeypatch.setattr(compression, 'brotli', object())
+    assert compression.negotiate('gzip, br') == 'br'
+    assert compression.negotiate('gzip, br;q=0.5') == 'gzip'
+
+def test_text_responses_are_compressed(client, monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    response = client.get('/export', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == b'a,b\n' * 500
+    assert int(response.headers['Content-Length']) == len(response.data)
+
+def test_html_echoing_request_input_is_not_compressed(client):
+    assert client.get('/page', headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Encoding' not in client.get('/page?q=csrf', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.post('/page', data={'q': 'csrf'}, headers={'Accept-Encoding': 'gzip'}).headers
+    # Exports carry no token
+    assert client.get('/export?q=csrf', headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
+
+def test_small_binary_and_unaccepted_responses_are_left_alone(client):
+    assert 'Content-Encoding' not in client.get('/tiny', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/image', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/export').headers
+
+def test_lite_pages_follow_save_data_and_the_remembered_choice(client):
+    assert client.get('/page').data.startswith(b'full')
+    response = client.get('/page', headers={'Save-Data': 'on'})
+    assert response.data == b'lite'
+    assert 'Save-Data' in response.headers['Vary']
+    # ?lite=0 overrides Save-Data from then on
+    assert client.get('/page?lite=0', headers={'Save-Data': 'on'}).data.startswith(b'full')
+    assert client.get('/page', headers={'Save-Data': 'on'}).data.startswith(b'full')
+    client.get('/page?lite=1')
+    assert client.get('/page').data == b'lite'
@@ -0,0 +1,66 @@
+import pytest
+from flask import Flask, flash
+from flask_login import LoginManager, UserMixin, login_user
+import dataversion
+import lite
+
+class User(UserMixin):
+    def __init__(self, user_id, role='trader', data_version=0):
+        self.id = user_id
+        self.role = role
+        self.data_version = data_version
+
+USERS = {}
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', SESSION_COOKIE_SECURE=False)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(USERS.get)
+    lite.init_app(app)
+    dataversion.init_app(app)
+    app.calls = 0
+
+    @app.route('/login/<user_id>')
+    def login(user_id):
+        login_user(USERS[user_id])
+        return 'ok'
+
+    @app.route('/list')
+    @dataversion.conditional_list
+    def listing():
+        app.calls += 1
+        return 'rows'
+
+    @app.route('/partial')
+    @dataversion.conditional_list
+    def partial():
+        flash('Showing the first 500 rows')
+        return 'some rows'
+
+    USERS.clear()
+    USERS.update(alice=User('alice'), admin=User('admin', role='admin'))
+    return app
+
+def test_matching_etag_skips_the_view(app):
+    client = app.test_client()
+    client.get('/login/alice')
+    first = client.get('/list')
+    etag = first.headers['ETag']
+    assert etag.startswith('W/') and first.headers['Cache-Control'] == 'private, no-cache'
+    again = client.get('/list', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and app.calls == 1
+    # Other filters, other ETag
+    assert client.get('/list?q=x').headers['ETag'] != etag
+    # A write moves the version
+    USERS['alice'].data_version += 1
+    assert client.get('/list', headers={'If-None-Match': etag}).status_code == 200
+    assert app.calls == 3
+
+def test_flashed_and_admin_pages_are_not_conditional(app):
+    client = app.test_client()
+    client.get('/login/alice')
+    assert 'ETag' not in client.get('/partial').headers
+    client.get('/login/admin')
+    assert 'ETag' not in client.get('/list').headers
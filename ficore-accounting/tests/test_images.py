@@ -0,0 +1,47 @@
+import io
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+pytest.importorskip('PIL')
+import mongomock.gridfs
+from gridfs import GridFSBucket
+from PIL import Image
+
+import database
+import images
+from storage import store_file
+
+@pytest.fixture
+def db(monkeypatch):
+    mongomock.gridfs.enable_gridfs_integration()
+    db = mongomock.MongoClient().ficore_test
+    monkeypatch.setattr(database, 'get_db', lambda mongo_uri=None: db)
+    return db
+
+def png(size):
+    output = io.BytesIO()
+    Image.new('RGBA', size, (200, 30, 30, 128)).save(output, format='PNG')
+    output.seek(0)
+    return output
+
+def test_variants_are_generated_and_linked_once(db):
+    file_id, _ = store_file(db, png((2000, 1000)), 'receipt.png', content_type='image/png')
+    # The same image uploaded by two users shares one blob and one set of variants
+    db.receipts.insert_many([{'user_id': 'ada', 'file_id': file_id}, {'user_id': 'bob', 'file_id': file_id}])
+    db.users.insert_many([{'_id': 'ada', 'data_version': 0}, {'_id': 'bob', 'data_version': 0}])
+    returned = images.generate_variants('mongodb://localhost/ficore_test', str(file_id))
+    variants = db.fs.files.find_one({'_id': file_id})['variants']
+    assert returned == {name: str(variant_id) for name, variant_id in variants.items()}
+    assert set(variants) == set(images.VARIANTS)
+    for name, (max_edge, _) in images.VARIANTS.items():
+        with Image.open(GridFSBucket(db).open_download_stream(variants[name])) as variant:
+            assert variant.format == 'JPEG' and max(variant.size) == max_edge
+    assert all(receipt['variants'] == variants for receipt in db.receipts.find())
+    assert [user['data_version'] for user in db.users.find()] == [1, 1]
+    files = db.fs.files.count_documents({})
+    # Run again (a retried job): the stored variants are reused
+    assert images.generate_variants('mongodb://localhost/ficore_test', str(file_id)) == returned
+    assert db.fs.files.count_documents({}) == files
+
+def test_variants_of_a_deleted_upload_are_skipped(db):
+    assert images.generate_variants('mongodb://localhost/ficore_test', '0' * 24) is None
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+
+mongomock = pytest.importorskip('mongomock')
+
+import metrics
+
+def make_app(token, monkeypatch):
+    monkeypatch.setattr(metrics, '_queue_depths', {'at': None, 'values': None})
+    app = Flask(__name__)
+    app.config['METRICS_TOKEN'] = token
+    metrics.init_app(app)
+    app.add_url_rule('/metrics', view_func=metrics.metrics_view)
+    db = mongomock.MongoClient().ficore_test
+    db.email_outbox.insert_one({'status': 'failed'})
+    app.counts = 0
+    count_documents = mongomock.collection.Collection.count_documents
+
+    def counted(self, *args, **kwargs):
+        app.counts += 1
+        return count_documents(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, 'count_documents', counted)
+    app.extensions['pymongo'] = SimpleNamespace(db=db)
+    return app
+
+def test_metrics_are_not_served_without_a_token(monkeypatch):
+    client = make_app(None, monkeypatch).test_client()
+    assert client.get('/metrics').status_code == 404
+
+def test_scrapes_share_the_queue_depths(monkeypatch):
+    app = make_app('s3cret', monkeypatch)
+    client = app.test_client()
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    for _ in range(3):
+        response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+        assert response.status_code == 200
+        assert b'ficore_job_queue_depth{queue="email_outbox_failed"} 1.0' in response.data
+    assert app.counts == 3
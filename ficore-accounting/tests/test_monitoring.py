@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+from flask import Flask
+
+import monitoring
+
+def run_find(listener, request_id, collection, reply_docs=1):
+    listener.started(SimpleNamespace(request_id=request_id, command_name='find', command={'find': collection}))
+    listener.succeeded(SimpleNamespace(
+        request_id=request_id,
+        command_name='find',
+        duration_micros=2000,
+        reply={'cursor': {'firstBatch': [{'n': i} for i in range(reply_docs)]}}
+    ))
+
+def make_app():
+    monitoring.reset()
+    app = Flask(__name__)
+    app.config['MONGO_STATS_HEADERS'] = True
+    monitoring.init_app(app)
+
+    @app.route('/n_plus_one')
+    def n_plus_one():
+        for i in range(4):
+            run_find(monitoring.command_listener, i, 'users')
+        run_find(monitoring.command_listener, 99, 'invoices', reply_docs=3)
+        return 'ok'
+
+    return app
+
+def test_commands_are_attributed_to_the_request():
+    response = make_app().test_client().get('/n_plus_one')
+    assert response.headers['X-Mongo-Commands'] == '5'
+    assert response.headers['X-Mongo-Time-Ms'] == '10.00'
+    assert int(response.headers['X-Mongo-Bytes']) > 0
+    assert response.headers['X-Mongo-Most-Repeated'] == 'find users; count=4'
+
+def test_histograms_aggregate_per_endpoint():
+    client = make_app().test_client()
+    client.get('/n_plus_one')
+    client.get('/n_plus_one')
+    stats = monitoring.snapshot()['n_plus_one']
+    assert stats['commands']['count'] == 2
+    assert stats['commands']['p50'] == 5
+    assert stats['max_repeats'] == {'find users': 4}
+
+def test_commands_outside_requests_are_ignored():
+    make_app()
+    run_find(monitoring.command_listener, 1, 'users')
+    assert monitoring.current_stats() is None
+    assert monitoring.snapshot() == {}
+
+def test_reply_bytes_are_not_counted_by_default():
+    monitoring.reset()
+    app = Flask(__name__)
+    monitoring.init_app(app)
+    assert monitoring.command_listener.count_bytes is False
+
+    @app.route('/find')
+    def find():
+        run_find(monitoring.command_listener, 1, 'users')
+        return 'ok'
+
+    app.test_client().get('/find')
+    assert monitoring.snapshot()['find']['reply_bytes']['count'] == 0
@@ -0,0 +1,86 @@
+import socket
+from datetime import datetime
+import pytest
+from flask import Flask
+from flask_mail import Mail
+
+mongomock = pytest.importorskip('mongomock')
+controller_module = pytest.importorskip('aiosmtpd.controller')
+
+import outbox
+from outbox import enqueue_email, deliver_pending, claim_batch
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        if not any(seen is session for seen in self.sessions):
+            self.sessions.append(session)
+        return '250 Message accepted for delivery'
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def make_mail(port):
+    app = Flask(__name__)
+    app.config.update(
+        MAIL_SERVER='127.0.0.1',
+        MAIL_PORT=port,
+        MAIL_USE_TLS=False,
+        MAIL_DEFAULT_SENDER='support@ficoreapp.com'
+    )
+    return app, Mail(app)
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().ficore_test
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+def test_batch_is_sent_over_one_connection(db, smtp_server):
+    controller, handler = smtp_server
+    for i in range(3):
+        enqueue_email(db, f'Subject {i}', [f'user{i}@example.com'], 'Body')
+    app, mail = make_mail(controller.port)
+    with app.app_context():
+        assert deliver_pending(db, mail) == 3
+    assert len(handler.messages) == 3
+    assert len(handler.sessions) == 1
+    assert db.email_outbox.count_documents({'status': 'sent'}) == 3
+    assert db.email_outbox.count_documents({'body': {'$exists': True}}) == 0
+
+def test_smtp_outage_schedules_retry_with_backoff(db):
+    enqueue_email(db, 'OTP', ['user@example.com'], 'Your OTP is 123456')
+    app, mail = make_mail(free_port())  # nothing is listening here
+    with app.app_context():
+        assert deliver_pending(db, mail) == 0
+    message = db.email_outbox.find_one()
+    assert message['status'] == 'pending'
+    assert message['attempts'] == 1
+    assert message['next_attempt_at'] > datetime.utcnow()
+    assert claim_batch(db, 'other-worker') == []
+
+def test_permanent_failure_drops_the_body(db, monkeypatch):
+    monkeypatch.setattr(outbox, 'MAX_ATTEMPTS', 1)
+    enqueue_email(db, 'Reset', ['user@example.com'], 'https://example.com/reset/secret')
+    app, mail = make_mail(free_port())
+    with app.app_context():
+        deliver_pending(db, mail)
+    message = db.email_outbox.find_one()
+    assert message['status'] == 'failed' and 'failed_at' in message
+    assert 'body' not in message
+
+def test_enqueue_does_not_touch_smtp(db):
+    enqueue_email(db, 'Reset', ['user@example.com'], 'Link')
+    assert db.email_outbox.count_documents({'status': 'pending'}) == 1
@@ -0,0 +1,56 @@
+from pymongo.errors import ExecutionTimeout
+from queries import bounded_find, bounded_count
+from metrics import QUERY_TIMEOUTS
+
+class SlowCursor:
+    """Returns its first batch, then hits maxTimeMS like a server-side timeout."""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.max_time = None
+
+    def max_time_ms(self, max_time_ms):
+        self.max_time = max_time_ms
+        return self
+
+    def sort(self, sort):
+        return self
+
+    def limit(self, limit):
+        return self
+
+    def __iter__(self):
+        yield from self.documents
+        raise ExecutionTimeout('operation exceeded time limit', 50)
+
+class SlowCollection:
+    name = 'transactions'
+
+    def __init__(self, documents):
+        self.cursor = SlowCursor(documents)
+
+    def find(self, query, projection=None, session=None):
+        return self.cursor
+
+    def count_documents(self, query, maxTimeMS=None, session=None):
+        raise ExecutionTimeout('operation exceeded time limit', 50)
+
+    def estimated_document_count(self):
+        return 1000
+
+def timeouts():
+    return QUERY_TIMEOUTS.labels('unmatched', 'transactions')._value.get()
+
+def test_timed_out_find_keeps_the_documents_that_arrived():
+    collection = SlowCollection([{'_id': 1}, {'_id': 2}])
+    before = timeouts()
+    documents, complete = bounded_find(collection, {}, sort=[('created_at', -1)], limit=50, max_time_ms=250)
+    assert documents == [{'_id': 1}, {'_id': 2}]
+    assert not complete
+    assert collection.cursor.max_time == 250
+    assert timeouts() == before + 1
+
+def test_timed_out_count_falls_back_to_the_estimate_only_when_unfiltered():
+    collection = SlowCollection([])
+    assert bounded_count(collection, {}) == (1000, False)
+    assert bounded_count(collection, {'role': 'trader'}) == (None, False)
@@ -0,0 +1,34 @@
+import multiprocessing
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+import ratelimit_storage
+
+def hit_from_worker(uri, hits, results):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri))
+    results.put(sum(limiter.hit(parse('50/minute'), 'login', '127.0.0.1') for _ in range(hits)))
+
+def test_uri_selects_the_sqlite_storage(tmp_path):
+    storage = storage_from_string(f'sqlite://{tmp_path}/limits.sqlite')
+    assert isinstance(storage, ratelimit_storage.SQLiteStorage)
+    assert storage.check()
+
+def test_fixed_window_counts_and_clears(tmp_path):
+    storage = storage_from_string(f'sqlite://{tmp_path}/limits.sqlite')
+    limiter = FixedWindowRateLimiter(storage)
+    limit = parse('3/minute')
+    assert [limiter.hit(limit, 'ada') for _ in range(4)] == [True, True, True, False]
+    assert limiter.get_window_stats(limit, 'ada').remaining == 0
+    limiter.clear(limit, 'ada')
+    assert limiter.hit(limit, 'ada')
+
+def test_limit_holds_across_worker_processes(tmp_path):
+    uri = f'sqlite://{tmp_path}/limits.sqlite'
+    storage_from_string(uri)
+    results = multiprocessing.get_context('spawn').Queue()
+    workers = [multiprocessing.get_context('spawn').Process(target=hit_from_worker, args=(uri, 30, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert sum(results.get(timeout=5) for _ in workers) == 50
@@ -0,0 +1,69 @@
+"""Read routing tests.
+
+The replica set test needs a local three-node set at MONGO_REPLSET_URI and
+is skipped without one, for example:
+
+    for port in 27017 27018 27019; do
+        mkdir -p /tmp/rs0-$port
+        mongod --replSet rs0 --port $port --dbpath /tmp/rs0-$port --fork --logpath /tmp/rs0-$port.log
+    done
+    mongosh --port 27017 --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}, {_id: 2, host: "localhost:27019"}]})'
+    MONGO_REPLSET_URI='mongodb://localhost:27017,localhost:27018,localhost:27019/ficore_rs_test?replicaSet=rs0' pytest tests/test_readrouting.py
+"""
+import os
+import pytest
+from bson import Timestamp
+from pymongo import MongoClient, monitoring
+from readrouting import encode_marker, decode_marker, is_newer, causal_session, write_time_listener
+
+def test_marker_round_trips_through_the_session():
+    cluster_time = {'clusterTime': Timestamp(1700000000, 7), 'signature': {'hash': b'\x00' * 20, 'keyId': 0}}
+    marker = encode_marker(Timestamp(1700000000, 5), cluster_time)
+    assert decode_marker(marker) == (Timestamp(1700000000, 5), cluster_time)
+
+def test_only_a_later_write_replaces_the_marker():
+    earlier = encode_marker(Timestamp(1700000000, 5), None)
+    later = encode_marker(Timestamp(1700000000, 6), None)
+    assert is_newer(earlier, None)
+    assert is_newer(later, earlier)
+    assert not is_newer(earlier, later)
+
+class ReadServers(monitoring.CommandListener):
+    def __init__(self):
+        self.finds = []
+
+    def started(self, event):
+        if event.command_name == 'find':
+            self.finds.append(event.connection_id)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def test_secondary_read_sees_the_users_last_write():
+    uri = os.getenv('MONGO_REPLSET_URI')
+    if not uri:
+        pytest.skip('MONGO_REPLSET_URI not set')
+    os.environ['REPORTING_READ_PREFERENCE'] = 'secondary'
+    from database import reporting_read_preference
+    servers = ReadServers()
+    client = MongoClient(uri, event_listeners=[write_time_listener, servers])
+    try:
+        client.admin.command('ping')
+        db = client.get_default_database()
+        write_time_listener.start()
+        inserted = db.transactions.insert_one({'user_id': 'readrouting', 'amount': 10}).inserted_id
+        marker = write_time_listener.stop()
+        assert marker is not None
+
+        reporting = client.get_database(db.name, read_preference=reporting_read_preference())
+        with causal_session(client, marker) as session:
+            assert reporting.transactions.find_one({'_id': inserted}, session=session) is not None
+        assert servers.finds[-1] in client.secondaries
+    finally:
+        os.environ.pop('REPORTING_READ_PREFERENCE', None)
+        client.drop_database(client.get_default_database().name)
+        client.close()
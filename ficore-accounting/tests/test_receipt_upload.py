@@ -0,0 +1,55 @@
+import hashlib
+import io
+import pytest
+from pymongo.errors import PyMongoError
+
+from query_budget import TEST_USERNAME
+from storage import store_file
+
+RECEIPT = b'%PDF-1.7\n' + b'0' * 1000
+
+def upload(client, data=RECEIPT, filename='receipt.pdf'):
+    return client.post('/coins/receipt_upload', data={'receipt': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+@pytest.fixture
+def db(budget_app):
+    db = budget_app.extensions['pymongo'].db
+    db.receipts.delete_many({'user_id': TEST_USERNAME})
+    db.file_blobs.delete_many({'_id': hashlib.sha256(RECEIPT).hexdigest()})
+    db.users.update_one({'_id': TEST_USERNAME}, {'$set': {'coin_balance': 1000}})
+    # Someone else's file, so GridFS finds its indexes in place
+    store_file(db, io.BytesIO(b'%PDF-1.7 other'), 'other.pdf')
+    return db
+
+def test_upload_charges_a_coin_and_stores_the_receipt(db, budget_client, login):
+    login(budget_client)
+    response = upload(budget_client)
+    assert response.status_code == 302
+    receipt = db.receipts.find_one({'user_id': TEST_USERNAME})
+    assert receipt['content_type'] == 'application/pdf'
+    assert db.file_blobs.find_one({'file_id': receipt['file_id']})['refcount'] == 1
+    assert db.users.find_one({'_id': TEST_USERNAME})['coin_balance'] == 999
+
+def test_disguised_upload_is_rejected(db, budget_client, login):
+    login(budget_client)
+    response = upload(budget_client, b'<html><script>alert(1)</script></html>', 'receipt.png')
+    assert response.status_code == 400
+    assert db.receipts.count_documents({'user_id': TEST_USERNAME}) == 0
+
+# The budget is for uploads that succeed; this one also undoes its writes
+@pytest.mark.query_budget(25)
+def test_failed_charge_releases_the_upload(db, budget_client, login, monkeypatch):
+    login(budget_client)
+
+    def failing(*args, **kwargs):
+        raise PyMongoError('primary stepped down')
+
+    files = db.fs.files.count_documents({})
+    monkeypatch.setattr(db.users, 'update_one', failing)
+    response = upload(budget_client)
+    assert response.status_code == 500
+    assert db.receipts.count_documents({'user_id': TEST_USERNAME}) == 0
+    assert db.file_blobs.count_documents({'_id': hashlib.sha256(RECEIPT).hexdigest()}) == 0
+    assert db.fs.files.count_documents({}) == files
+    assert db.fs.chunks.count_documents({'files_id': {'$nin': db.fs.files.distinct('_id')}}) == 0
@@ -0,0 +1,35 @@
+from datetime import datetime
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+from recurring import backfill_schedules, ensure_indexes, materialize_due_transactions, schedule_fields
+
+def test_backfill_schedules_legacy_templates_once():
+    db = mongomock.MongoClient().ficore_test
+    created = datetime(2026, 1, 15)
+    db.transactions.insert_many([
+        {'user_id': 'alice', 'type': 'payment', 'amount': 10.0, 'is_recurring': True,
+         'recurring_period': 'monthly', 'created_at': created},
+        {'user_id': 'alice', 'type': 'payment', 'amount': 5.0, 'is_recurring': False,
+         'recurring_period': 'none', 'created_at': created}
+    ])
+    assert backfill_schedules(db) == 1
+    template = db.transactions.find_one({'is_recurring': True})
+    assert template['next_run_at'] == datetime(2026, 2, 15)
+    assert backfill_schedules(db) == 0
+    assert materialize_due_transactions(db, now=datetime(2026, 4, 1)) == 2
+
+def test_changing_a_schedule_does_not_lose_occurrences():
+    db = mongomock.MongoClient().ficore_test
+    ensure_indexes(db)
+    template = {'user_id': 'alice', 'type': 'payment', 'amount': 10.0, 'is_recurring': True,
+                'recurring_period': 'monthly', 'created_at': datetime(2026, 1, 1)}
+    template.update(schedule_fields(True, 'monthly', datetime(2026, 1, 1))[0])
+    template_id = db.transactions.insert_one(template).inserted_id
+    assert materialize_due_transactions(db, now=datetime(2026, 3, 2)) == 2
+    # Switched to weekly, as update_transaction does: the count restarts at 0
+    schedule_set, _ = schedule_fields(True, 'weekly', datetime(2026, 3, 2))
+    db.transactions.update_one({'_id': template_id}, {'$set': dict(schedule_set, recurring_period='weekly')})
+    assert materialize_due_transactions(db, now=datetime(2026, 3, 24)) == 3
+    assert db.transactions.count_documents({'recurring_parent_id': template_id}) == 5
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask, session, flash, get_flashed_messages
+
+mongomock = pytest.importorskip('mongomock')
+
+@pytest.fixture
+def app():
+    import session_store
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY='session-store-tests',
+        SESSION_BACKEND='mongodb',
+        SESSION_CACHE_TTL=60,
+        SESSION_REFRESH_EACH_REQUEST=False,
+        SESSION_PERMANENT=False,
+        SESSION_MONGODB_DB='ficore_test',
+        SESSION_MONGODB_COLLECTION='sessions',
+        PERMANENT_SESSION_LIFETIME=timedelta(minutes=30)
+    )
+    client = mongomock.MongoClient()
+    session_store.init_app(app, client)
+    app.new_interface = lambda: session_store.CachedMongoDBSessionInterface(
+        app, client, cache_ttl=60, permanent=False, db='ficore_test', collection='sessions'
+    )
+    app.sessions = client.ficore_test.sessions
+
+    @app.route('/set/<value>')
+    def set_value(value):
+        session['value'] = value
+        return 'ok'
+
+    @app.route('/login')
+    def login():
+        session['_user_id'] = 'ada'
+        return 'ok'
+
+    @app.route('/user')
+    def user():
+        return session.get('_user_id', '')
+
+    @app.route('/get')
+    def get_value():
+        return session.get('value', '')
+
+    @app.route('/flash')
+    def flash_and_show():
+        flash('saved')
+        get_flashed_messages()
+        return 'ok'
+
+    return app
+
+def writes(app):
+    return [doc['v'] for doc in app.sessions.find()]
+
+def test_ttl_index_waits_for_the_first_write(app):
+    assert 'expiration_1' not in app.sessions.index_information()
+    app.test_client().get('/set/a')
+    assert app.sessions.index_information()['expiration_1']['expireAfterSeconds'] == 0
+
+def test_unchanged_sessions_are_not_written_back(app):
+    client = app.test_client()
+    client.get('/set/ada')
+    written = writes(app)
+    client.get('/get')
+    client.get('/flash')
+    client.get('/set/ada')
+    assert writes(app) == written
+
+def test_a_write_from_another_process_is_not_hidden_by_the_cache(app):
+    client = app.test_client()
+    first = app.session_interface
+    client.get('/set/ada')
+    assert client.get('/get').data == b'ada'
+    app.session_interface = app.new_interface()
+    client.get('/set/musa')
+    app.session_interface = first
+    assert client.get('/get').data == b'musa'
+
+def test_sessions_near_expiry_are_extended(app):
+    client = app.test_client()
+    client.get('/set/ada')
+    app.sessions.update_many({}, {'$set': {'expiration': datetime.utcnow() + timedelta(minutes=10)}})
+    app.session_interface = app.new_interface()
+    before = writes(app)
+    client.get('/get')
+    assert writes(app) != before
+
+def test_a_deleted_login_session_is_not_served_from_the_cache(app):
+    client = app.test_client()
+    client.get('/login')
+    assert client.get('/user').data == b'ada'
+    # Logged out (or revoked by an admin) through another process
+    app.sessions.delete_many({})
+    assert client.get('/user').data == b''
+
+def test_expired_cache_entries_are_not_served(app):
+    client = app.test_client()
+    client.get('/set/ada')
+    interface = app.session_interface
+    for store_id, entry in list(interface._cache.items()):
+        interface._cache[store_id] = (entry[0], entry[1], datetime.utcnow() - timedelta(seconds=1), entry[3])
+    app.sessions.delete_many({})
+    assert client.get('/get').data == b''
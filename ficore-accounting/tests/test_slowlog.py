@@ -0,0 +1,81 @@
+import pytest
+import slowlog
+from slowlog import normalize, query_shape, _scrub_plan
+
+class RecordingCollection:
+    def __init__(self, db):
+        self.db = db
+
+    def options(self):
+        return {'capped': True} if self.db.capped else {}
+
+    def create_index(self, keys):
+        self.db.calls.append(('create_index', keys))
+
+class RecordingDb:
+    """Just the calls ensure_collections makes; mongomock has no capped collections."""
+
+    def __init__(self, names, capped):
+        self.names = names
+        self.capped = capped
+        self.calls = []
+
+    def list_collection_names(self):
+        return self.names
+
+    def create_collection(self, name, **options):
+        self.calls.append(('create_collection', name, options))
+        self.capped = options.get('capped', False)
+
+    def command(self, name, *args, **kwargs):
+        self.calls.append((name,) + args)
+        self.capped = True
+
+    def __getitem__(self, name):
+        return RecordingCollection(self)
+
+def test_regex_filters_with_different_input_share_a_shape():
+    first = {'find': 'transactions', 'filter': {'user_id': 'ada', 'party_name': {'$regex': 'bello', '$options': 'i'}}, 'sort': {'created_at': -1}}
+    second = {'find': 'transactions', 'filter': {'user_id': 'musa', 'party_name': {'$regex': 'chika', '$options': 'i'}}, 'sort': {'created_at': -1}}
+    shape, shape_id = query_shape('find', first)
+    assert shape['filter'] == {'user_id': '?', 'party_name': {'$regex': '?', '$options': '?'}}
+    assert shape['sort'] == {'created_at': -1}
+    assert query_shape('find', second)[1] == shape_id
+
+def test_in_lists_collapse_but_or_branches_are_kept():
+    assert normalize({'status': {'$in': ['unpaid', 'paid']}}) == {'status': {'$in': ['?']}}
+    assert normalize({'$or': [{'a': 1}, {'b': 2}]}) == {'$or': [{'a': '?'}, {'b': '?'}]}
+
+def test_plans_are_stored_without_user_values():
+    plan = {'stage': 'FETCH', 'filter': {'party_name': {'$regex': 'bello'}}, 'inputStage': {'stage': 'IXSCAN', 'indexBounds': {'user_id': ['["ada", "ada"]']}}}
+    assert _scrub_plan(plan) == {'stage': 'FETCH', 'filter': {'party_name': {'$regex': '?'}}, 'inputStage': {'stage': 'IXSCAN', 'indexBounds': {'user_id': ['?']}}}
+
+def test_slow_query_log_is_created_capped_or_converted():
+    fresh = RecordingDb([], capped=False)
+    slowlog.ensure_collections(fresh, size_bytes=1024)
+    assert fresh.calls[0] == ('create_collection', 'slow_queries', {'capped': True, 'size': 1024})
+    # A plain collection an insert created before the log was set up
+    plain = RecordingDb(['slow_queries'], capped=False)
+    slowlog.ensure_collections(plain, size_bytes=1024)
+    assert ('convertToCapped', 'slow_queries') in plain.calls and plain.capped
+
+class ExplainDb:
+    def __init__(self, explain):
+        self.explain = explain
+
+    def command(self, *args, **kwargs):
+        return self.explain
+
+def test_sbe_plans_keep_only_the_scrubbed_query_plan():
+    mongomock = pytest.importorskip('mongomock')
+    db = mongomock.MongoClient().ficore_test
+    explain = {'queryPlanner': {'winningPlan': {
+        'queryPlan': {'stage': 'FETCH', 'filter': {'party_name': {'$eq': 'bello'}},
+                      'inputStage': {'stage': 'IXSCAN', 'indexName': 'user_id_1', 'indexBounds': {'user_id': ['["ada", "ada"]']}}},
+        'slotBasedPlan': {'slots': '$$RESULT=s11', 'stages': '[2] filter {(s5 == "bello")} [1] ixseek KS(3C6164610001) ...'}
+    }}}
+    slowlog.capture_plan(db, 'sbe-shape', {'command': 'find'}, {'find': 'transactions', 'filter': {'user_id': 'ada'}}, explain_db=ExplainDb(explain))
+    stored = db[slowlog.PLAN_COLLECTION].find_one({'_id': 'sbe-shape'})
+    assert stored['stages'] == ['FETCH', 'IXSCAN(user_id_1)']
+    assert 'bello' not in str(stored) and 'ada' not in str(stored.get('winning_plan'))
+    assert 'slotBasedPlan' not in str(stored)
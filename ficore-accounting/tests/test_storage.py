@@ -0,0 +1,101 @@
+import io
+import pytest
+from flask import Flask
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+mongomock = pytest.importorskip('mongomock')
+import mongomock.gridfs
+
+from storage import CHUNK_SIZE, FileTooLargeError, file_response, release_files, sniff_content_type, store_file
+
+def test_release_files_drops_unused_blobs_and_their_variants():
+    db = mongomock.MongoClient().ficore_test
+    db.file_blobs.insert_many([
+        {'_id': 'shared', 'file_id': 1, 'refcount': 3},
+        {'_id': 'single', 'file_id': 2, 'refcount': 1},
+        {'_id': 'thumb', 'file_id': 3, 'refcount': 1}
+    ])
+    db.fs.files.insert_many([{'_id': 1}, {'_id': 2, 'variants': {'thumb': 3}}, {'_id': 3}])
+    db.fs.chunks.insert_many([{'files_id': 1, 'n': 0}, {'files_id': 2, 'n': 0}, {'files_id': 3, 'n': 0}])
+    # Two of the three references to the shared blob, the only one to the other
+    assert release_files(db, [1, 2, 1]) == 2
+    assert db.file_blobs.find_one({'_id': 'shared'})['refcount'] == 1
+    assert sorted(doc['_id'] for doc in db.fs.files.find()) == [1]
+    assert [doc['files_id'] for doc in db.fs.chunks.find()] == [1]
+    assert db.file_blobs.count_documents({}) == 1
+    assert release_files(db, []) == 0
+
+@pytest.fixture
+def db():
+    mongomock.gridfs.enable_gridfs_integration()
+    return mongomock.MongoClient().ficore_test
+
+def test_identical_uploads_share_one_blob(db):
+    first, sha256 = store_file(db, io.BytesIO(b'receipt' * 1000), 'a.png', content_type='image/png')
+    second, same = store_file(db, io.BytesIO(b'receipt' * 1000), 'b.png', content_type='image/png')
+    other, _ = store_file(db, io.BytesIO(b'another'), 'c.png', content_type='image/png')
+    assert first == second and sha256 == same and other != first
+    assert db.file_blobs.find_one({'_id': sha256})['refcount'] == 2
+    assert db.fs.files.count_documents({}) == 2
+    assert db.fs.chunks.count_documents({'files_id': {'$nin': [first, other]}}) == 0
+
+def test_concurrent_identical_upload_retries_the_upsert(db, monkeypatch):
+    store_file(db, io.BytesIO(b'receipt'), 'a.png')
+    calls = []
+    find_one_and_update = db.file_blobs.find_one_and_update
+
+    def racing(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise DuplicateKeyError('E11000 duplicate key error')
+        return find_one_and_update(*args, **kwargs)
+
+    monkeypatch.setattr(db.file_blobs, 'find_one_and_update', racing)
+    file_id, sha256 = store_file(db, io.BytesIO(b'receipt'), 'b.png')
+    assert len(calls) == 2
+    assert db.file_blobs.find_one({'_id': sha256})['refcount'] == 2
+    assert [doc['_id'] for doc in db.fs.files.find()] == [file_id]
+
+def test_failed_upsert_does_not_orphan_the_upload(db, monkeypatch):
+    def failing(*args, **kwargs):
+        raise PyMongoError('primary stepped down')
+
+    monkeypatch.setattr(db.file_blobs, 'find_one_and_update', failing)
+    with pytest.raises(PyMongoError):
+        store_file(db, io.BytesIO(b'receipt'), 'a.png')
+    assert db.fs.files.count_documents({}) == 0 and db.fs.chunks.count_documents({}) == 0
+
+def test_upload_over_max_bytes_is_discarded(db):
+    with pytest.raises(FileTooLargeError):
+        store_file(db, io.BytesIO(b'x' * (CHUNK_SIZE + 1)), 'big.pdf', max_bytes=CHUNK_SIZE)
+    assert db.fs.files.count_documents({}) == 0 and db.file_blobs.count_documents({}) == 0
+
+def test_file_response_ranges_and_revalidation(db):
+    file_id, sha256 = store_file(db, io.BytesIO(b'0123456789'), 'r.png', content_type='image/png')
+    app = Flask(__name__)
+    with app.test_request_context(headers={'Range': 'bytes=2-5'}):
+        response = file_response(db, file_id)
+        assert response.status_code == 206
+        assert b''.join(response.response) == b'2345'
+        assert response.headers['Content-Range'] == 'bytes 2-5/10'
+        assert response.get_etag() == (sha256, False)
+    with app.test_request_context(headers={'If-None-Match': f'"{sha256}"'}):
+        assert file_response(db, file_id, etag=sha256).status_code == 304
+        # Without a known ETag the stored hash is compared after the lookup
+        assert file_response(db, file_id).status_code == 304
+
+def test_unchecked_types_are_never_served_inline(db):
+    page = io.BytesIO(b'<html><script>alert(1)</script></html>')
+    assert sniff_content_type(page) is None and page.tell() == 0
+    assert sniff_content_type(io.BytesIO(b'%PDF-1.7\n')) == 'application/pdf'
+    # Stored with the type the browser claimed, as older uploads were
+    file_id, _ = store_file(db, page, 'receipt.png', content_type='text/html')
+    pdf_id, _ = store_file(db, io.BytesIO(b'%PDF-1.7\n'), 'receipt.pdf', content_type='application/pdf')
+    with Flask(__name__).test_request_context():
+        response = file_response(db, file_id)
+        assert response.mimetype == 'application/octet-stream'
+        assert response.headers['Content-Disposition'].startswith('attachment')
+        assert response.headers['X-Content-Type-Options'] == 'nosniff'
+        response = file_response(db, pdf_id)
+        assert response.mimetype == 'application/pdf'
+        assert response.headers['Content-Disposition'].startswith('inline')
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, render_template, redirect, url_for, flash, current_app, send_file
 from flask_wtf import FlaskForm
-from wtforms import StringField, FloatField, SelectField, validators, BooleanField, SubmitField
+from wtforms import StringField, FloatField, SelectField, DateField, validators, BooleanField, SubmitField
 from flask_login import login_required, current_user
 from datetime import datetime, date, timedelta
 from utils import trans_function
@@ -9,6 +9,11 @@ import csv
 from io import StringIO
 from bson import ObjectId
 from app import limiter
+from recurring import schedule_fields
+from readrouting import reporting_reads
+from queries import bounded_find, partial_results_notice
+from lite import render_page
+from dataversion import BUMP, bump, conditional_list
 
 logger = logging.getLogger(__name__)
 
@@ -66,10 +71,6 @@ def check_coins_required(action, required_coins=1):
 def deduct_coins(action, coins=1):
     """Deduct coins and log transaction."""
     mongo = current_app.extensions['pymongo']
-    mongo.db.users.update_one(
-        {'_id': current_user.id},
-        {'$inc': {'coin_balance': -coins}}
-    )
     mongo.db.coin_transactions.insert_one({
         'user_id': str(current_user.id),
         'amount': -coins,
@@ -77,9 +78,15 @@ def deduct_coins(action, coins=1):
         'ref': f"{action}_{datetime.utcnow().isoformat()}",
         'date': datetime.utcnow()
     })
+    # Last: the data version also covers the write this paid for (dataversion.py)
+    mongo.db.users.update_one(
+        {'_id': current_user.id},
+        {'$inc': {'coin_balance': -coins, **BUMP}}
+    )
 
 @transactions_bp.route('/receipts', methods=['GET'])
 @login_required
+@conditional_list
 def receipts_history():
     form = FilterForm(request.args)
     date_filter = request.args.get('date', '')
@@ -101,14 +108,16 @@ def receipts_history():
             query['category'] = category_filter
         if party_name_filter:
             query['party_name'] = {'$regex': party_name_filter, '$options': 'i'}
-        transactions = list(mongo.db.transactions.find(query).sort('created_at', -1).limit(50))
+        transactions, complete = bounded_find(mongo.db.transactions, query, sort=[('created_at', -1)], limit=50)
+        if not complete:
+            partial_results_notice()
         total = sum(t['amount'] for t in transactions)
         category_totals = {}
         for t in transactions:
             t['_id'] = str(t['_id'])
             category = t['category']
             category_totals[category] = category_totals.get(category, 0) + t['amount']
-        return render_template('transactions/receipts.html',
+        return render_page('transactions/receipts.html',
                              transactions=transactions,
                              total=total,
                              category_totals=category_totals,
@@ -118,10 +127,11 @@ def receipts_history():
     except pymongo.errors.PyMongoError as e:
         logger.error(f"MongoDB error fetching receipts: {str(e)}")
         flash(trans_function('core_something_went_wrong', default='An error occurred'), 'danger')
-        return render_template('transactions/receipts.html', transactions=[], total=0, category_totals={}, form=form, type='receipt'), 500
+        return render_page('transactions/receipts.html', transactions=[], total=0, category_totals={}, form=form, type='receipt'), 500
 
 @transactions_bp.route('/payments', methods=['GET'])
 @login_required
+@conditional_list
 def payments_history():
     form = FilterForm(request.args)
     date_filter = request.args.get('date', '')
@@ -143,14 +153,16 @@ def payments_history():
             query['category'] = category_filter
         if party_name_filter:
             query['party_name'] = {'$regex': party_name_filter, '$options': 'i'}
-        transactions = list(mongo.db.transactions.find(query).sort('created_at', -1).limit(50))
+        transactions, complete = bounded_find(mongo.db.transactions, query, sort=[('created_at', -1)], limit=50)
+        if not complete:
+            partial_results_notice()
         total = sum(t['amount'] for t in transactions)
         category_totals = {}
         for t in transactions:
             t['_id'] = str(t['_id'])
             category = t['category']
             category_totals[category] = category_totals.get(category, 0) + t['amount']
-        return render_template('transactions/payments.html',
+        return render_page('transactions/payments.html',
                              transactions=transactions,
                              total=total,
                              category_totals=category_totals,
@@ -160,7 +172,7 @@ def payments_history():
     except pymongo.errors.PyMongoError as e:
         logger.error(f"MongoDB error fetching payments: {str(e)}")
         flash(trans_function('core_something_went_wrong', default='An error occurred'), 'danger')
-        return render_template('transactions/payments.html', transactions=[], total=0, category_totals={}, form=form, type='payment'), 500
+        return render_page('transactions/payments.html', transactions=[], total=0, category_totals={}, form=form, type='payment'), 500
 
 @transactions_bp.route('/add/<type>', methods=['GET', 'POST'])
 @login_required
@@ -175,6 +187,7 @@ def add_transaction(type):
     if form.validate_on_submit():
         try:
             mongo = current_app.extensions['pymongo']
+            now = datetime.utcnow()
             transaction = {
                 'user_id': str(current_user.id),
                 'type': type,
@@ -185,9 +198,10 @@ def add_transaction(type):
                 'photo_url': None,  # Placeholder for future receipt upload
                 'is_recurring': form.is_recurring.data,
                 'recurring_period': form.recurring_period.data if form.is_recurring.data else 'none',
-                'created_at': datetime.utcnow(),
-                'updated_at': datetime.utcnow()
+                'created_at': now,
+                'updated_at': now
             }
+            transaction.update(schedule_fields(transaction['is_recurring'], transaction['recurring_period'], now)[0])
             result = mongo.db.transactions.insert_one(transaction)
             deduct_coins(f"add_{type}")
             flash(trans_function('transaction_added', default='Transaction added successfully'), 'success')
@@ -223,19 +237,28 @@ def update_transaction(type, transaction_id):
             'recurring_period': transaction.get('recurring_period', 'none')
         })
         if form.validate_on_submit():
+            now = datetime.utcnow()
+            update = {
+                '$set': {
+                    'party_name': form.party_name.data.strip(),
+                    'amount': float(form.amount.data),
+                    'description': form.description.data.strip(),
+                    'category': form.category.data,
+                    'is_recurring': form.is_recurring.data,
+                    'recurring_period': form.recurring_period.data if form.is_recurring.data else 'none',
+                    'updated_at': now
+                }
+            }
+            schedule_changed = (update['$set']['is_recurring'] != transaction.get('is_recurring', False) or
+                                update['$set']['recurring_period'] != transaction.get('recurring_period', 'none'))
+            if schedule_changed:
+                schedule_set, schedule_unset = schedule_fields(update['$set']['is_recurring'], update['$set']['recurring_period'], now)
+                update['$set'].update(schedule_set)
+                if schedule_unset:
+                    update['$unset'] = schedule_unset
             mongo.db.transactions.update_one(
                 {'_id': ObjectId(transaction_id), 'user_id': str(current_user.id)},
-                {
-                    '$set': {
-                        'party_name': form.party_name.data.strip(),
-                        'amount': float(form.amount.data),
-                        'description': form.description.data.strip(),
-                        'category': form.category.data,
-                        'is_recurring': form.is_recurring.data,
-                        'recurring_period': form.recurring_period.data if form.is_recurring.data else 'none',
-                        'updated_at': datetime.utcnow()
-                    }
-                }
+                update
             )
             deduct_coins(f"update_{type}")
             flash(trans_function('transaction_updated', default='Transaction updated successfully'), 'success')
@@ -260,6 +283,7 @@ def delete_transaction(type, transaction_id):
         if result.deleted_count == 0:
             flash(trans_function('transaction_not_found', default='Transaction not found'), 'danger')
         else:
+            bump(mongo.db, current_user.id)
             flash(trans_function('transaction_deleted', default='Transaction deleted successfully'), 'success')
             logger.info(f"{type.capitalize()} deleted by user {current_user.id}: {transaction_id}")
         return redirect(url_for(f'transactions.{type}s_history'))
@@ -281,7 +305,9 @@ def export_transactions_csv(type):
         query = {'user_id': str(current_user.id), 'type': type}
         if user.get('role') == 'admin':
             query.pop('user_id')
-        transactions = list(mongo.db.transactions.find(query))
+        # Full-history export, fine to serve from a secondary
+        with reporting_reads() as (db, read_session):
+            transactions, complete = bounded_find(db.transactions, query, session=read_session)
         output = StringIO()
         writer = csv.writer(output)
         writer.writerow(['Party Name', 'Amount', 'Description', 'Category', 'Is Recurring', 'Recurring Period', 'Created At'])
@@ -295,6 +321,9 @@ def export_transactions_csv(type):
                 t.get('recurring_period', 'none').capitalize(),
                 t.get('created_at', '').strftime('%Y-%m-%d') if t.get('created_at') else ''
             ])
+        if not complete:
+            # A download cannot carry a flash message; say so in the file itself
+            writer.writerow([trans_function('partial_results', default='This search took too long, so only part of the results is shown. Narrow the filters to see everything.')])
         output.seek(0)
         return send_file(
             output,
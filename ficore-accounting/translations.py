@@ -311,7 +311,15 @@ TRANSLATIONS = {
         'user_suspended': 'User suspended successfully',
         'user_deleted': 'User deleted successfully',
         'item_deleted': 'Item deleted successfully',
-        'invalid_collection': 'Invalid collection'
+        'invalid_collection': 'Invalid collection',
+        'partial_results': 'This search took too long, so only part of the results is shown. Narrow the filters to see everything.',
+        'stale_data': 'The database is not responding, so this page shows data saved at {time}.',
+        'insufficient_coins': 'Insufficient coins. Please purchase more.',
+        'invalid_input': 'Please correct the highlighted fields.',
+        'csrf_invalid': 'The form expired. Reload the page and try again.',
+        'too_many_requests': 'Too many requests. Please wait and try again.',
+        'query_timeout': 'This search took too long. Narrow the filters and try again.',
+        'full_version': 'Full version'
     },
     'ha': {
         # Setup
@@ -619,7 +627,15 @@ TRANSLATIONS = {
         'user_suspended': 'An dakatar da mai amfani cikin nasara',
         'user_deleted': 'An goge mai amfani cikin nasara',
         'item_deleted': 'An goge abun cikin nasara',
-        'invalid_collection': 'Tattara mara inganci'
+        'invalid_collection': 'Tattara mara inganci',
+        'partial_results': 'Wannan binciken ya ɗauki lokaci mai tsawo, don haka wani ɓangare kawai na sakamakon ake nunawa. Ƙara tacewa don ganin komai.',
+        'stale_data': 'Ma\'ajiyar bayanai ba ta amsawa, don haka wannan shafin yana nuna bayanan da aka adana a {time}.',
+        'insufficient_coins': 'Kuɗin kama bai isa ba. Da fatan za a sayi ƙari.',
+        'invalid_input': 'Da fatan za a gyara filayen da aka nuna.',
+        'csrf_invalid': 'Fom ɗin ya ƙare. Sake loda shafin ka sake gwadawa.',
+        'too_many_requests': 'Buƙatu sun yi yawa. Da fatan za a jira ka sake gwadawa.',
+        'query_timeout': 'Wannan binciken ya ɗauki lokaci mai tsawo. Ƙara tacewa ka sake gwadawa.',
+        'full_version': 'Cikakken shafi'
     }
 }
 
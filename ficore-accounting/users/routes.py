@@ -4,15 +4,17 @@ from wtforms import StringField, PasswordField, TextAreaField, SelectField, Subm
 from flask_login import login_required, current_user, login_user, logout_user
 from pymongo import errors
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_mail import Message
 import logging
+import os
 import uuid
 from datetime import datetime, timedelta
-from app.utils import trans_function as trans, is_valid_email
+from utils import trans_function as trans, is_valid_email
 import re
 import random
 from itsdangerous import URLSafeTimedSerializer
-from app import limiter, check_coin_balance, mail
+from app import limiter, check_coin_balance
+from outbox import enqueue_email
+from dataversion import bump
 from bson import ObjectId
 
 logger = logging.getLogger(__name__)
@@ -152,12 +154,12 @@ def login():
                         {'_id': username},
                         {'$set': {'otp': otp, 'otp_expiry': datetime.utcnow() + timedelta(minutes=5)}}
                     )
-                    msg = Message(
+                    enqueue_email(
+                        mongo.db,
                         subject=trans('otp_subject', default='Your One-Time Password'),
                         recipients=[user['email']],
                         body=trans('otp_body', default=f'Your OTP is {otp}. It expires in 5 minutes.')
                     )
-                    mail.send(msg)
                     session['pending_user_id'] = username
                     return redirect(url_for('users.verify_2fa'))
                 from app import User
@@ -281,12 +283,12 @@ def forgot_password():
                 {'$set': {'reset_token': reset_token, 'reset_token_expiry': expiry}}
             )
             reset_url = url_for('users.reset_password', token=reset_token, _external=True)
-            msg = Message(
+            enqueue_email(
+                mongo.db,
                 subject=trans('reset_password_subject', default='Reset Your Password'),
                 recipients=[email],
                 body=trans('reset_password_body', default=f'Click the link to reset your password: {reset_url}\nLink expires in 15 minutes.')
             )
-            mail.send(msg)
             log_audit_action('forgot_password', {'email': email})
             flash(trans('reset_email_sent', default='Password reset email sent'), 'success')
             return render_template('users/forgot_password.html', form=form)
@@ -374,6 +376,7 @@ def profile():
                     'ref': f"PROFILE_UPDATE_{datetime.utcnow().isoformat()}",
                     'date': datetime.utcnow()
                 })
+                bump(mongo.db, current_user.id)
                 log_audit_action('update_profile', {'user_id': current_user.id})
                 current_user.email = new_email
                 current_user.display_name = new_display_name
@@ -428,6 +431,7 @@ def setup_wizard():
                 'ref': f"SETUP_WIZARD_{datetime.utcnow().isoformat()}",
                 'date': datetime.utcnow()
             })
+            bump(mongo.db, current_user.id)
             log_audit_action('complete_setup_wizard', {'user_id': current_user.id})
             flash(trans('business_setup_completed', default='Business setup completed'), 'success')
             logger.info(f"Business setup completed for user: {current_user.id}")
@@ -35,14 +35,15 @@ def format_datetime(date):
     return date
 
 def requires_role(role):
-    """Decorator to restrict access to a specific role."""
+    """Decorator to restrict access to a specific role (or list of roles)."""
+    roles = role if isinstance(role, (list, tuple)) else [role]
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             if not current_user.is_authenticated:
                 flash(trans_function('login_required', default='Please log in to access this page'), 'danger')
                 return redirect(url_for('auth.login'))
-            if current_user.role != role:
+            if current_user.role not in roles:
                 flash(trans_function('forbidden_access', default='Access denied'), 'danger')
                 return redirect(url_for('index'))
             return f(*args, **kwargs)
@@ -0,0 +1,63 @@
+from flask import Flask
+from database import get_db
+from recurring import materialize_due_transactions, backfill_schedules, ensure_indexes as ensure_recurring_indexes
+from outbox import deliver_pending, mail_settings_from_env, ensure_indexes as ensure_outbox_indexes
+import os
+import sys
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def create_mail_app():
+    """Minimal Flask app that gives Flask-Mail its config and app context."""
+    from flask_mail import Mail
+    mail_app = Flask(__name__)
+    mail_app.config.update(mail_settings_from_env())
+    return mail_app, Mail(mail_app)
+
+def build_jobs(db):
+    """Return (name, callable, interval_seconds) for every background job."""
+    mail_app, mail = create_mail_app()
+
+    def deliver_outbox():
+        with mail_app.app_context():
+            # Drain the backlog in batches, one SMTP connection per batch
+            while deliver_pending(db, mail, batch_size=int(os.getenv('OUTBOX_BATCH_SIZE', 50))):
+                pass
+
+    return [
+        ('recurring_transactions', lambda: materialize_due_transactions(db), int(os.getenv('RECURRING_INTERVAL_SECONDS', 60))),
+        ('email_outbox', deliver_outbox, int(os.getenv('OUTBOX_POLL_SECONDS', 2)))
+    ]
+
+def run_job(name, job):
+    try:
+        job()
+    except Exception as e:
+        logger.error(f"Error running background job {name}: {str(e)}")
+
+def main():
+    """Run background jobs on their own intervals, or each once with --once."""
+    db = get_db()
+    ensure_recurring_indexes(db)
+    backfill_schedules(db)
+    ensure_outbox_indexes(db)
+    jobs = build_jobs(db)
+    if '--once' in sys.argv:
+        for name, job, _ in jobs:
+            run_job(name, job)
+        return
+    logger.info(f"Background worker started with jobs: {', '.join(name for name, _, _ in jobs)}")
+    next_run = {name: 0 for name, _, _ in jobs}
+    while True:
+        now = time.monotonic()
+        for name, job, interval in jobs:
+            if now >= next_run[name]:
+                run_job(name, job)
+                next_run[name] = time.monotonic() + interval
+        time.sleep(max(0.1, min(next_run.values()) - time.monotonic()))
+
+if __name__ == '__main__':
+    main()